@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Depends, HTTPException
+from auth import utils, hashing, models as auth_models
+from auth.principal_cache import principals, token_versions
+from sales.columnar_cache import company_sales
+from sales.rank_index import salesmen as salesman_ranks
+from analytics import kpi, leaderboard
+from utils import pool_monitor
+import database
+
+router = APIRouter(
+    prefix="/api/admin",
+    tags=["Admin"]
+)
+
+@router.get("/pool-stats")
+def get_pool_stats(
+    current_user: auth_models.User = Depends(utils.get_current_active_user)
+):
+    """
+    Connection pool statistics per engine: checked-out/overflow counts, checkout wait histogram,
+    timeouts, per-route checkout durations and the connections currently held, plus the
+    password hashing pool.
+    """
+    if current_user.role != "manager":
+        raise HTTPException(status_code=403, detail="Only managers can view pool statistics")
+
+    return {
+        "leak_threshold_seconds": pool_monitor.LEAK_THRESHOLD_SECONDS,
+        "pools": pool_monitor.snapshot(),
+        "replica": database.replica_monitor.status() if database.replica_monitor else None,
+        "password_hashing": hashing.pool.stats()
+    }
+
+@router.get("/cache-stats")
+def get_cache_stats(
+    current_user: auth_models.User = Depends(utils.get_current_active_user)
+):
+    """In-process cache sizes and hit rates (this worker only)."""
+    if current_user.role != "manager":
+        raise HTTPException(status_code=403, detail="Only managers can view cache statistics")
+
+    return {
+        "principals": principals.stats(),
+        "token_versions": token_versions.stats(),
+        "sales_columns": company_sales.stats(),
+        "salesman_ranks": salesman_ranks.stats(),
+        "executive_kpis": kpi.executive.stats(),
+        "leaderboard": leaderboard.refresher.stats() if leaderboard.refresher else None
+    }
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, Body
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_read_db
 from auth import utils, models as auth_models
 from .service import AIService
 from pydantic import BaseModel
@@ -16,7 +16,7 @@ class AskRequest(BaseModel):
 @router.post("/ask")
 async def ask_ai(
     request: AskRequest,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: auth_models.User = Depends(utils.get_current_active_user)
 ):
     try:
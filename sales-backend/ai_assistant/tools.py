@@ -1,32 +1,24 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from database import get_db
-from auth import models as auth_models
 from sales.router import Sale
 from products.router import Product
 import pandas as pd
 from analytics import advanced 
+from analytics import leaderboard
 
 def get_leaderboard_context(db: Session, company_id: int):
     """
     Fetches the leaderboard for the company and returns it as a string context.
     """
-    results = db.query(
-        auth_models.User,
-        func.sum(Sale.amount).label("total_revenue"),
-        func.sum(Sale.quantity).label("total_quantity")
-    ).join(Sale, Sale.user_id == auth_models.User.id).filter(
-        Sale.company_id == company_id
-    ).group_by(auth_models.User.id).order_by(func.sum(Sale.amount).desc()).all()
+    results, refreshed_at, _ = leaderboard.read(db, company_id)
 
     if not results:
         return "No sales data available for leaderboard."
 
-    context = "Leaderboard:\n"
-    rank = 1
-    for user, revenue, quantity in results:
-        context += f"{rank}. {user.full_name}: ₹{revenue:,.2f} ({quantity} sales)\n"
-        rank += 1
+    context = f"Leaderboard (as of {refreshed_at:%Y-%m-%d %H:%M} UTC):\n" if refreshed_at else "Leaderboard:\n"
+    for rank, row in enumerate(results, start=1):
+        context += f"{rank}. {row.full_name}: ₹{row.revenue:,.2f} ({row.quantity} sales)\n"
     
     return context
 
@@ -1,26 +1,171 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-
-def get_sales_df(sales_data):
-    """Converts list of Sale objects to DataFrame"""
-    if not sales_data:
-        return pd.DataFrame()
-    
-    data = []
-    for sale in sales_data:
-        data.append({
-            'id': sale.id,
-            'product_id': sale.product_id,
-            'user_id': sale.user_id,
-            'amount': sale.amount,
-            'quantity': sale.quantity,
-            'date': sale.date,
-            'customer_name': sale.customer_name
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sales.router import Sale
+
+# --- Columnar loading ---
+# How load_sales stores each column: ids and counts as int32 (Int32 when the column has NULLs),
+# amounts as float64, dates as datetime64 and text as categoricals, so a frame of a million sales
+# holds a few flat arrays rather than a million ORM objects or dicts.
+INT_COLUMNS = {"id", "company_id", "user_id", "product_id", "quantity"}
+FLOAT_COLUMNS = {"amount"}
+DATE_COLUMNS = {"date"}
+SALES_COLUMNS = ["id", "product_id", "user_id", "amount", "quantity", "date", "customer_name"]
+
+# Rows fetched per round trip (a server-side cursor on PostgreSQL)
+FETCH_SIZE = 50000
+
+class _ColumnBuilder:
+    """Accumulates one column from fetched chunks into typed arrays."""
+    def __init__(self, name: str):
+        self.name = name
+        self.chunks = []
+        self.masks = []
+        self.categories = {} # text value -> code
+
+    def add(self, values):
+        n = len(values)
+        if self.name in INT_COLUMNS:
+            self.masks.append(np.fromiter((v is None for v in values), dtype=bool, count=n))
+            self.chunks.append(np.fromiter((0 if v is None else v for v in values), dtype=np.int32, count=n))
+        elif self.name in FLOAT_COLUMNS:
+            self.chunks.append(np.array(values, dtype=np.float64)) # None -> NaN
+        elif self.name in DATE_COLUMNS:
+            self.chunks.append(np.array(values, dtype="datetime64[ns]")) # None -> NaT
+        else:
+            codes = self.categories
+            self.chunks.append(np.fromiter(
+                (-1 if v is None else codes.setdefault(v, len(codes)) for v in values), dtype=np.int32, count=n
+            ))
+
+    def build(self):
+        if self.name in INT_COLUMNS:
+            data = np.concatenate(self.chunks) if self.chunks else np.empty(0, dtype=np.int32)
+            mask = np.concatenate(self.masks) if self.masks else np.empty(0, dtype=bool)
+            return pd.arrays.IntegerArray(data, mask) if mask.any() else data
+        if self.name in FLOAT_COLUMNS:
+            return np.concatenate(self.chunks) if self.chunks else np.empty(0, dtype=np.float64)
+        if self.name in DATE_COLUMNS:
+            return np.concatenate(self.chunks) if self.chunks else np.empty(0, dtype="datetime64[ns]")
+        codes = np.concatenate(self.chunks) if self.chunks else np.empty(0, dtype=np.int32)
+        return pd.Categorical.from_codes(codes, categories=list(self.categories))
+
+def load_sales(
+    db: Session,
+    company_id: int,
+    columns=SALES_COLUMNS,
+    start: datetime = None,
+    end: datetime = None,
+    user_id: int = None
+) -> pd.DataFrame:
+    """
+    Loads a company's sales as a DataFrame with only the given columns, optionally limited to
+    start <= date < end and one salesman. Rows are streamed in FETCH_SIZE chunks straight into
+    typed arrays; no ORM objects are built.
+    """
+    table = Sale.__table__
+    stmt = select(*[table.c[name] for name in columns]).where(table.c.company_id == company_id)
+    if user_id is not None:
+        stmt = stmt.where(table.c.user_id == user_id)
+    if start is not None:
+        stmt = stmt.where(table.c.date >= start)
+    if end is not None:
+        stmt = stmt.where(table.c.date < end)
+
+    builders = [_ColumnBuilder(name) for name in columns]
+    result = db.execute(stmt.execution_options(yield_per=FETCH_SIZE))
+    for rows in result.partitions():
+        for builder, values in zip(builders, zip(*rows)):
+            builder.add(values)
+
+    return pd.DataFrame({builder.name: builder.build() for builder in builders})
+
+# --- ABC / XYZ ---
+# Cumulative share of the total (largest first) that closes classes A and B
+ABC_THRESHOLDS = (0.80, 0.95)
+# Coefficient of variation of daily quantity that closes classes X and Y
+XYZ_THRESHOLDS = (0.5, 1.0)
+
+def abc_classes(values, thresholds=ABC_THRESHOLDS) -> np.ndarray:
+    """A/B/C per value by its running share of the total, largest first (returned in input order)."""
+    values = np.nan_to_num(np.asarray(values, dtype=np.float64))
+    classes = np.full(len(values), "C", dtype=object)
+    total = values.sum()
+    if total <= 0:
+        return classes
+    order = np.argsort(-values, kind="stable")
+    share = np.cumsum(values[order]) / total
+    classes[order] = np.select([share <= thresholds[0], share <= thresholds[1]], ["A", "B"], default="C")
+    return classes
+
+def xyz_classes(cv, thresholds=XYZ_THRESHOLDS) -> np.ndarray:
+    """X/Y/Z per coefficient of variation; undefined variability (no demand) is Z."""
+    cv = np.asarray(cv, dtype=np.float64)
+    return np.select([cv <= thresholds[0], cv <= thresholds[1]], ["X", "Y"], default="Z").astype(object)
+
+def abc_xyz(sales_df, keys: dict, first_day, days: int, abc=ABC_THRESHOLDS, xyz=XYZ_THRESHOLDS) -> dict:
+    """
+    ABC by revenue and by quantity plus XYZ on daily quantity, for several dimensions at once.
+    keys maps a dimension name to one key per sale (NA where the sale has none), e.g.
+    {"product": product_id, "region": region}. All dimensions are stacked into one array of
+    group ids, so totals and the sparse (group, day) grid come from a single set of bincounts;
+    days without sales count as zero demand over the window of `days` days from first_day.
+
+    Returns {dimension: DataFrame(key, revenue, quantity, revenue_share, revenue_class,
+    quantity_class, cv, xyz, class)}, each sorted by revenue.
+    """
+    columns = ["key", "revenue", "quantity", "revenue_share", "revenue_class", "quantity_class", "cv", "xyz", "class"]
+    amounts = np.nan_to_num(sales_df["amount"].to_numpy(dtype=np.float64))
+    quantities = np.nan_to_num(sales_df["quantity"].to_numpy(dtype=np.float64, na_value=0))
+    day = (sales_df["date"].to_numpy(dtype="datetime64[ns]") - np.datetime64(first_day, "ns")) // np.timedelta64(1, "D")
+
+    groups, rows, spans = [], [], {}
+    offset = 0
+    for dimension, key in keys.items():
+        key = pd.Series(key).reset_index(drop=True)
+        present = np.flatnonzero(key.notna().to_numpy())
+        codes, uniques = pd.factorize(key.iloc[present])
+        groups.append(codes + offset)
+        rows.append(present)
+        spans[dimension] = (offset, np.asarray(uniques, dtype=object))
+        offset += len(uniques)
+
+    group = np.concatenate(groups) if groups else np.empty(0, dtype=np.int64)
+    row = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    revenue = np.bincount(group, weights=amounts[row], minlength=offset)
+    quantity = np.bincount(group, weights=quantities[row], minlength=offset)
+
+    # Daily quantity per (group, day) cell, then its first two moments per group
+    cells, cell_index = pd.factorize(group.astype(np.int64) * days + day[row])
+    daily = np.bincount(cells, weights=quantities[row])
+    cell_group = cell_index // days
+    mean = np.bincount(cell_group, weights=daily, minlength=offset) / days
+    square_mean = np.bincount(cell_group, weights=daily ** 2, minlength=offset) / days
+    std = np.sqrt(np.maximum(square_mean - mean ** 2, 0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cv = np.where(mean > 0, std / mean, np.nan)
+
+    results = {}
+    for dimension, (start, uniques) in spans.items():
+        span = slice(start, start + len(uniques))
+        table = pd.DataFrame({
+            "key": uniques,
+            "revenue": revenue[span],
+            "quantity": quantity[span],
+            "cv": np.round(cv[span], 4),
         })
-    return pd.DataFrame(data)
+        total = table["revenue"].sum()
+        table["revenue_share"] = table["revenue"] / total if total else 0.0
+        table["revenue_class"] = abc_classes(table["revenue"], abc)
+        table["quantity_class"] = abc_classes(table["quantity"], abc)
+        table["xyz"] = xyz_classes(table["cv"], xyz)
+        table["class"] = table["revenue_class"] + table["xyz"]
+        results[dimension] = table[columns].sort_values("revenue", ascending=False, kind="stable").reset_index(drop=True)
+    return results
 
-def calculate_abc_analysis(sales_val, products_val):
+def calculate_abc_analysis(sales_val, products_val, thresholds=ABC_THRESHOLDS):
     """
     Performs ABC Analysis on Products based on Revenue.
     A: Top 80% Revenue
@@ -30,134 +175,112 @@ def calculate_abc_analysis(sales_val, products_val):
     if sales_val.empty:
         return {}
 
-    # Group by product and sum amount
-    product_revenue = sales_val.groupby('product_id')['amount'].sum().reset_index()
-    product_revenue = product_revenue.sort_values('amount', ascending=False)
-    
-    # Calculate cumulative percentage
-    product_revenue['cumulative_sum'] = product_revenue['amount'].cumsum()
-    product_revenue['total_revenue'] = product_revenue['amount'].sum()
-    product_revenue['cumulative_perc'] = product_revenue['cumulative_sum'] / product_revenue['total_revenue']
-    
-    # Assign Class
-    def assign_class(perc):
-        if perc <= 0.80: return 'A'
-        elif perc <= 0.95: return 'B'
-        else: return 'C'
-        
-    # Merge with product names
-    # products_val should have 'id' and 'name'
-    if not products_val.empty:
-        product_revenue = product_revenue.merge(products_val, left_on='product_id', right_on='id', how='left')
-        product_revenue['name'] = product_revenue['name'].fillna('Unknown Product')
-    else:
-        product_revenue['name'] = 'Unknown Product'
+    product_revenue = sales_val.groupby('product_id')['amount'].sum().sort_values(ascending=False)
+    names = dict(zip(products_val['id'], products_val['name'])) if not products_val.empty else {}
+
+    result = pd.DataFrame({
+        'product_id': product_revenue.index.to_numpy(),
+        'name': product_revenue.index.map(names).fillna('Unknown Product') if names else 'Unknown Product',
+        'amount': product_revenue.to_numpy(),
+        'class': abc_classes(product_revenue.to_numpy(), thresholds),
+    })
+    return result.to_dict('records')
+
+# --- RFM ---
+# Scores run 1..RFM_BINS per dimension (higher is better: recent, frequent, high spend)
+RFM_BINS = 5
 
-    product_revenue['class'] = product_revenue['cumulative_perc'].apply(assign_class)
-    
-    # Return list of dicts: [{product_id: 1, name: '...', class: 'A', revenue: ...}, ...]
-    return product_revenue[['product_id', 'name', 'amount', 'class']].to_dict('records')
+# Segment rules, checked in order; the first match wins and anything unmatched is "Regular".
+# Each rule maps a column to inclusive (min, max) bounds, None meaning unbounded.
+# The default keeps the original absolute thresholds (recency in days, monetary in revenue).
+RFM_RULES = [
+    ("Champion", {"recency": (None, 30), "frequency": (5, None), "monetary": (10000, None)}),
+    ("Loyal", {"recency": (None, 60), "frequency": (3, None)}),
+    ("At Risk", {"recency": (61, None), "monetary": (5000, None)}),
+    ("New/Promising", {"recency": (None, 30)}),
+    ("Lost", {"recency": (91, None)}),
+]
 
-def calculate_rfm(sales_df):
+# Relative segments on the quantile scores (assumes 5 bins)
+RFM_SCORE_RULES = [
+    ("Champion", {"r_score": (4, None), "f_score": (4, None), "m_score": (4, None)}),
+    ("Loyal", {"r_score": (3, None), "f_score": (4, None)}),
+    ("At Risk", {"r_score": (None, 2), "f_score": (3, None)}),
+    ("New/Promising", {"r_score": (4, None), "f_score": (None, 2)}),
+    ("Lost", {"r_score": (None, 1)}),
+]
+
+RFM_DEFAULT_SEGMENT = "Regular"
+
+def quantile_scores(values, bins: int = RFM_BINS, ascending: bool = True):
     """
-    Performs RFM Analysis on Customers (using customer_name as proxy for ID if no customer table).
+    1..bins by percentile rank; ties share a score, so a skewed column never fails the way
+    qcut does on duplicate edges. ascending=False gives the smallest values the top score.
     """
-    if sales_df.empty:
-        return []
-
-    # Ensure date is datetime
-    sales_df['date'] = pd.to_datetime(sales_df['date'])
-    now = datetime.utcnow()
-    
-    # RFM Aggregation
-    rfm = sales_df.groupby('customer_name').agg({
-        'date': lambda x: (now - x.max()).days, # Recency
-        'id': 'count', # Frequency
-        'amount': 'sum' # Monetary
-    }).reset_index()
-    
-    rfm.columns = ['customer_name', 'recency', 'frequency', 'monetary']
-    
-    # Simple Segmentation Logic (Quantile-based could be better but sticking to simple rules first)
-    # 1. Champions: Recent (< 30 days), Frequent (> 5), High Value (> 10000)
-    # 2. Loyal: Recent (< 60 days), Frequent (> 3)
-    # 3. At Risk: Old (> 60 days), High Value (> 5000)
-    # 4. New: Recent (< 30 days), Low Frequency
-    # 5. Lost: Old (> 90 days)
-    
-    def segment_customer(row):
-        r, f, m = row['recency'], row['frequency'], row['monetary']
-        
-        if r <= 30 and f >= 5 and m >= 10000: return "Champion"
-        if r <= 60 and f >= 3: return "Loyal"
-        if r > 60 and m >= 5000: return "At Risk"
-        if r <= 30: return "New/Promising"
-        if r > 90: return "Lost"
-        return "Regular"
-
-    rfm['segment'] = rfm.apply(segment_customer, axis=1)
-    
-    return rfm.to_dict('records')
-
-def calculate_kpis(sales_df, salesmen_count):
+    pct = pd.Series(values).rank(method="average", pct=True).to_numpy()
+    scores = np.ceil(pct * bins).clip(1, bins).astype(np.int8)
+    return scores if ascending else (bins + 1 - scores).astype(np.int8)
+
+def _rule_mask(table: pd.DataFrame, bounds) -> np.ndarray:
+    mask = np.ones(len(table), dtype=bool)
+    for column, (low, high) in bounds.items():
+        values = table[column].to_numpy()
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+    return mask
+
+def rfm_table(sales_df, now: datetime = None, bins: int = RFM_BINS, rules=RFM_RULES) -> pd.DataFrame:
     """
-    Calculates Executive KPIs
+    One row per customer (customer_name as the key, sorted by it) with recency in days,
+    frequency, monetary, their 1..bins scores, rfm_score (the sum) and segment. Customers whose
+    sales all lack a date have no recency and are left out. Fully vectorized: per-customer
+    reductions with bincount / maximum.at and np.select over the rule table.
     """
+    columns = ["customer_name", "recency", "frequency", "monetary", "r_score", "f_score", "m_score", "rfm_score", "segment"]
     if sales_df.empty:
-        return {
-            "run_rate": 0,
-            "active_salesmen_ratio": 0,
-            "top_mover_id": None
-        }
-
-    sales_df['date'] = pd.to_datetime(sales_df['date'])
-    now = datetime.utcnow()
-    current_month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    
-    # 1. Revenue Run Rate
-    # Metric: (Current Month Revenue / Days Passed) * Days in Month
-    month_sales = sales_df[sales_df['date'] >= current_month_start]
-    current_revenue = month_sales['amount'].sum()
-    days_passed = max((now - current_month_start).days, 1) # Avoid div by 0
-    # Approximate days in month (30)
-    run_rate = (current_revenue / days_passed) * 30
-    
-    # 2. Active Salesmen Ratio (Weekly)
-    week_start = now - timedelta(days=7)
-    week_sales = sales_df[sales_df['date'] >= week_start]
-    active_salesmen = week_sales['user_id'].nunique()
-    ratio = (active_salesmen / salesmen_count) * 100 if salesmen_count > 0 else 0
-    
-    return {
-        "run_rate": round(run_rate, 2),
-        "active_salesmen_ratio": round(ratio, 1),
-        "top_mover_id": None # Placeholder for complex logic involving prev month comparison
-    }
-
-def calculate_consistency_score(sales_df):
+        return pd.DataFrame(columns=columns)
+
+    # Reduce over integer customer codes rather than a groupby on the names
+    names = sales_df["customer_name"]
+    if isinstance(names.dtype, pd.CategoricalDtype):
+        codes, customers = names.cat.codes.to_numpy(), names.cat.categories
+    else:
+        codes, customers = pd.factorize(names)
+    known = codes >= 0
+    codes = codes[known]
+    amounts = np.nan_to_num(sales_df["amount"].to_numpy(dtype=np.float64)[known])
+    dates = sales_df["date"].to_numpy(dtype="datetime64[ns]")[known].view(np.int64)
+
+    frequency = np.bincount(codes, minlength=len(customers))
+    monetary = np.bincount(codes, weights=amounts, minlength=len(customers))
+    last = np.full(len(customers), np.iinfo(np.int64).min) # NaT, also what NaT dates hold
+    np.maximum.at(last, codes, dates)
+
+    present = np.flatnonzero(last != np.iinfo(np.int64).min)
+    now = np.datetime64(now or datetime.utcnow(), "ns")
+    rfm = pd.DataFrame({
+        "customer_name": np.asarray(customers, dtype=object)[present],
+        "recency": (now - last[present].view("datetime64[ns]")) // np.timedelta64(1, "D"),
+        "frequency": frequency[present],
+        "monetary": monetary[present],
+    })
+    # Category codes follow first appearance; the groupby this replaced sorted by name
+    rfm = rfm.sort_values("customer_name", kind="stable", ignore_index=True)
+    rfm["r_score"] = quantile_scores(rfm["recency"], bins, ascending=False)
+    rfm["f_score"] = quantile_scores(rfm["frequency"], bins)
+    rfm["m_score"] = quantile_scores(rfm["monetary"], bins)
+    rfm["rfm_score"] = rfm["r_score"].astype(np.int16) + rfm["f_score"] + rfm["m_score"]
+    rfm["segment"] = np.select(
+        [_rule_mask(rfm, bounds) for _, bounds in rules],
+        [name for name, _ in rules],
+        default=RFM_DEFAULT_SEGMENT
+    )
+    return rfm[columns]
+
+def calculate_rfm(sales_df, now: datetime = None, bins: int = RFM_BINS, rules=RFM_RULES):
     """
-    Calculates consistency score (Std Dev of daily sales) for each salesman.
-    Lower Std Dev (normalized by mean) = More Consistent? 
-    Actually, usually Coefficient of Variation (CV) = StdDev / Mean.
-    Lower CV is better consistency.
+    Performs RFM Analysis on Customers (using customer_name as proxy for ID if no customer table).
     """
-    if sales_df.empty:
-        return []
-
-    sales_df['date'] = pd.to_datetime(sales_df['date'])
-    sales_df['date_only'] = sales_df['date'].dt.date
-    
-    # Group by User and Date to get Daily Totals
-    daily_sales = sales_df.groupby(['user_id', 'date_only'])['amount'].sum().reset_index()
-    
-    # Calculate StdDev and Mean per User
-    stats = daily_sales.groupby('user_id')['amount'].agg(['std', 'mean', 'count']).reset_index()
-    stats = stats.fillna(0)
-    
-    # CV = (Std / Mean) * 100. Lower is better.
-    # But for a "Score" (Higher is better), maybe 100 - CV? Or just return CV.
-    # Let's return the metrics directly.
-    
-    stats['cv'] = np.where(stats['mean'] > 0, (stats['std'] / stats['mean']) * 100, 0)
-    
-    return stats.to_dict('records')
+    return rfm_table(sales_df, now, bins, rules).to_dict('records')
@@ -0,0 +1,161 @@
+from sqlalchemy import select, func, case, and_
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from collections import OrderedDict
+import pandas as pd
+import os
+import threading
+import time
+from auth import models as auth_models
+from products.router import Product
+from sales.rollup import SalesDailyRollup
+from sales.columnar_cache import company_sales
+
+# Executive KPIs from the daily rollup. Only the last two comparison periods (and the current
+# month) are read, so the cost depends on the window, not on how much history a company has.
+DEFAULT_PERIOD_DAYS = 30
+MAX_PERIOD_DAYS = 365
+# Results are reused for this long, or until this process writes a sale for the company
+TTL_SECONDS = float(os.getenv("KPI_CACHE_TTL_SECONDS", "60"))
+MAX_ENTRIES = 1000
+
+MOVER_DIMENSIONS = {"product": "product_id", "salesman": "user_id", "region": "region"}
+
+def period_aggregates(db: Session, company_id: int, now: datetime, period_days: int) -> pd.DataFrame:
+    """
+    One row per (salesman, product, region) active since the earliest window: revenue in the
+    current and previous period, month to date, and orders in the last 7 days.
+    """
+    rollup = SalesDailyRollup
+    today = now.date()
+    current_start = today - timedelta(days=period_days - 1)
+    previous_start = current_start - timedelta(days=period_days)
+    month_start = today.replace(day=1)
+    week_start = (now - timedelta(days=7)).date()
+
+    def revenue_since(condition):
+        return func.coalesce(func.sum(case((condition, rollup.amount), else_=0)), 0)
+
+    rows = db.execute(
+        select(
+            rollup.user_id,
+            rollup.product_id,
+            rollup.region,
+            Product.name.label("product_name"),
+            revenue_since(rollup.day >= current_start).label("current"),
+            revenue_since(and_(rollup.day >= previous_start, rollup.day < current_start)).label("previous"),
+            revenue_since(rollup.day >= month_start).label("month_to_date"),
+            func.coalesce(func.sum(case((rollup.day >= week_start, rollup.orders), else_=0)), 0).label("week_orders"),
+        ).outerjoin(
+            Product, Product.id == rollup.product_id
+        ).where(
+            rollup.company_id == company_id,
+            rollup.day >= min(previous_start, month_start, week_start)
+        ).group_by(rollup.user_id, rollup.product_id, rollup.region, Product.name)
+    ).all()
+    return pd.DataFrame(rows, columns=[
+        "user_id", "product_id", "region", "product_name", "current", "previous", "month_to_date", "week_orders"
+    ])
+
+def top_mover(aggregates: pd.DataFrame, column: str, period_days: int):
+    """The key with the largest absolute change in daily revenue between the two periods."""
+    # 0 / '' are the rollup's "no salesman / product / region"
+    rows = aggregates[~aggregates[column].isin([0, ""])]
+    if rows.empty:
+        return None
+    totals = rows.groupby(column)[["current", "previous"]].sum()
+    velocity = totals / period_days
+    change = velocity["current"] - velocity["previous"]
+    key = change.abs().idxmax()
+    previous = float(velocity.at[key, "previous"])
+    return {
+        "id": key.item() if hasattr(key, "item") else key,
+        "current_velocity": round(float(velocity.at[key, "current"]), 2),
+        "previous_velocity": round(previous, 2),
+        "change": round(float(change[key]), 2),
+        "change_pct": round(float(change[key]) / previous * 100, 1) if previous else None,
+    }
+
+def executive_kpis(db: Session, company_id: int, period_days: int = DEFAULT_PERIOD_DAYS, now: datetime = None):
+    now = now or datetime.utcnow()
+    aggregates = period_aggregates(db, company_id, now, period_days)
+    users = db.execute(
+        select(auth_models.User.id, auth_models.User.full_name, auth_models.User.role)
+        .where(auth_models.User.company_id == company_id)
+    ).all()
+    salesmen_count = sum(1 for user in users if user.role == "salesman")
+
+    # Revenue run rate: (current month revenue / days passed) * 30
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    days_passed = max((now - month_start).days, 1)
+    run_rate = float(aggregates["month_to_date"].sum()) / days_passed * 30
+
+    # Active salesmen ratio over the last week
+    active = aggregates.loc[(aggregates["week_orders"] > 0) & (aggregates["user_id"] != 0), "user_id"].nunique()
+    ratio = (active / salesmen_count) * 100 if salesmen_count > 0 else 0
+
+    names = {
+        "product": dict(zip(aggregates["product_id"], aggregates["product_name"])),
+        "salesman": {user.id: user.full_name for user in users},
+    }
+    movers = {}
+    for dimension, column in MOVER_DIMENSIONS.items():
+        mover = top_mover(aggregates, column, period_days)
+        if mover is not None:
+            mover["name"] = names[dimension].get(mover["id"]) if dimension in names else mover["id"]
+        movers[dimension] = mover
+
+    return {
+        "run_rate": round(run_rate, 2),
+        "active_salesmen_ratio": round(ratio, 1),
+        "top_mover_id": movers["product"]["id"] if movers["product"] else None,
+        "period_days": period_days,
+        "top_movers": movers,
+    }
+
+class KpiCache:
+    """Executive KPIs per (company, period), valid for TTL_SECONDS and while no sale was written."""
+    def __init__(self, ttl_seconds: float = TTL_SECONDS, max_entries: int = MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries = OrderedDict() # (company_id, period_days) -> (expires_at, write version, result)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, db: Session, company_id: int, period_days: int = DEFAULT_PERIOD_DAYS):
+        """
+        db must be a primary session: a result read from a lagging replica would be cached under
+        the current write version and kept until the next write.
+        """
+        key = (company_id, period_days)
+        version = company_sales.write_version(company_id)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > time.monotonic() and entry[1] == version:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        result = executive_kpis(db, company_id, period_days)
+        if self.ttl_seconds > 0:
+            with self.lock:
+                self.entries[key] = (time.monotonic() + self.ttl_seconds, version, result)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return result
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+            }
+
+executive = KpiCache()
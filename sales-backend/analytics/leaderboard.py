@@ -0,0 +1,292 @@
+from sqlalchemy import Table, Column, Integer, String, Float, DateTime, MetaData
+from sqlalchemy import select, insert, delete, func, literal, union_all, text
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
+import logging
+import os
+import threading
+import time
+import zlib
+from auth import models as auth_models
+from sales.rollup import SalesDailyRollup, SalesRollupMark
+
+# Materialized leaderboard: revenue / quantity / orders per (company, period, salesman), summed
+# from the daily rollup. On PostgreSQL it is a materialized view refreshed CONCURRENTLY, so
+# readers never wait on a refresh; elsewhere a snapshot table rewritten in one transaction.
+#
+# Each refresh records, per company, the rollup mark version it was built from (see
+# sales/rollup.py). A read whose company has been written since, by any worker, is answered
+# from the rollup directly and asks for a refresh, so writes are visible immediately and the
+# snapshot serves the reads in between. A background thread refreshes every REFRESH_SECONDS,
+# and on request at most once per MIN_REFRESH_SECONDS.
+
+logger = logging.getLogger(__name__)
+
+REFRESH_SECONDS = float(os.getenv("LEADERBOARD_REFRESH_SECONDS", "60"))
+MIN_REFRESH_SECONDS = float(os.getenv("LEADERBOARD_MIN_REFRESH_SECONDS", "5"))
+
+PERIODS = ("all", "month", "week")
+VIEW = "sales_leaderboard"
+STATE_TABLE = "sales_leaderboard_state"
+# Only one process refreshes at a time on Postgres; the others skip that round
+ADVISORY_LOCK_KEY = zlib.crc32(VIEW.encode())
+
+# Not on Base.metadata: on PostgreSQL the leaderboard is a view, which create_all must not make a table
+metadata = MetaData()
+leaderboard = Table(
+    VIEW, metadata,
+    Column("company_id", Integer, nullable=False),
+    Column("period", String, nullable=False),
+    Column("user_id", Integer, nullable=False),
+    Column("revenue", Float),
+    Column("quantity", Integer),
+    Column("orders", Integer),
+)
+# Per company: the rollup mark version the current snapshot includes
+state = Table(
+    STATE_TABLE, metadata,
+    Column("company_id", Integer, primary_key=True),
+    Column("version", Integer, nullable=False),
+    Column("refreshed_at", DateTime),
+)
+
+# Same rows as snapshot_select(); periods are UTC calendar month and ISO week (from Monday)
+VIEW_SQL = f"""
+CREATE MATERIALIZED VIEW IF NOT EXISTS {VIEW} AS
+SELECT r.company_id, p.period, r.user_id,
+       sum(r.amount) AS revenue, sum(r.quantity) AS quantity, sum(r.orders) AS orders
+FROM sales_daily_rollup r
+CROSS JOIN (SELECT (now() AT TIME ZONE 'UTC')::date AS today) b
+JOIN (VALUES ('all'), ('month'), ('week')) AS p(period)
+  ON p.period = 'all'
+  OR (p.period = 'month' AND r.day >= date_trunc('month', b.today)::date)
+  OR (p.period = 'week' AND r.day >= date_trunc('week', b.today)::date)
+WHERE r.user_id <> 0
+GROUP BY r.company_id, p.period, r.user_id
+"""
+
+def period_starts(today):
+    return {"all": None, "month": today.replace(day=1), "week": today - timedelta(days=today.weekday())}
+
+def snapshot_select(today):
+    rollup = SalesDailyRollup
+    parts = []
+    for period, start in period_starts(today).items():
+        query = select(
+            rollup.company_id,
+            literal(period).label("period"),
+            rollup.user_id,
+            func.sum(rollup.amount),
+            func.sum(rollup.quantity),
+            func.sum(rollup.orders),
+        ).where(rollup.user_id != 0)
+        if start is not None:
+            query = query.where(rollup.day >= start)
+        parts.append(query.group_by(rollup.company_id, rollup.user_id))
+    return union_all(*parts)
+
+def _record_versions(conn, now: datetime):
+    """
+    Runs first in the refresh transaction. Marks are read before the snapshot query runs, so a
+    write committed in between is included but still counts as unseen: readers go to the
+    rollup for that company until the next refresh, never the other way round.
+    """
+    conn.execute(delete(state))
+    conn.execute(insert(state).from_select(
+        ["company_id", "version", "refreshed_at"],
+        select(SalesRollupMark.company_id, SalesRollupMark.version, literal(now, DateTime))
+    ))
+
+def _rewrite_snapshot(conn, now: datetime):
+    _record_versions(conn, now)
+    conn.execute(delete(leaderboard))
+    conn.execute(insert(leaderboard).from_select(
+        ["company_id", "period", "user_id", "revenue", "quantity", "orders"], snapshot_select(now.date())
+    ))
+
+def create(conn):
+    """Creates and fills the leaderboard (migration 0006)."""
+    now = datetime.utcnow()
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(VIEW_SQL))
+        # CONCURRENTLY needs a unique index; reads use its (company_id, period) prefix
+        conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS ix_{VIEW}_key ON {VIEW} (company_id, period, user_id)"))
+        state.create(conn, checkfirst=True)
+        _record_versions(conn, now)
+    else:
+        metadata.create_all(conn)
+        _rewrite_snapshot(conn, now)
+
+class Refresher:
+    def __init__(self, engine):
+        self.engine = engine
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.refreshed = time.monotonic()
+        self.refreshes = 0
+        self.skipped = 0
+        self.requests = 0
+        self.live_reads = 0
+        self.last_duration_ms = None
+        self.last_error = None
+        self.thread = None
+
+    def refresh(self) -> bool:
+        """Recomputes the leaderboard now. False when it failed or another process was already refreshing."""
+        with self.lock:
+            started = time.perf_counter()
+            now = datetime.utcnow()
+            try:
+                if self.engine.dialect.name == "postgresql":
+                    refreshed = self._refresh_view(now)
+                else:
+                    with self.engine.begin() as conn:
+                        _rewrite_snapshot(conn, now)
+                    refreshed = True
+                self.last_error = None
+            except Exception as e:
+                logger.exception("Leaderboard refresh failed")
+                self.last_error = str(e)
+                refreshed = False
+
+            self.refreshed = time.monotonic()
+            if refreshed:
+                self.refreshes += 1
+                self.last_duration_ms = round((time.perf_counter() - started) * 1000, 1)
+                logger.debug("Leaderboard refreshed", extra={"duration_ms": self.last_duration_ms})
+            else:
+                self.skipped += 1
+            return refreshed
+
+    def _refresh_view(self, now: datetime) -> bool:
+        with self.engine.connect() as conn:
+            if not conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY}).scalar():
+                conn.rollback()
+                return False
+            try:
+                _record_versions(conn, now)
+                conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {VIEW}"))
+                conn.commit()
+            finally:
+                conn.rollback()
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+                conn.commit()
+        return True
+
+    def request(self):
+        """A read found the snapshot behind; refresh soon."""
+        self.requests += 1
+        self.wake.set()
+
+    def _watch(self):
+        while True:
+            requested = self.wake.wait(max(REFRESH_SECONDS - (time.monotonic() - self.refreshed), 0))
+            if requested:
+                # Stale reads are answered from the rollup meanwhile, so a burst of writes costs
+                # one refresh per MIN_REFRESH_SECONDS rather than one per read
+                time.sleep(max(MIN_REFRESH_SECONDS - (time.monotonic() - self.refreshed), 0))
+            self.wake.clear()
+            self.refresh()
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._watch, name="leaderboard-refresher", daemon=True)
+            self.thread.start()
+
+    def stats(self):
+        return {
+            "refresh_seconds": REFRESH_SECONDS,
+            "min_refresh_seconds": MIN_REFRESH_SECONDS,
+            "refreshes": self.refreshes,
+            "skipped": self.skipped,
+            "requests": self.requests,
+            "live_reads": self.live_reads,
+            "seconds_since_refresh": round(time.monotonic() - self.refreshed, 1),
+            "last_duration_ms": self.last_duration_ms,
+            "last_error": self.last_error,
+        }
+
+refresher = None
+
+def start_refresher(engine):
+    """Starts the background refresh thread (app startup). LEADERBOARD_REFRESH_SECONDS=0 disables it."""
+    global refresher
+    if refresher is None:
+        refresher = Refresher(engine)
+        if REFRESH_SECONDS > 0:
+            refresher.start()
+    return refresher
+
+# --- Reads ---
+def freshness_query(company_id: int):
+    """(rollup mark version, version in the snapshot, refreshed_at) for the company."""
+    return select(
+        select(SalesRollupMark.version).where(SalesRollupMark.company_id == company_id).scalar_subquery(),
+        select(state.c.version).where(state.c.company_id == company_id).scalar_subquery(),
+        select(state.c.refreshed_at).where(state.c.company_id == company_id).scalar_subquery(),
+    )
+
+def leaderboard_query(company_id: int, period: str = "all"):
+    """The company's salesmen for the period from the snapshot, best first."""
+    return select(
+        leaderboard.c.user_id,
+        auth_models.User.full_name,
+        auth_models.User.sales_target,
+        leaderboard.c.revenue,
+        leaderboard.c.quantity,
+        leaderboard.c.orders,
+    ).join(
+        auth_models.User, auth_models.User.id == leaderboard.c.user_id
+    ).where(
+        leaderboard.c.company_id == company_id,
+        leaderboard.c.period == period
+    ).order_by(leaderboard.c.revenue.desc(), leaderboard.c.user_id)
+
+def live_query(company_id: int, period: str, today):
+    """Same rows as leaderboard_query, aggregated from the rollup."""
+    rollup = SalesDailyRollup
+    revenue = func.sum(rollup.amount)
+    query = select(
+        rollup.user_id,
+        auth_models.User.full_name,
+        auth_models.User.sales_target,
+        revenue.label("revenue"),
+        func.sum(rollup.quantity).label("quantity"),
+        func.sum(rollup.orders).label("orders"),
+    ).join(
+        auth_models.User, auth_models.User.id == rollup.user_id
+    ).where(
+        rollup.company_id == company_id,
+        rollup.user_id != 0
+    )
+    start = period_starts(today)[period]
+    if start is not None:
+        query = query.where(rollup.day >= start)
+    return query.group_by(
+        rollup.user_id, auth_models.User.full_name, auth_models.User.sales_target
+    ).order_by(revenue.desc(), rollup.user_id)
+
+def _current(written, seen) -> bool:
+    return written is None or (seen is not None and seen >= written)
+
+def _went_live():
+    if refresher is not None:
+        refresher.live_reads += 1
+        refresher.request()
+    return datetime.utcnow()
+
+def read(db: Session, company_id: int, period: str = "all"):
+    """(rows, refreshed_at, source) for sync callers such as the AI assistant tools."""
+    written, seen, refreshed_at = db.execute(freshness_query(company_id)).one()
+    if _current(written, seen):
+        return db.execute(leaderboard_query(company_id, period)).all(), refreshed_at, "snapshot"
+    now = _went_live()
+    return db.execute(live_query(company_id, period, now.date())).all(), now, "live"
+
+async def read_async(db: AsyncSession, company_id: int, period: str = "all"):
+    written, seen, refreshed_at = (await db.execute(freshness_query(company_id))).one()
+    if _current(written, seen):
+        return (await db.execute(leaderboard_query(company_id, period))).all(), refreshed_at, "snapshot"
+    now = _went_live()
+    return (await db.execute(live_query(company_id, period, now.date()))).all(), now, "live"
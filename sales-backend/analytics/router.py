@@ -1,15 +1,23 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, case, literal, null, tuple_, union_all, literal_column
+from database import get_db, get_read_db, get_async_read_db
 from auth import utils, models as auth_models
-from sales.router import Sale
+from sales.router import Sale, parse_date_param
+from typing import Optional
+from sales.rollup import SalesDailyRollup
+from sales.columnar_cache import company_sales
 
 from products.router import Product
-import pandas as pd
+import numpy as np
+import math
+from datetime import datetime
 
 from . import salesman_stats
 from . import advanced
+from . import kpi
+from . import leaderboard
 
 router = APIRouter(
     prefix="/api/analytics",
@@ -20,8 +28,8 @@ router.include_router(salesman_stats.router)
 
 @router.get("/dashboard-stats")
 def get_dashboard_stats(
-    db: Session = Depends(get_db), 
-    current_user: auth_models.User = Depends(utils.get_current_active_user)
+    db: Session = Depends(get_read_db), 
+    current_user: utils.Principal = Depends(utils.get_current_principal)
 ):
     stats = {
         "total_revenue": 0,
@@ -48,13 +56,15 @@ def get_dashboard_stats(
     # Formatting recent sales (joining with Product and Salesman/User)
     # Using simple iteration to format response
     formatted_sales = []
+    # A salesman only sees their own sales, so their name is the same on every row
+    own_name = current_user.load(db).full_name if current_user.role != "manager" else None
     for sale in recent_sales:
         # Fetch product name (inefficient N+1 but ok for 5 items)
         product = db.query(Product).filter(Product.id == sale.product_id).first()
         product_name = product.name if product else "Unknown Product"
         
         # User/Salesman name
-        salesman_name = current_user.full_name # default if self
+        salesman_name = own_name # default if self
         if current_user.role == "manager":
             # If manager, fetch the salesman name
             s_user = db.query(auth_models.User).filter(auth_models.User.id == sale.user_id).first()
@@ -75,71 +85,95 @@ def get_dashboard_stats(
 
     return stats
 
+def _month_key(dialect: str):
+    """YYYY-MM of Sale.date, computed in the database."""
+    # Inline format literal so the SELECT and GROUP BY expressions compare equal on PostgreSQL
+    if dialect == "postgresql":
+        return func.to_char(Sale.date, literal_column("'YYYY-MM'"))
+    return func.strftime(literal_column("'%Y-%m'"), Sale.date)
+
+def _report_breakdowns(db: Session, filters):
+    """
+    Per-salesman, per-product and per-month totals in one round trip: GROUPING SETS on
+    PostgreSQL, UNION ALL of the three GROUP BYs elsewhere (SQLite). Every row is
+    (dimension, user_id, product_id, month, amount, orders, quantity) with only the key
+    of its own dimension set, so the result size is the number of distinct groups.
+    """
+    dialect = db.get_bind().dialect.name
+    month = _month_key(dialect)
+    amount = func.coalesce(func.sum(Sale.amount), 0)
+    orders = func.count(Sale.id)
+    quantity = func.coalesce(func.sum(Sale.quantity), 0)
+
+    if dialect == "postgresql":
+        dimension = case(
+            (func.grouping(Sale.user_id) == 0, literal("salesman")),
+            (func.grouping(Sale.product_id) == 0, literal("product")),
+            else_=literal("month")
+        )
+        stmt = select(
+            dimension, Sale.user_id, Sale.product_id, month, amount, orders, quantity
+        ).where(*filters).group_by(func.grouping_sets(
+            tuple_(Sale.user_id), tuple_(Sale.product_id), tuple_(month)
+        ))
+    else:
+        def grouped(name, key, user_id, product_id, month_value):
+            return select(
+                literal(name), user_id, product_id, month_value, amount, orders, quantity
+            ).where(*filters).group_by(key)
+        stmt = union_all(
+            grouped("salesman", Sale.user_id, Sale.user_id, null(), null()),
+            grouped("product", Sale.product_id, null(), Sale.product_id, null()),
+            grouped("month", month, null(), null(), month),
+        )
+
+    return db.execute(stmt).all()
+
 @router.get("/reports")
 def get_reports_data(
     start_date: str = None,
     end_date: str = None,
-    db: Session = Depends(get_db),
-    current_user: auth_models.User = Depends(utils.get_current_active_user)
+    db: Session = Depends(get_read_db),
+    current_user: utils.Principal = Depends(utils.get_current_principal)
 ):
-    from sqlalchemy.orm import joinedload
-    # Base query
-    query = db.query(Sale).filter(Sale.company_id == current_user.company_id)
-    
-    # Eager load
-    query = query.options(joinedload(Sale.user), joinedload(Sale.product))
-    
+    filters = [Sale.company_id == current_user.company_id]
     if current_user.role == "salesman":
-        query = query.filter(Sale.user_id == current_user.id)
-        
+        filters.append(Sale.user_id == current_user.id)
     if start_date:
-        query = query.filter(Sale.date >= start_date)
+        filters.append(Sale.date >= start_date)
     if end_date:
-        query = query.filter(Sale.date <= end_date)
-        
-    sales = query.all()
-    
-    # Aggregations
+        filters.append(Sale.date <= end_date)
+
+    rows = _report_breakdowns(db, filters)
+
+    # Resolve names once for the ids that appear
+    user_ids = {r[1] for r in rows if r[0] == "salesman" and r[1] is not None}
+    product_ids = {r[2] for r in rows if r[0] == "product" and r[2] is not None}
+    user_names = dict(db.query(auth_models.User.id, auth_models.User.full_name).filter(
+        auth_models.User.id.in_(user_ids)
+    )) if user_ids else {}
+    product_names = dict(db.query(Product.id, Product.name).filter(
+        Product.id.in_(product_ids)
+    )) if product_ids else {}
+
+    # Keyed by name as before; salesmen/products by revenue, months in calendar order
     sales_by_salesman = {}
     sales_by_product = {}
     sales_by_month = {}
-    
-    for sale in sales:
-        # Salesman
-        # Fetch name if not already loaded (ideally use eager loading)
-        s_name = "Unknown"
-        if sale.user:
-            s_name = sale.user.full_name
-        elif sale.user_id:
-             # Fallback if relationship not loaded? (It should be if lazy='joined' or just accessed)
-             # But let's be safe
-             u = db.query(auth_models.User).filter(auth_models.User.id == sale.user_id).first()
-             if u: s_name = u.full_name
-             
-        if s_name not in sales_by_salesman:
-            sales_by_salesman[s_name] = {"amount": 0, "count": 0}
-        sales_by_salesman[s_name]["amount"] += sale.amount
-        sales_by_salesman[s_name]["count"] += 1
-        
-        # Product
-        p_name = "Unknown Product"
-        if sale.product:
-            p_name = sale.product.name
-        elif sale.product_id:
-             p = db.query(Product).filter(Product.id == sale.product_id).first()
-             if p: p_name = p.name
-             
-        if p_name not in sales_by_product:
-            sales_by_product[p_name] = {"amount": 0, "count": 0}
-        sales_by_product[p_name]["amount"] += sale.amount
-        sales_by_product[p_name]["count"] += sale.quantity
-        
-        # Month
-        month_key = sale.date.strftime("%Y-%m") if sale.date else "Unknown"
-        if month_key not in sales_by_month:
-            sales_by_month[month_key] = 0
-        sales_by_month[month_key] += sale.amount
-        
+    for dimension, user_id, product_id, month, amount, orders, quantity in sorted(rows, key=lambda r: -r[4]):
+        if dimension == "salesman":
+            entry = sales_by_salesman.setdefault(user_names.get(user_id) or "Unknown", {"amount": 0, "count": 0})
+            entry["amount"] += amount
+            entry["count"] += orders
+        elif dimension == "product":
+            entry = sales_by_product.setdefault(product_names.get(product_id) or "Unknown Product", {"amount": 0, "count": 0})
+            entry["amount"] += amount
+            entry["count"] += quantity
+        else:
+            sales_by_month[month or "Unknown"] = amount
+
+    sales_by_month = dict(sorted(sales_by_month.items(), key=lambda item: (item[0] == "Unknown", item[0])))
+
     return {
         "sales_by_salesman": sales_by_salesman,
         "sales_by_product": sales_by_product,
@@ -147,108 +181,288 @@ def get_reports_data(
     }
 
 @router.get("/leaderboard")
-def get_leaderboard(
-    db: Session = Depends(get_db),
-    current_user: auth_models.User = Depends(utils.get_current_active_user)
+async def get_leaderboard(
+    period: str = "all",
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: utils.Principal = Depends(utils.get_current_principal)
 ):
-    # 1. Fetch company salesmen sales aggregation
-    # Query: User ID, Total Revenue, Total Quantity
-    results = db.query(
-        Sale.user_id,
-        func.sum(Sale.amount).label("total_revenue"),
-        func.sum(Sale.quantity).label("total_quantity")
-    ).filter(
-        Sale.company_id == current_user.company_id
-    ).group_by(Sale.user_id).order_by(func.sum(Sale.amount).desc()).all()
-
-    leaderboard = []
-    rank = 1
-    
-    # We need to fetch user details for each result
-    # In a larger app, we'd join User in the initial query, but here let's iterate or join
-    # Let's try to join for efficiency
-    
-    # Enhanced Query with Join
-    results = db.query(
-        auth_models.User,
-        func.sum(Sale.amount).label("total_revenue"),
-        func.sum(Sale.quantity).label("total_quantity")
-    ).join(Sale, Sale.user_id == auth_models.User.id).filter(
-        Sale.company_id == current_user.company_id
-    ).group_by(auth_models.User.id).order_by(func.sum(Sale.amount).desc()).all()
-
-    for user, revenue, quantity in results:
-        leaderboard.append({
+    """
+    Salesmen ranked by revenue over period (all, month or week), read from the materialized
+    leaderboard, or from the rollup when this company was written to since the last refresh.
+    source says which; refreshed_at / stale_seconds say how old the data is.
+    """
+    if period not in leaderboard.PERIODS:
+        raise HTTPException(status_code=400, detail=f"period must be one of: {', '.join(leaderboard.PERIODS)}")
+
+    results, refreshed_at, source = await leaderboard.read_async(db, current_user.company_id, period)
+
+    # Relationships can't lazy-load on an AsyncSession, so fetch the company name directly
+    company_name = await db.scalar(
+        select(auth_models.Company.name).where(auth_models.Company.id == current_user.company_id)
+    )
+
+    entries = []
+    for rank, row in enumerate(results, start=1):
+        entries.append({
             "rank": rank,
-            "name": user.full_name,
-            "avatar": user.full_name[0] if user.full_name else "?",
-            "revenue": revenue,
-            "quantity": quantity,
-            "sales_target": user.sales_target or 0,
-            "achieved_percent": (revenue / user.sales_target * 100) if user.sales_target else 0
+            "name": row.full_name,
+            "avatar": row.full_name[0] if row.full_name else "?",
+            "revenue": row.revenue,
+            "quantity": row.quantity,
+            "sales_target": row.sales_target or 0,
+            "achieved_percent": (row.revenue / row.sales_target * 100) if row.sales_target else 0
         })
-        rank += 1
-            
+
     return {
-        "company_name": current_user.company.name if current_user.company else "Your Company",
-        "leaderboard": leaderboard
+        "company_name": company_name or "Your Company",
+        "period": period,
+        "source": source,
+        "refreshed_at": refreshed_at.isoformat() if refreshed_at else None,
+        "stale_seconds": round((datetime.utcnow() - refreshed_at).total_seconds(), 1) if refreshed_at else None,
+        "leaderboard": entries
     }
 
 @router.get("/kpi/executive")
 def get_executive_kpis(
+    period_days: int = kpi.DEFAULT_PERIOD_DAYS,
+    # Primary, not the replica: results are cached under this process's write version
     db: Session = Depends(get_db),
-    current_user: auth_models.User = Depends(utils.get_current_active_user)
+    current_user: utils.Principal = Depends(utils.get_current_principal)
 ):
-    # Fetch all sales for company
-    sales = db.query(Sale).filter(Sale.company_id == current_user.company_id).all()
-    # Fetch salesman count
-    salesmen_count = db.query(auth_models.User).filter(
-        auth_models.User.company_id == current_user.company_id,
-        auth_models.User.role == "salesman"
-    ).count()
-    
-    df = advanced.get_sales_df(sales)
-    return advanced.calculate_kpis(df, salesmen_count)
+    """
+    Run rate, weekly active salesmen ratio and, per product / salesman / region, the top mover:
+    the largest change in daily revenue between the last period_days days and the period before.
+    """
+    if not 1 <= period_days <= kpi.MAX_PERIOD_DAYS:
+        raise HTTPException(status_code=400, detail=f"period_days must be between 1 and {kpi.MAX_PERIOD_DAYS}")
+    return kpi.executive.get(db, current_user.company_id, period_days)
+
+ABC_XYZ_DIMENSIONS = ["product", "category", "region", "salesman"]
+
+def _abc_xyz(db: Session, company_id: int, dimensions, start=None, end=None,
+             abc=advanced.ABC_THRESHOLDS, xyz=advanced.XYZ_THRESHOLDS):
+    """
+    Runs advanced.abc_xyz over the company's cached sales, memoized until its sales change.
+    Returns (window, {dimension: DataFrame}, product names).
+    """
+    products = db.query(Product.id, Product.name, Product.category).filter(Product.company_id == company_id).all()
+    categories = {p.id: p.category for p in products if p.category}
+    today = datetime.utcnow().date()
+
+    def compute(frame):
+        if frame.empty:
+            return None, {}
+        first_day = np.datetime64(start or frame["date"].min(), "D")
+        if end is not None:
+            stop = np.datetime64(end, "ns")
+        else:
+            stop = max(np.datetime64(today, "D") + 1, np.datetime64(frame["date"].max(), "D") + 1)
+        days = max(int(np.ceil((stop - first_day) / np.timedelta64(1, "D"))), 1)
+
+        columns = {
+            "product": lambda: frame["product_id"],
+            "category": lambda: frame["product_id"].map(categories),
+            "region": lambda: frame["region"],
+            "salesman": lambda: frame["user_id"],
+        }
+        keys = {dimension: columns[dimension]() for dimension in dimensions}
+        window = {"start": str(first_day), "days": days}
+        return window, advanced.abc_xyz(frame, keys, first_day, days, abc, xyz)
+
+    # The category map and "today" (for an open window) feed the result too
+    key = (
+        "abc_xyz", tuple(dimensions), abc, xyz,
+        hash(tuple(sorted(categories.items()))) if "category" in dimensions else None,
+        today if end is None else None,
+    )
+    window, tables = company_sales.derived(
+        db, company_id, key, ["date", "amount", "quantity", "product_id", "user_id", "region"], compute,
+        start=start, end=end
+    )
+    return window, tables, {p.id: p.name for p in products}
 
 @router.get("/products/abc")
 def get_abc_analysis(
-    db: Session = Depends(get_db),
-    current_user: auth_models.User = Depends(utils.get_current_active_user)
+    db: Session = Depends(get_read_db),
+    current_user: utils.Principal = Depends(utils.get_current_principal)
 ):
-    sales = db.query(Sale).filter(Sale.company_id == current_user.company_id).all()
-    products = db.query(Product).filter(Product.company_id == current_user.company_id).all()
-    
-    sales_df = advanced.get_sales_df(sales)
-    # simple product list
-    products_list = [{"id": p.id, "name": p.name} for p in products]
-    products_df = pd.DataFrame(products_list) if products_list else pd.DataFrame()
-    
-    return advanced.calculate_abc_analysis(sales_df, products_df)
+    _, tables, product_names = _abc_xyz(db, current_user.company_id, ["product"])
+    if "product" not in tables or tables["product"].empty:
+        return {}
+
+    table = tables["product"]
+    return [
+        {
+            "product_id": row.key,
+            "name": product_names.get(row.key, "Unknown Product"),
+            "amount": row.revenue,
+            "class": row.revenue_class,
+            "quantity_class": row.quantity_class,
+            "xyz": row.xyz,
+        }
+        for row in table.itertuples(index=False)
+    ]
+
+@router.get("/abc-xyz")
+def get_abc_xyz_analysis(
+    dimensions: str = ",".join(ABC_XYZ_DIMENSIONS),
+    start_date: str = None,
+    end_date: str = None,
+    a: float = advanced.ABC_THRESHOLDS[0],
+    b: float = advanced.ABC_THRESHOLDS[1],
+    x: float = advanced.XYZ_THRESHOLDS[0],
+    y: float = advanced.XYZ_THRESHOLDS[1],
+    db: Session = Depends(get_read_db),
+    current_user: utils.Principal = Depends(utils.get_current_principal)
+):
+    """
+    ABC (by revenue and by quantity) and XYZ (coefficient of variation of daily quantity)
+    classes per product, category, region and salesman over start_date <= date < end_date.
+    a/b are the cumulative revenue shares closing classes A and B, x/y the CV limits for X
+    and Y. "class" combines both, e.g. "AX".
+    """
+    selected = [d.strip() for d in dimensions.split(",") if d.strip()]
+    unknown = [d for d in selected if d not in ABC_XYZ_DIMENSIONS]
+    if unknown or not selected:
+        raise HTTPException(status_code=400, detail=f"dimensions must be among: {', '.join(ABC_XYZ_DIMENSIONS)}")
+    if not 0 < a <= b <= 1:
+        raise HTTPException(status_code=400, detail="Expected 0 < a <= b <= 1")
+    if not 0 < x <= y:
+        raise HTTPException(status_code=400, detail="Expected 0 < x <= y")
+    start = parse_date_param(start_date, "start_date")
+    end = parse_date_param(end_date, "end_date")
+
+    window, tables, product_names = _abc_xyz(db, current_user.company_id, selected, start, end, (a, b), (x, y))
+
+    user_ids = tables["salesman"]["key"].tolist() if "salesman" in tables else []
+    user_names = dict(db.query(auth_models.User.id, auth_models.User.full_name).filter(
+        auth_models.User.id.in_(user_ids)
+    )) if user_ids else {}
+    names = {
+        "product": lambda key: product_names.get(key, "Unknown Product"),
+        "category": lambda key: key,
+        "region": lambda key: key,
+        "salesman": lambda key: user_names.get(key, "Unknown"),
+    }
+
+    result = {"window": window, "thresholds": {"a": a, "b": b, "x": x, "y": y}}
+    for dimension in selected:
+        table = tables.get(dimension)
+        rows = [] if table is None else table.astype(object).where(table.notna(), None).to_dict("records")
+        for row in rows:
+            row["name"] = names[dimension](row["key"])
+        result[dimension] = rows
+    return result
+
+RFM_SORT_FIELDS = {"customer_name", "recency", "frequency", "monetary", "rfm_score", "segment"}
+RFM_MAX_PAGE_SIZE = 1000
 
 @router.get("/customers/rfm")
 def get_rfm_analysis(
-    db: Session = Depends(get_db),
-    current_user: auth_models.User = Depends(utils.get_current_active_user)
+    start_date: str = None,
+    end_date: str = None,
+    scheme: str = "thresholds",
+    sort: Optional[str] = None,
+    order: str = "desc",
+    limit: Optional[int] = None,
+    offset: int = 0,
+    db: Session = Depends(get_read_db),
+    current_user: utils.Principal = Depends(utils.get_current_principal)
 ):
-    sales = db.query(Sale).filter(Sale.company_id == current_user.company_id).all()
-    sales_df = advanced.get_sales_df(sales)
-    return advanced.calculate_rfm(sales_df)
+    """
+    Per-customer RFM over sales with start_date <= date < end_date (recency is measured from
+    end_date when given). scheme=scores segments on the 1-5 quantile scores instead of the
+    fixed thresholds. Without limit/offset this returns the full list as before; otherwise
+    {"items": [...], "total": n, "offset": offset, "limit": limit}.
+    """
+    start = parse_date_param(start_date, "start_date")
+    end = parse_date_param(end_date, "end_date")
+    if scheme not in ("thresholds", "scores"):
+        raise HTTPException(status_code=400, detail="scheme must be 'thresholds' or 'scores'")
+    if sort is not None and sort not in RFM_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(sorted(RFM_SORT_FIELDS))}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'")
+
+    sales_df = company_sales.frame(db, current_user.company_id, ["customer_name", "date", "amount"], start=start, end=end)
+    rules = advanced.RFM_SCORE_RULES if scheme == "scores" else advanced.RFM_RULES
+    rfm = advanced.rfm_table(sales_df, now=end, rules=rules)
+
+    if sort is not None:
+        rfm = rfm.sort_values(sort, ascending=order == "asc", kind="stable")
+
+    if limit is None and not offset:
+        return rfm.to_dict("records")
+
+    page_size = min(max(limit or RFM_MAX_PAGE_SIZE, 1), RFM_MAX_PAGE_SIZE)
+    offset = max(offset, 0)
+    return {
+        "items": rfm.iloc[offset:offset + page_size].to_dict("records"),
+        "total": len(rfm),
+        "offset": offset,
+        "limit": page_size
+    }
+
+def consistency_query(company_id: int, start=None, end=None, min_days: int = 1):
+    """
+    One row per salesman: active days, mean daily revenue and the sample variance of daily
+    revenue, computed from the daily rollup with window functions and joined to the name.
+    Variance is two-pass (deviations from the windowed mean), so it is exact on SQLite too.
+    """
+    rollup = SalesDailyRollup
+    filters = [rollup.company_id == company_id, rollup.user_id != 0]
+    if start is not None:
+        filters.append(rollup.day >= start.date())
+    if end is not None:
+        filters.append(rollup.day < end.date())
+
+    daily = select(
+        rollup.user_id, rollup.day, func.sum(rollup.amount).label("total")
+    ).where(*filters).group_by(rollup.user_id, rollup.day).cte("daily")
+
+    scored = select(
+        daily.c.user_id,
+        daily.c.total,
+        func.avg(daily.c.total).over(partition_by=daily.c.user_id).label("mean"),
+        func.count().over(partition_by=daily.c.user_id).label("days"),
+    ).cte("scored")
+
+    days = func.max(scored.c.days)
+    deviation = scored.c.total - scored.c.mean
+    return select(
+        scored.c.user_id,
+        auth_models.User.full_name,
+        days.label("days"),
+        func.max(scored.c.mean).label("mean"),
+        (func.sum(deviation * deviation) / func.nullif(days - 1, 0)).label("variance"),
+    ).outerjoin(
+        auth_models.User, auth_models.User.id == scored.c.user_id
+    ).group_by(scored.c.user_id, auth_models.User.full_name).having(days >= min_days).order_by(scored.c.user_id)
 
 @router.get("/salesmen/consistency")
 def get_salesman_consistency(
-    db: Session = Depends(get_db),
-    current_user: auth_models.User = Depends(utils.get_current_active_user)
+    start_date: str = None,
+    end_date: str = None,
+    min_days: int = 1,
+    db: Session = Depends(get_read_db),
+    current_user: utils.Principal = Depends(utils.get_current_principal)
 ):
-    sales = db.query(Sale).filter(Sale.company_id == current_user.company_id).all()
-    sales_df = advanced.get_sales_df(sales)
-    scores = advanced.calculate_consistency_score(sales_df)
-    
-    # Map user_id to name
-    user_ids = [s['user_id'] for s in scores]
-    users = db.query(auth_models.User).filter(auth_models.User.id.in_(user_ids)).all()
-    user_map = {u.id: u.full_name for u in users}
-    
-    for s in scores:
-        s['name'] = user_map.get(s['user_id'], 'Unknown')
-        
+    """
+    Per-salesman spread of daily revenue over start_date <= day < end_date, for salesmen
+    active on at least min_days days. cv = std / mean * 100 (lower is steadier).
+    """
+    start = parse_date_param(start_date, "start_date")
+    end = parse_date_param(end_date, "end_date")
+
+    scores = []
+    for user_id, name, days, mean, variance in db.execute(consistency_query(current_user.company_id, start, end, min_days)):
+        std = math.sqrt(max(float(variance), 0)) if variance is not None else 0.0
+        scores.append({
+            "user_id": user_id,
+            "std": std,
+            "mean": mean,
+            "count": days,
+            "cv": std / mean * 100 if mean and mean > 0 else 0,
+            "name": name or "Unknown",
+        })
     return scores
@@ -1,12 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+import database
 from auth import utils, models as auth_models
 from sales.router import Sale
+from sales.rank_index import salesmen as salesman_ranks
 from products.router import Product
 from datetime import datetime, timedelta
 import pandas as pd
+import asyncio
+import time
 from sales_predictor import SalesPredictor
 
 router = APIRouter(
@@ -14,72 +17,89 @@ router = APIRouter(
     tags=["Salesman Analytics"]
 )
 
+def _ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+async def _timed(timings: dict, name: str, section):
+    started = time.perf_counter()
+    try:
+        return await section
+    finally:
+        timings[name] = _ms(started)
+
+# Dashboard sections. Each opens its own session so they run concurrently on separate pooled
+# connections; a session only checks out a connection on its first query. The rank comes
+# from the in-memory rank index (sales/rank_index.py).
+async def _total_sales(sessions, user_id: int):
+    async with sessions() as db:
+        return await db.scalar(select(func.sum(Sale.amount)).where(Sale.user_id == user_id)) or 0.0
+
+async def _target(sessions, principal):
+    async with sessions() as db:
+        return (await principal.load_async(db)).sales_target or 0
+
+async def _product_distribution(sessions, user_id: int):
+    async with sessions() as db:
+        return (await db.execute(select(
+            Product.name, func.sum(Sale.amount).label("value")
+        ).join(Sale, Sale.product_id == Product.id).where(
+            Sale.user_id == user_id
+        ).group_by(Product.name))).all()
+
+async def _region_distribution(sessions, user_id: int):
+    async with sessions() as db:
+        return (await db.execute(select(
+            Sale.region, func.sum(Sale.amount).label("value")
+        ).where(
+            Sale.user_id == user_id,
+            Sale.region != None
+        ).group_by(Sale.region))).all()
+
+async def _daily_sales(sessions, user_id: int, since: datetime):
+    async with sessions() as db:
+        return (await db.execute(select(
+            func.date(Sale.date).label("date"), func.sum(Sale.amount).label("amount")
+        ).where(
+            Sale.user_id == user_id,
+            Sale.date >= since
+        ).group_by(func.date(Sale.date)).order_by("date"))).all()
+
 @router.get("/dashboard")
-def get_salesman_dashboard_data(
-    db: Session = Depends(get_db),
-    current_user: auth_models.User = Depends(utils.get_current_active_user)
+async def get_salesman_dashboard_data(
+    response: Response,
+    sessions = Depends(database.async_read_sessions),
+    current_user: utils.Principal = Depends(utils.get_current_principal)
 ):
+    """
+    The salesman's KPIs, charts and a naive forecast. The sections are independent queries run
+    concurrently; per-section times are in the Server-Timing header.
+    """
     # Ensure role is salesman (or manager viewing as salesman?)
     # For now assume current user is the salesman
     user_id = current_user.id
-    
-    # 1. Total Sales & Earnings
-    total_sales_query = db.query(func.sum(Sale.amount)).filter(Sale.user_id == user_id)
-    total_sales = total_sales_query.scalar() or 0.0
-    
+    started = time.perf_counter()
+    timings = {}
+
+    # Sales trend covers the last 30 days
+    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    total_sales, target, rank, product_dist, region_dist, daily_sales = await asyncio.gather(
+        _timed(timings, "sales_total", _total_sales(sessions, user_id)),
+        _timed(timings, "target", _target(sessions, current_user)),
+        _timed(timings, "rank", salesman_ranks.rank(current_user.company_id, user_id)),
+        _timed(timings, "products", _product_distribution(sessions, user_id)),
+        _timed(timings, "regions", _region_distribution(sessions, user_id)),
+        _timed(timings, "trend", _daily_sales(sessions, user_id, thirty_days_ago)),
+    )
+
     # Commission Calculation (e.g., 5% of sales)
     commission_rate = 0.05
     earnings = total_sales * commission_rate
-    
-    # 2. Target vs Achieved
-    target = current_user.sales_target or 0
     achieved_percent = (total_sales / target * 100) if target > 0 else 0
-    
-    # 3. Rank (within company)
-    # Get total sales for all salesmen in company
-    company_salesmen_sales = db.query(
-        Sale.user_id, func.sum(Sale.amount).label("total")
-    ).filter(
-        Sale.company_id == current_user.company_id
-    ).group_by(Sale.user_id).order_by(func.sum(Sale.amount).desc()).all()
-    
-    rank = 1
-    for s_id, amount in company_salesmen_sales:
-        if s_id == user_id:
-            break
-        rank += 1
-        
-    # 4. Product-wise Distribution
-    product_dist = db.query(
-        Product.name, func.sum(Sale.amount).label("value")
-    ).join(Sale).filter(
-        Sale.user_id == user_id
-    ).group_by(Product.name).all()
-    
+
     product_data = [{"name": p[0], "value": p[1]} for p in product_dist]
-    
-    # 5. Region-wise Sales
-    region_dist = db.query(
-        Sale.region, func.sum(Sale.amount).label("value")
-    ).filter(
-        Sale.user_id == user_id,
-        Sale.region != None
-    ).group_by(Sale.region).all()
-    
     region_data = [{"name": r[0], "value": r[1]} for r in region_dist]
-    
-    # 6. Sales Trend (Daily/Monthly)
-    # Get sales for last 30 days for chart
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    daily_sales = db.query(
-        func.date(Sale.date).label("date"), func.sum(Sale.amount).label("amount")
-    ).filter(
-        Sale.user_id == user_id,
-        Sale.date >= thirty_days_ago
-    ).group_by(func.date(Sale.date)).order_by("date").all()
-    
     trend_data = [{"date": str(d[0]), "amount": d[1]} for d in daily_sales]
-    
+
     # 7. Prediction
     # We need to instantiate predictor and filter for this user
     # Does SalesPredictor support filtering? Not yet. define basic prediction here or update it.
@@ -95,6 +115,9 @@ def get_salesman_dashboard_data(
             "trend": "Stable" # Placeholder
         }
 
+    timings["dashboard"] = _ms(started)
+    response.headers["Server-Timing"] = ", ".join(f"{name};dur={ms}" for name, ms in timings.items())
+
     return {
         "kpi": {
             "total_sales": total_sales,
@@ -110,3 +133,30 @@ def get_salesman_dashboard_data(
         },
         "prediction": prediction_summary
     }
+
+MAX_RANK_LIST = 100
+
+@router.get("/rank")
+async def get_salesman_rank(
+    top: int = 10,
+    around: int = 2,
+    db: AsyncSession = Depends(database.get_async_read_db),
+    current_user: utils.Principal = Depends(utils.get_current_principal)
+):
+    """
+    The current user's rank by revenue within the company, the top salesmen and the salesmen
+    either side of them, from the in-memory rank index.
+    """
+    if not 0 <= top <= MAX_RANK_LIST or not 0 <= around <= MAX_RANK_LIST:
+        raise HTTPException(status_code=400, detail=f"top and around must be between 0 and {MAX_RANK_LIST}")
+
+    standings = await salesman_ranks.standings(current_user.company_id, current_user.id, top, around)
+
+    user_ids = {e["user_id"] for e in standings["top"] + standings["around"]}
+    names = dict((await db.execute(
+        select(auth_models.User.id, auth_models.User.full_name).where(auth_models.User.id.in_(user_ids))
+    )).all()) if user_ids else {}
+    for entry in standings["top"] + standings["around"]:
+        entry["name"] = names.get(entry["user_id"])
+    return standings
+
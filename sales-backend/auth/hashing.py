@@ -0,0 +1,158 @@
+from passlib.context import CryptContext
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import asyncio
+import multiprocessing
+import os
+import threading
+
+# Password hashing off the request threads. bcrypt is deliberately slow, so a burst of logins
+# used to tie up the whole threadpool; here it runs in a small process pool with a cap on
+# queued work, and callers get a fast 503 instead of waiting when the cap is reached.
+# This module is imported by the pool's worker processes too, so it must stay light.
+
+# bcrypt cost factor. Hashes with a different cost are rehashed on the next successful login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Worker processes; 0 hashes in the calling thread (scripts, tests)
+WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(max((os.cpu_count() or 2) // 2, 1))))
+# Hash/verify calls allowed in flight (running + queued) before new ones are refused
+QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", str(max(WORKERS, 1) * 4)))
+# Passwords per task for bulk hashing; small so logins queued behind a batch don't wait long
+BULK_BATCH_SIZE = 8
+# Bulk hashing waits this long for a free slot instead of failing fast like logins do
+BULK_WAIT_SECONDS = float(os.getenv("PASSWORD_HASH_BULK_WAIT_SECONDS", "60"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+class HashingBusy(Exception):
+    """The hashing queue is full."""
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+def _hash_batch(passwords):
+    return [pwd_context.hash(p) for p in passwords]
+
+def _verify_and_update(password: str, hashed: str):
+    """(valid, new hash or None): the new hash is set when the stored cost isn't BCRYPT_ROUNDS."""
+    if not hashed:
+        return False, None
+    try:
+        return pwd_context.verify_and_update(password, hashed)
+    except ValueError:
+        # Not a hash this context recognises
+        return False, None
+
+class HashingPool:
+    def __init__(self, workers: int = WORKERS, queue_limit: int = QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.slots = threading.BoundedSemaphore(queue_limit)
+        self.executor = None
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _executor(self):
+        with self.lock:
+            if self.executor is None:
+                # spawn: forking a process that runs threads (uvicorn, pool monitors) isn't safe.
+                # Spawned workers re-import the app's __main__ (main.py), which is why its startup
+                # work lives in the lifespan handler rather than at import time.
+                self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self.executor
+
+    def _release(self, _future=None):
+        with self.lock:
+            self.in_flight -= 1
+            self.completed += 1
+        self.slots.release()
+
+    def submit(self, fn, *args, wait_seconds: float = None):
+        """
+        Schedules fn(*args) and returns a concurrent future. When the queue is full it raises
+        HashingBusy right away, or after waiting up to wait_seconds for a slot.
+        """
+        acquired = self.slots.acquire(blocking=False) if wait_seconds is None else self.slots.acquire(timeout=wait_seconds)
+        if not acquired:
+            with self.lock:
+                self.rejected += 1
+            raise HashingBusy()
+        with self.lock:
+            self.in_flight += 1
+        try:
+            future = self._executor().submit(fn, *args)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def run(self, fn, *args):
+        """Blocking call, for sync handlers. Only queue_limit threads can be waiting here at once."""
+        if self.workers <= 0:
+            return fn(*args)
+        return self.submit(fn, *args).result()
+
+    async def run_async(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def stats(self):
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "queue_limit": self.queue_limit,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "bcrypt_rounds": BCRYPT_ROUNDS,
+            }
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
+
+pool = HashingPool()
+
+def hash_password(password: str) -> str:
+    return pool.run(_hash, password)
+
+def verify_and_update(password: str, hashed: str):
+    return pool.run(_verify_and_update, password, hashed)
+
+async def hash_password_async(password: str) -> str:
+    return await pool.run_async(_hash, password)
+
+async def verify_and_update_async(password: str, hashed: str):
+    return await pool.run_async(_verify_and_update, password, hashed)
+
+def hash_many(passwords):
+    """
+    Hashes a list of passwords (bulk onboarding). At most one batch per worker is in flight,
+    so the rest of the queue stays free for logins. When logins fill the queue each batch waits
+    for a slot (up to BULK_WAIT_SECONDS) rather than failing an upload that is partly hashed.
+    """
+    if pool.workers <= 0:
+        return _hash_batch(passwords)
+    batches = [passwords[i:i + BULK_BATCH_SIZE] for i in range(0, len(passwords), BULK_BATCH_SIZE)]
+    results = [None] * len(batches)
+    pending = {}
+    next_batch = 0
+    while next_batch < len(batches) or pending:
+        while next_batch < len(batches) and len(pending) < pool.workers:
+            pending[pool.submit(_hash_batch, batches[next_batch], wait_seconds=BULK_WAIT_SECONDS)] = next_batch
+            next_batch += 1
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            results[pending.pop(future)] = future.result()
+    return [hashed for batch in results for hashed in batch]
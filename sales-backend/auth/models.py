@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -33,5 +33,11 @@ class User(Base):
     sales_target = Column(Integer, nullable=True)
     company_id = Column(Integer, ForeignKey("companies.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Bumped to invalidate every token issued to this user (the "ver" claim)
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     company = relationship("Company", back_populates="users")
+
+    __table_args__ = (
+        Index("ix_users_company_role", "company_id", "role"),
+    )
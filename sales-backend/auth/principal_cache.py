@@ -0,0 +1,141 @@
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from collections import OrderedDict
+from auth import models
+import os
+import threading
+import time
+
+# How long a looked-up user is trusted before it is read again. Invalidation is per process,
+# so this also bounds how stale another worker's copy can be after an update or delete.
+TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+
+class PrincipalCache:
+    """
+    TTL + LRU cache of authenticated users keyed by token subject (email).
+    Entries are column snapshots rather than ORM instances, so they are never shared between sessions.
+    """
+    def __init__(self, ttl_seconds: float = TTL_SECONDS, max_entries: int = MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries = OrderedDict() # subject -> (expires_at, column values)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, subject: str):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(subject)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, values = entry
+            if expires_at <= now:
+                del self.entries[subject]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(subject)
+            self.hits += 1
+            return values
+
+    def put(self, subject: str, user: models.User):
+        if self.ttl_seconds <= 0:
+            return
+        values = {attr.key: getattr(user, attr.key) for attr in inspect(models.User).column_attrs}
+        with self.lock:
+            self.entries[subject] = (time.monotonic() + self.ttl_seconds, values)
+            self.entries.move_to_end(subject)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *subjects: str):
+        with self.lock:
+            for subject in subjects:
+                if subject and self.entries.pop(subject, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    @staticmethod
+    def detached(values: dict) -> models.User:
+        """
+        A detached User built from a snapshot. Pass it to session.merge(user, load=False) to get
+        a session-bound instance without a SELECT (relationships still lazy-load).
+        """
+        user = models.User(**values)
+        make_transient_to_detached(user)
+        return user
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+principals = PrincipalCache()
+
+# Per-user token version (users.token_version). Tokens carry it as the "ver" claim and stop
+# validating once it is bumped. Cached so the claims-only path doesn't read the row per request.
+VERSION_TTL_SECONDS = float(os.getenv("AUTH_TOKEN_VERSION_TTL_SECONDS", "30"))
+
+# Recorded for users deleted in this process so their tokens fail immediately here
+DELETED = -1
+
+class TokenVersions:
+    def __init__(self, ttl_seconds: float = VERSION_TTL_SECONDS, max_entries: int = MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries = OrderedDict() # user_id -> (expires_at, version)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None or entry[0] <= now:
+                self.entries.pop(user_id, None)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id: int, version: int):
+        with self.lock:
+            self.entries[user_id] = (time.monotonic() + self.ttl_seconds, version)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+            }
+
+token_versions = TokenVersions()
@@ -1,15 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_db, get_async_db
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 from auth import models, utils, schemas
+from auth.principal_cache import principals
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-import traceback
+import logging
 import shutil
 import os
 import uuid
 from database import engine
 from utils import dynamic_tables
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(
     prefix="/auth",
     tags=["Authentication"]
@@ -61,9 +67,8 @@ def register(
         
         # 2. Handle Logo Upload
         logo_url = None
-        print(f"DEBUG: Received logo: {logo}")
         if logo:
-            print(f"DEBUG: Logo filename: {logo.filename}")
+            logger.debug("Received logo %s", logo.filename)
             try:
                 # Create static/logos directory if not exists (redundant if main.py does it but safe)
                 os.makedirs("static/logos", exist_ok=True)
@@ -77,7 +82,7 @@ def register(
                 
                 logo_url = f"/static/logos/{filename}"
             except Exception as e:
-                print(f"Error saving logo: {e}")
+                logger.warning("Error saving logo: %s", e)
                 # Continue without logo if upload fails? Or raise error? 
                 # Let's log and continue for now.
 
@@ -105,13 +110,14 @@ def register(
         )
         db.add(new_user)
         db.commit()
+        principals.invalidate(new_user.email)
         db.refresh(new_user)
         
         # Dynamic table creation removed. Salesmen reuse Users table.
 
         # 6. Generate Token
         access_token = utils.create_access_token(
-            data={"sub": new_user.email, "role": new_user.role, "company_id": new_company.id}
+            data=utils.token_claims(new_user)
         )
         
         return {
@@ -132,36 +138,37 @@ def register(
     except HTTPException:
         raise 
     except Exception as e:
-        traceback.print_exc()
+        logger.exception("Registration failed")
         db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Internal Server Error: {str(e)}"
         )
 
-import sys
-
 @router.post("/login")
-def login(login_data: schemas.LoginRequest, db: Session = Depends(get_db)):
-    print(f"DEBUG: Login attempt for {login_data.email}")
-    print(f"DEBUG: Login payload: {login_data.dict()}")
-    sys.stdout.flush()
-    
-    user = db.query(models.User).filter(models.User.email == login_data.email).first()
+async def login(login_data: schemas.LoginRequest, db: AsyncSession = Depends(get_async_db)):
+    # Async so that requests waiting on bcrypt don't hold threadpool slots
+    result = await db.execute(
+        select(models.User).options(selectinload(models.User.company)).where(models.User.email == login_data.email)
+    )
+    user = result.scalars().first()
     if not user:
-        print(f"DEBUG: User not found: {login_data.email}")
-        sys.stdout.flush()
+        logger.info("Login failed: unknown email", extra={"email": login_data.email})
         raise HTTPException(status_code=400, detail="Incorrect email or password")
     
-    if not utils.verify_password(login_data.password, user.hashed_password):
-        print(f"DEBUG: Password verification failed for {login_data.email}")
-        print(f"DEBUG: Hashed in DB: {user.hashed_password}")
-        print(f"DEBUG: Input Password: {login_data.password}")
-        sys.stdout.flush()
+    valid, new_hash = await utils.verify_password_async(login_data.password, user.hashed_password)
+    if not valid:
+        logger.info("Login failed: wrong password", extra={"email": login_data.email})
         raise HTTPException(status_code=400, detail="Incorrect email or password")
+
+    if new_hash:
+        # Stored with a different bcrypt cost than BCRYPT_ROUNDS: upgrade it while we have the password
+        user.hashed_password = new_hash
+        await db.commit()
+        principals.invalidate(user.email)
         
     access_token = utils.create_access_token(
-        data={"sub": user.email, "role": user.role, "company_id": user.company_id}
+        data=utils.token_claims(user)
     )
     
     company_data = None
@@ -216,13 +223,14 @@ def register_salesman(salesman_data: schemas.SalesmanRegisterRequest, db: Sessio
         )
         db.add(new_user)
         db.commit()
+        principals.invalidate(new_user.email)
         db.refresh(new_user)
 
         # Dynamic table insertion removed. Salesmen reuse Users table.
 
         # Generate Token
         access_token = utils.create_access_token(
-            data={"sub": new_user.email, "role": new_user.role, "company_id": new_user.company_id}
+            data=utils.token_claims(new_user)
         )
 
         return {
@@ -243,6 +251,6 @@ def register_salesman(salesman_data: schemas.SalesmanRegisterRequest, db: Sessio
     except HTTPException:
         raise
     except Exception as e:
-        traceback.print_exc()
+        logger.exception("Salesman registration failed")
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
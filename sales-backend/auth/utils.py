@@ -1,65 +1,223 @@
-from passlib.context import CryptContext
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-import sys
+import logging
 
 # Configuration (Move to env vars in production)
 SECRET_KEY = "salesportal_secret_key_change_this_production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 1 day
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from auth import hashing
+
+# bcrypt runs in auth/hashing.py's process pool; BCRYPT_ROUNDS sets the cost
+pwd_context = hashing.pwd_context
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    with hashing_guard():
+        return hashing.verify_and_update(plain_password, hashed_password)[0]
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    with hashing_guard():
+        return hashing.hash_password(password)
+
+async def verify_password_async(plain_password, hashed_password):
+    """(valid, new hash or None); a new hash means the stored one should be replaced."""
+    with hashing_guard():
+        return await hashing.verify_and_update_async(plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    with hashing_guard():
+        return await hashing.hash_password_async(password)
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, get_async_db, AsyncSessionLocal
 # Circular import avoidance: We cannot import valid models here easily if they import utils.
 # We will do dynamic import or move this to a separate dependencies.py
 # For now, let's keep it simple and assume models is importable.
 from auth import models # This works if models doesn't import utils (it doesn't seems so)
+from auth.principal_cache import principals, token_versions, DELETED
+
+logger = logging.getLogger(__name__)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-def get_current_active_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+@contextmanager
+def hashing_guard():
+    # A full hashing queue is answered straight away rather than piling up more waiting requests
+    try:
+        yield
+    except hashing.HashingBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many sign-in requests, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+
+def credentials_error():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def decode_token(token: str, credentials_exception: HTTPException) -> dict:
     try:
-        # DEBUG LOGGING
-        print(f"DEBUG: Validating token: {token[:10]}...") 
-        sys.stdout.flush()
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        print(f"DEBUG: Decoded payload: {payload}")
-        sys.stdout.flush()
-        username: str = payload.get("sub")
-        if username is None:
-            print("DEBUG: Username is None in payload")
-            sys.stdout.flush()
+        if payload.get("sub") is None:
+            logger.debug("Token has no subject")
             raise credentials_exception
     except JWTError as e:
-        print(f"DEBUG: JWTError: {e}")
-        sys.stdout.flush()
+        logger.debug("Invalid token: %s", e)
+        raise credentials_exception
+    return payload
+
+def decode_token_subject(token: str, credentials_exception: HTTPException) -> str:
+    return decode_token(token, credentials_exception)["sub"]
+
+def _check_version(payload: dict, user, credentials_exception: HTTPException):
+    # Tokens issued before versioning have no "ver" claim and count as version 0
+    if payload.get("ver", 0) != (user.token_version or 0):
         raise credentials_exception
+
+def get_current_active_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    credentials_exception = credentials_error()
+    payload = decode_token(token, credentials_exception)
+    username = payload["sub"]
+
+    cached = principals.get(username)
+    if cached is not None:
+        user = db.merge(principals.detached(cached), load=False)
+        _check_version(payload, user, credentials_exception)
+        return user
     
     user = db.query(models.User).filter(models.User.email == username).first()
     if user is None:
-        print(f"DEBUG: User not found for email: {username}")
+        logger.debug("No user for token subject %s", username)
         raise credentials_exception
     
-    print(f"DEBUG: User authenticated: {user.email}")
-    sys.stdout.flush()
+    principals.put(username, user)
+    _check_version(payload, user, credentials_exception)
+    return user
+
+async def _load_user_async(db: AsyncSession, username: str):
+    cached = principals.get(username)
+    if cached is not None:
+        return await db.merge(principals.detached(cached), load=False)
+
+    result = await db.execute(select(models.User).where(models.User.email == username))
+    user = result.scalars().first()
+    if user is not None:
+        principals.put(username, user)
     return user
 
+async def get_current_active_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    """Same as get_current_active_user, for async endpoints using get_async_db."""
+    credentials_exception = credentials_error()
+    payload = decode_token(token, credentials_exception)
+    username = payload["sub"]
+
+    user = await _load_user_async(db, username)
+    if user is None:
+        logger.debug("No user for token subject %s", username)
+        raise credentials_exception
+
+    _check_version(payload, user, credentials_exception)
+    return user
+
+# --- Claims-only Principal ---
+# Read endpoints only need who the caller is (id, role, company), which the token already says.
+# get_current_principal verifies the token and checks its version against a cached counter,
+# so it normally doesn't touch the database at all. Use get_current_active_user where the
+# users row itself is needed, or principal.load()/load_async() to fetch it on demand.
+
+class Principal:
+    __slots__ = ("id", "email", "role", "company_id")
+
+    def __init__(self, id: int, email: str, role: str, company_id: int):
+        self.id = id
+        self.email = email
+        self.role = role
+        self.company_id = company_id
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(id=user.id, email=user.email, role=user.role, company_id=user.company_id)
+
+    def load(self, db: Session):
+        """The users row for this principal (from the principal cache when possible)."""
+        cached = principals.get(self.email)
+        if cached is not None:
+            return db.merge(principals.detached(cached), load=False)
+        user = db.query(models.User).filter(models.User.id == self.id).first()
+        if user is None:
+            raise credentials_error()
+        principals.put(user.email, user)
+        return user
+
+    async def load_async(self, db: AsyncSession):
+        user = await _load_user_async(db, self.email)
+        if user is None or user.id != self.id:
+            raise credentials_error()
+        return user
+
+async def _token_version(user_id: int):
+    version = token_versions.get(user_id)
+    if version is None:
+        async with AsyncSessionLocal() as db:
+            version = (await db.execute(
+                select(models.User.token_version).where(models.User.id == user_id)
+            )).scalar()
+        version = DELETED if version is None else version
+        token_versions.put(user_id, version)
+    return version
+
+async def get_current_principal(token: str = Depends(oauth2_scheme)) -> Principal:
+    credentials_exception = credentials_error()
+    payload = decode_token(token, credentials_exception)
+
+    if payload.get("user_id") is None:
+        # Issued before user_id was added to tokens: fall back to the row until it expires
+        async with AsyncSessionLocal() as db:
+            user = await _load_user_async(db, payload["sub"])
+        if user is None:
+            raise credentials_exception
+        _check_version(payload, user, credentials_exception)
+        return Principal.from_user(user)
+
+    version = await _token_version(payload["user_id"])
+    if version == DELETED or payload.get("ver", 0) != version:
+        raise credentials_exception
+    return Principal(
+        id=payload["user_id"], email=payload["sub"], role=payload.get("role"), company_id=payload.get("company_id")
+    )
+
+def token_claims(user) -> dict:
+    return {
+        "sub": user.email,
+        "user_id": user.id,
+        "role": user.role,
+        "company_id": user.company_id,
+        "ver": user.token_version or 0,
+    }
+
+def revoke_tokens(user):
+    """Invalidates every token issued to the user once committed; follow the commit with forget_user()."""
+    user.token_version = (user.token_version or 0) + 1
+
+def forget_user(user_id: int, email: str, token_version: int = DELETED):
+    """
+    Drops this process's cached state for a user that was changed or deleted (call after committing).
+    Other workers notice within AUTH_CACHE_TTL_SECONDS / AUTH_TOKEN_VERSION_TTL_SECONDS.
+    """
+    principals.invalidate(email)
+    token_versions.put(user_id, token_version)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
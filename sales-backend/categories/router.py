@@ -5,6 +5,9 @@ from database import get_db
 from auth import utils, models as auth_models
 from .models import Category
 from .schemas import CategoryCreate, CategoryResponse
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/api/categories",
@@ -43,30 +46,22 @@ def delete_category(
     db: Session = Depends(get_db),
     current_user: auth_models.User = Depends(utils.get_current_active_user)
 ):
-    print(f"DEBUG: Delete Category Request - User: {current_user.email}, Role: {current_user.role}, Company: {current_user.company_id}, TargetCategory: {category_id}")
-    
-    if current_user.role != "manager":
-         print("DEBUG: User is not manager")
-         raise HTTPException(status_code=403, detail="Only managers can delete categories")
-         
-    print(f"DEBUG: Delete Category Request - User: {current_user.email}, Role: {current_user.role}, Company: {current_user.company_id}, TargetCategory: {category_id}")
+    logger.debug("Delete category %s requested", category_id, extra={
+        "user": current_user.email, "role": current_user.role, "company_id": current_user.company_id
+    })
     
     if current_user.role != "manager":
-         print("DEBUG: User is not manager")
          raise HTTPException(status_code=403, detail="Only managers can delete categories")
          
     # First, find the category ANYWHERE
     category = db.query(Category).filter(Category.id == category_id).first()
     
     if not category:
-        print(f"DEBUG: Category {category_id} does not exist in DB")
         raise HTTPException(status_code=404, detail="Category not found in database")
         
-    print(f"DEBUG: Found category {category.id}, Name: {category.name}, Company: {category.company_id}")
-    
     # Then check ownership
     if category.company_id != current_user.company_id:
-        print(f"DEBUG: Ownership mismatch! User Company: {current_user.company_id} vs Category Company: {category.company_id}")
+        logger.info("Category %s belongs to company %s, not %s", category.id, category.company_id, current_user.company_id)
         raise HTTPException(status_code=403, detail=f"Permission denied: Category belongs to company {category.company_id}, you are company {current_user.company_id}")
 
     db.delete(category)
@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, exc
-from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, desc, exc, case, and_, select
+from database import get_read_db, get_async_read_db
 from auth import utils, models as auth_models
 from sales.router import Sale
+from sales.rollup import SalesDailyRollup
 from products.router import Product
 
 from . import schemas
@@ -16,30 +18,37 @@ router = APIRouter(
 )
 
 @router.get("/summary", response_model=schemas.DashboardSummary)
-def get_dashboard_summary(
-    db: Session = Depends(get_db),
-    current_user: auth_models.User = Depends(utils.get_current_active_user)
+async def get_dashboard_summary(
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: utils.Principal = Depends(utils.get_current_principal)
 ):
-    # Base query filtered by company
-    query = db.query(Sale).filter(Sale.company_id == current_user.company_id)
+    # Growth compares the last 30 days with the previous 30 days
+    today = datetime.utcnow().date()
+    last_30_days = today - timedelta(days=30)
+    prev_30_days = last_30_days - timedelta(days=30)
+
+    # All four figures come from one pass over the daily rollup
+    query = select(
+        func.sum(SalesDailyRollup.amount),
+        func.sum(SalesDailyRollup.orders),
+        func.sum(case((SalesDailyRollup.day >= last_30_days, SalesDailyRollup.amount), else_=0)),
+        func.sum(case(
+            (and_(SalesDailyRollup.day >= prev_30_days, SalesDailyRollup.day < last_30_days), SalesDailyRollup.amount),
+            else_=0
+        ))
+    ).where(SalesDailyRollup.company_id == current_user.company_id)
     
     # Filter by Salesman if applicable
     if current_user.role == "salesman":
-        query = query.filter(Sale.user_id == current_user.id)
+        query = query.where(SalesDailyRollup.user_id == current_user.id)
 
-    # Current Stats
-    total_revenue = query.with_entities(func.sum(Sale.amount)).scalar() or 0.0
-    total_orders = query.count()
+    total_revenue, total_orders, current_period_revenue, prev_period_revenue = (await db.execute(query)).one()
+    total_revenue = total_revenue or 0.0
+    total_orders = int(total_orders or 0)
+    current_period_revenue = current_period_revenue or 0.0
+    prev_period_revenue = prev_period_revenue or 0.0
     avg_order_value = (total_revenue / total_orders) if total_orders > 0 else 0.0
 
-    # Calculate Growth (Last 30 days vs Previous 30 days)
-    today = datetime.utcnow()
-    last_30_days = today - timedelta(days=30)
-    prev_30_days = last_30_days - timedelta(days=30)
-
-    current_period_revenue = query.filter(Sale.date >= last_30_days).with_entities(func.sum(Sale.amount)).scalar() or 0.0
-    prev_period_revenue = query.filter(Sale.date >= prev_30_days, Sale.date < last_30_days).with_entities(func.sum(Sale.amount)).scalar() or 0.0
-
     growth = 0.0
     if prev_period_revenue > 0:
         growth = ((current_period_revenue - prev_period_revenue) / prev_period_revenue) * 100
@@ -54,28 +63,26 @@ def get_dashboard_summary(
     }
 
 @router.get("/charts/sales-trend", response_model=List[schemas.ChartDataPoint])
-def get_sales_trend(
+async def get_sales_trend(
     days: int = 30,
-    db: Session = Depends(get_db),
-    current_user: auth_models.User = Depends(utils.get_current_active_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: utils.Principal = Depends(utils.get_current_principal)
 ):
-    from typing import List
-    
-    start_date = datetime.utcnow() - timedelta(days=days)
+    start_date = (datetime.utcnow() - timedelta(days=days)).date()
     
-    query = db.query(
-        func.date(Sale.date).label('date'),
-        func.sum(Sale.amount).label('amount'),
-        func.count(Sale.id).label('orders')
-    ).filter(
-        Sale.company_id == current_user.company_id,
-        Sale.date >= start_date
+    query = select(
+        SalesDailyRollup.day.label('date'),
+        func.sum(SalesDailyRollup.amount).label('amount'),
+        func.sum(SalesDailyRollup.orders).label('orders')
+    ).where(
+        SalesDailyRollup.company_id == current_user.company_id,
+        SalesDailyRollup.day >= start_date
     )
 
     if current_user.role == "salesman":
-        query = query.filter(Sale.user_id == current_user.id)
+        query = query.where(SalesDailyRollup.user_id == current_user.id)
 
-    results = query.group_by(func.date(Sale.date)).all()
+    results = (await db.execute(query.group_by(SalesDailyRollup.day).order_by(SalesDailyRollup.day))).all()
     
     # Format results
     chart_data = []
@@ -83,45 +90,41 @@ def get_sales_trend(
         chart_data.append({
             "date": str(r.date),
             "amount": float(r.amount or 0),
-            "orders": r.orders
+            "orders": int(r.orders or 0)
         })
     
-    # Sort by date
-    chart_data.sort(key=lambda x: x['date'])
     return chart_data
 
 @router.get("/recent-sales", response_model=List[schemas.RecentSaleSchema])
-def get_recent_sales(
+async def get_recent_sales(
     limit: int = 5,
-    db: Session = Depends(get_db),
-    current_user: auth_models.User = Depends(utils.get_current_active_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: utils.Principal = Depends(utils.get_current_principal)
 ):
-    query = db.query(Sale).filter(Sale.company_id == current_user.company_id)
+    # Names come from outer joins in the same statement
+    query = select(
+        Sale.id,
+        func.coalesce(Product.name, "Unknown").label("product_name"),
+        Sale.amount,
+        Sale.date,
+        func.coalesce(auth_models.User.full_name, "Unknown").label("salesman_name")
+    ).outerjoin(Product, Product.id == Sale.product_id).outerjoin(
+        auth_models.User, auth_models.User.id == Sale.user_id
+    ).where(Sale.company_id == current_user.company_id)
     
     if current_user.role == "salesman":
-        query = query.filter(Sale.user_id == current_user.id)
+        query = query.where(Sale.user_id == current_user.id)
         
-    sales = query.order_by(desc(Sale.date)).limit(limit).all()
+    sales = (await db.execute(query.order_by(desc(Sale.date)).limit(limit))).all()
     
     result = []
     for sale in sales:
-        # Fetch Product Name
-        product = db.query(Product).filter(Product.id == sale.product_id).first()
-        product_name = product.name if product else "Unknown"
-
-        # Fetch Salesman Name (User)
-        salesman_name = "Unknown"
-        if sale.user_id:
-             user = db.query(auth_models.User).filter(auth_models.User.id == sale.user_id).first()
-             if user:
-                 salesman_name = user.full_name
-        
         result.append({
             "id": sale.id,
-            "product_name": product_name,
+            "product_name": sale.product_name,
             "amount": sale.amount,
             "date": sale.date,
-            "salesman_name": salesman_name,
+            "salesman_name": sale.salesman_name,
             "status": "Completed" 
         })
     
@@ -130,28 +133,28 @@ def get_recent_sales(
 @router.get("/top-products", response_model=List[schemas.TopProductSchema])
 def get_top_products(
     limit: int = 5,
-    db: Session = Depends(get_db),
-    current_user: auth_models.User = Depends(utils.get_current_active_user)
+    db: Session = Depends(get_read_db),
+    current_user: utils.Principal = Depends(utils.get_current_principal)
 ):
-    # Aggregation to find top products
-    # We join Sale with Product to get names directly if possible, or fetch later
-    # Let's aggregate on Sale first
-    
+    # Aggregate the daily rollup per product
     query = db.query(
-        Sale.product_id,
-        func.sum(Sale.quantity).label('total_sold'),
-        func.sum(Sale.amount).label('total_revenue')
-    ).filter(Sale.company_id == current_user.company_id)
+        SalesDailyRollup.product_id,
+        func.sum(SalesDailyRollup.quantity).label('total_sold'),
+        func.sum(SalesDailyRollup.amount).label('total_revenue')
+    ).filter(SalesDailyRollup.company_id == current_user.company_id)
 
     if current_user.role == "salesman":
-        query = query.filter(Sale.user_id == current_user.id)
+        query = query.filter(SalesDailyRollup.user_id == current_user.id)
+
+    results = query.group_by(SalesDailyRollup.product_id).order_by(desc('total_revenue')).limit(limit).all()
 
-    results = query.group_by(Sale.product_id).order_by(desc('total_revenue')).limit(limit).all()
+    # Resolve names in one query
+    product_ids = [r.product_id for r in results]
+    names = dict(db.query(Product.id, Product.name).filter(Product.id.in_(product_ids)).all()) if product_ids else {}
 
     top_products = []
     for r in results:
-        product = db.query(Product).filter(Product.id == r.product_id).first()
-        name = product.name if product else f"Product {r.product_id}"
+        name = names.get(r.product_id, f"Product {r.product_id}")
         
         top_products.append({
             "id": r.product_id,
@@ -1,18 +1,31 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 import os
 from dotenv import load_dotenv
+from fastapi import Request
+from utils import pool_monitor, replica
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Pool configuration (env overrides, defaults match the previous hard-coded values)
+POOL_SETTINGS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "-1")),
+    "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes"),
+}
+
 engine = create_engine(
     DATABASE_URL,
-    pool_pre_ping=True,
-    pool_size=5,
-    max_overflow=10
+    poolclass=pool_monitor.InstrumentedQueuePool,
+    **POOL_SETTINGS
 )
+pool_monitor.instrument(engine, "primary", POOL_SETTINGS)
 
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -28,3 +41,110 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# --- Async Engine ---
+# Used by the hot read endpoints so they don't occupy a threadpool slot per request.
+# Scripts and sales_predictor.py keep using the sync engine above.
+def to_async_url(url: str):
+    """Maps a sync DATABASE_URL onto its asyncio driver (asyncpg / aiosqlite)."""
+    url = make_url(url)
+    if url.drivername.startswith("postgresql") or url.drivername == "postgres":
+        url = url.set(drivername="postgresql+asyncpg")
+        # asyncpg takes 'ssl' rather than libpq's 'sslmode'
+        sslmode = url.query.get("sslmode")
+        if sslmode:
+            url = url.difference_update_query(["sslmode"]).update_query_dict({"ssl": sslmode})
+    elif url.drivername == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=pool_monitor.InstrumentedAsyncQueuePool,
+    **POOL_SETTINGS
+)
+pool_monitor.instrument(async_engine.sync_engine, "primary_async", POOL_SETTINGS)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False,
+    class_=AsyncSession
+)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# --- Read Replica ---
+# Read-only routes opt in with get_read_db / get_async_read_db. They use the replica when
+# DATABASE_REPLICA_URL is set and it is healthy, and the primary otherwise (or right after
+# the requesting user wrote something).
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+
+replica_monitor = None
+ReadSessionLocal = SessionLocal
+AsyncReadSessionLocal = AsyncSessionLocal
+
+if DATABASE_REPLICA_URL:
+    replica_engine = create_engine(
+        DATABASE_REPLICA_URL,
+        poolclass=pool_monitor.InstrumentedQueuePool,
+        **POOL_SETTINGS
+    )
+    pool_monitor.instrument(replica_engine, "replica", POOL_SETTINGS)
+
+    async_replica_engine = create_async_engine(
+        os.getenv("ASYNC_DATABASE_REPLICA_URL") or to_async_url(DATABASE_REPLICA_URL),
+        poolclass=pool_monitor.InstrumentedAsyncQueuePool,
+        **POOL_SETTINGS
+    )
+    pool_monitor.instrument(async_replica_engine.sync_engine, "replica_async", POOL_SETTINGS)
+
+    ReadSessionLocal = sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        bind=replica_engine
+    )
+    AsyncReadSessionLocal = async_sessionmaker(
+        bind=async_replica_engine,
+        autoflush=False,
+        expire_on_commit=False,
+        class_=AsyncSession
+    )
+    replica_monitor = replica.ReplicaMonitor(replica_engine)
+
+def start_monitors():
+    """Background threads for pool leak warnings and replica health; started by the app, not on import."""
+    pool_monitor.start_watchdog()
+    if replica_monitor is not None:
+        replica_monitor.start()
+
+def use_replica(request: Request) -> bool:
+    if replica_monitor is None:
+        return False
+    return replica_monitor.use_replica(replica.token_subject(request.headers.get("authorization")))
+
+def get_read_db(request: Request):
+    db = ReadSessionLocal() if use_replica(request) else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def async_read_sessions(request: Request):
+    """Session factory for read-only routes that run queries concurrently, one session each."""
+    return AsyncReadSessionLocal if use_replica(request) else AsyncSessionLocal
+
+async def get_async_read_db(request: Request):
+    async with async_read_sessions(request)() as db:
+        yield db
+
+def mark_write(request: Request):
+    """Pins the requesting user's reads to the primary for a short while after a write."""
+    if replica_monitor is not None:
+        subject = replica.token_subject(request.headers.get("authorization"))
+        if subject:
+            replica_monitor.mark_write(subject)
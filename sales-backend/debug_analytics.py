@@ -41,8 +41,8 @@ def debug_analytics():
             print("WARNING: No sales have customer_name. RFM Analysis will fail.")
 
         # 4. Run Advanced Analytics manually
-        print("\n--- Running get_sales_df ---")
-        sales_df = advanced.get_sales_df(sales)
+        print("\n--- Running load_sales ---")
+        sales_df = advanced.load_sales(db, user.company_id)
         print(sales_df.head())
         print(f"DataFrame Shape: {sales_df.shape}")
 
@@ -1,7 +1,12 @@
 import uvicorn
+import logging
+from contextlib import asynccontextmanager
+from utils import log
+logger = logging.getLogger("main")
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from database import engine, Base
+from database import engine
 # Import all models to ensure they are registered with SQLAlchemy Base
 from auth import models as auth_models
 from salesmen import router as salesmen_models # Salesman is in router.py?? No, it was in salesmen/router.py but I should move models to models.py if I want clean structure. 
@@ -12,18 +17,41 @@ from salesmen import router as salesmen_models # Salesman is in router.py?? No,
 from auth import router as auth_router
 from products import router as products_router
 from salesmen import router as salesmen_router
+from salesmen import bulk as salesmen_bulk
 from sales import router as sales_router
+from sales import export as sales_export
+from sales import bulk as sales_bulk
+from sales import imports as sales_imports
 from analytics import router as analytics_router
 from dashboard import router as dashboard_router
 from categories import router as categories_router
 from customers import router as customers_router
 from ai_assistant import router as ai_assistant
+from admin import router as admin_router
+
+from analytics import leaderboard
+from auth import hashing
+from migrations import runner as migrations
+import database
 
-# Create Tables
-# This will create tables for all imported models (Auth, Salesmen, Products, Sales)
-Base.metadata.create_all(bind=engine)
+# Startup work runs here and not at import time: the password hashing pool's worker processes
+# re-import this module when the app is started with `python main.py`.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global predictor
+    # Before anything else logs
+    log.setup_logging()
+    # Schema is managed by versioned migrations (python scripts/migrate.py).
+    # At head this is a single query; pending migrations are applied unless DB_AUTO_MIGRATE=false.
+    migrations.ensure_schema(engine)
+    database.start_monitors()
+    # Keeps the materialized leaderboard fresh (analytics/leaderboard.py)
+    leaderboard.start_refresher(engine)
+    predictor = load_predictor()
+    yield
+    hashing.pool.shutdown()
 
-app = FastAPI(title="Sales Portal Backend", version="1.0.0")
+app = FastAPI(title="Sales Portal Backend", version="1.0.0", lifespan=lifespan)
 
 # Enable CORS for React Frontend
 app.add_middleware(
@@ -34,33 +62,51 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Debug Middleware
+# Request Middleware
 from fastapi import Request
-import sys
+import time
+from utils import pool_monitor
 
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    print(f"DEBUG MIDDLEWARE: {request.method} {request.url}")
-    sys.stdout.flush()
-    
-    # Try to consume body
-    # transform body to bytes to print it, then restore it for the next handler
-    # Note: Consuming body in middleware can be tricky in FastAPI/Starlette
-    # But for debugging 400s it's useful.
+    # Every record logged while handling this request carries its id
+    request_id = log.new_request_id(request.headers.get("x-request-id"))
+    log.request_id.set(request_id)
+    started = time.perf_counter()
+
+    # Tag DB connections checked out by this request with its route (pool stats / leak warnings)
+    pool_monitor.set_route(request.method, request.url.path)
     
     response = await call_next(request)
+
+    # Read-your-writes: keep this user's reads on the primary right after a successful write
+    if request.method in ("POST", "PUT", "PATCH", "DELETE") and response.status_code < 400:
+        database.mark_write(request)
+
+    response.headers["X-Request-ID"] = request_id
+    logger.debug("request", extra={
+        "method": request.method,
+        "path": request.url.path,
+        "status": response.status_code,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+    })
     return response
 
 # Include Routers
 app.include_router(auth_router.router)
 app.include_router(products_router.router)
 app.include_router(salesmen_router.router)
+app.include_router(salesmen_bulk.router)
 app.include_router(sales_router.router)
+app.include_router(sales_export.router)
+app.include_router(sales_bulk.router)
+app.include_router(sales_imports.router)
 app.include_router(analytics_router.router)
 app.include_router(dashboard_router.router)
 app.include_router(categories_router.router)
 app.include_router(customers_router.router)
 app.include_router(ai_assistant.router)
+app.include_router(admin_router.router)
 
 from fastapi.staticfiles import StaticFiles
 import os
@@ -79,17 +125,21 @@ class DummyPredictor:
             'summary': {'message': "Prediction unavailable (scikit-learn not installed or error initializing)"}
         }
 
-try:
-    from sales_predictor import SalesPredictor
-    print("Initializing Sales Predictor...")
-    predictor = SalesPredictor()
-    print("Sales Predictor Initialized Successfully.")
-except ImportError as e:
-    print(f"WARNING: Could not import SalesPredictor ({e}). Using DummyPredictor.")
-    predictor = DummyPredictor()
-except Exception as e:
-    print(f"WARNING: Error initializing SalesPredictor ({e}). Using DummyPredictor.")
-    predictor = DummyPredictor()
+def load_predictor():
+    try:
+        from sales_predictor import SalesPredictor
+        logger.info("Initializing Sales Predictor...")
+        predictor = SalesPredictor()
+        logger.info("Sales Predictor Initialized Successfully.")
+        return predictor
+    except ImportError as e:
+        logger.warning("Could not import SalesPredictor (%s). Using DummyPredictor.", e)
+    except Exception as e:
+        logger.warning("Error initializing SalesPredictor (%s). Using DummyPredictor.", e)
+    return DummyPredictor()
+
+# Replaced by the lifespan handler at startup
+predictor = DummyPredictor()
 
 
 @app.get("/")
@@ -107,7 +157,7 @@ def get_prediction():
     try:
         return predictor.get_full_forecast()
     except Exception as e:
-        print(f"Error generating prediction: {e}")
+        logger.exception("Error generating prediction")
         return {
             'history': [],
             'forecast': [],
@@ -0,0 +1,8 @@
+from database import Base
+
+VERSION = 1
+DESCRIPTION = "Create missing tables"
+
+def upgrade(conn):
+    # Tables that already exist are left alone (this is what main.py's create_all used to do)
+    Base.metadata.create_all(bind=conn)
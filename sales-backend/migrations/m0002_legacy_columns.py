@@ -0,0 +1,23 @@
+from .runner import add_column, logger
+
+VERSION = 2
+DESCRIPTION = "Columns previously added by scripts/add_*.py"
+
+# (table, column, DDL) for databases created before these columns were on the models
+COLUMNS = [
+    ("users", "employee_id", "VARCHAR"),
+    ("users", "phone", "VARCHAR"),
+    ("users", "region", "VARCHAR"),
+    ("users", "sales_target", "INTEGER"),
+    ("companies", "logo_url", "VARCHAR"),
+    ("products", "sku", "VARCHAR"),
+    ("products", "quantity", "INTEGER DEFAULT 0"),
+    ("sales", "customer_name", "VARCHAR"),
+    ("sales", "notes", "VARCHAR"),
+    ("sales", "region", "VARCHAR"),
+]
+
+def upgrade(conn):
+    for table, column, ddl in COLUMNS:
+        if add_column(conn, table, column, ddl):
+            logger.info("  added %s.%s", table, column)
@@ -0,0 +1,18 @@
+from .runner import create_index, logger
+
+VERSION = 3
+DESCRIPTION = "Composite indexes for the per-company filters"
+TRANSACTIONAL = False # CREATE INDEX CONCURRENTLY
+
+INDEXES = [
+    ("ix_sales_company_date", "sales", "company_id, date"),
+    ("ix_sales_company_user_date", "sales", "company_id, user_id, date"),
+    ("ix_sales_company_product", "sales", "company_id, product_id"),
+    ("ix_users_company_role", "users", "company_id, role"),
+    ("ix_products_company_quantity", "products", "company_id, quantity"),
+]
+
+def upgrade(conn):
+    for name, table, columns in INDEXES:
+        create_index(conn, name, table, columns)
+        logger.info("  %s on %s (%s)", name, table, columns)
@@ -0,0 +1,7 @@
+from .runner import add_column
+
+VERSION = 4
+DESCRIPTION = "users.token_version for token revocation"
+
+def upgrade(conn):
+    add_column(conn, "users", "token_version", "INTEGER NOT NULL DEFAULT 0")
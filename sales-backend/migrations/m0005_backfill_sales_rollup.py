@@ -0,0 +1,13 @@
+from sqlalchemy.orm import Session
+from sales import rollup
+
+VERSION = 5
+DESCRIPTION = "Backfill sales_daily_rollup from sales; sales_rollup_marks"
+
+def upgrade(conn):
+    # rebuild bumps the per-company marks
+    rollup.SalesRollupMark.__table__.create(conn, checkfirst=True)
+    # The baseline creates the rollup empty on databases that already had sales, and only new
+    # writes were folded in after that, so recompute it rather than skipping a non-empty one.
+    # The session joins the migration's transaction; its commit doesn't end it.
+    rollup.rebuild(Session(bind=conn))
@@ -0,0 +1,7 @@
+from analytics import leaderboard
+
+VERSION = 6
+DESCRIPTION = "Materialized sales leaderboard (view on PostgreSQL, snapshot table elsewhere)"
+
+def upgrade(conn):
+    leaderboard.create(conn)
@@ -0,0 +1,12 @@
+from .runner import add_column, create_index
+
+VERSION = 7
+DESCRIPTION = "sales_import_jobs; sales.import_job_id so a failed import can be resumed or discarded"
+TRANSACTIONAL = False # CREATE INDEX CONCURRENTLY
+
+def upgrade(conn):
+    from sales.imports import ImportJob
+
+    ImportJob.__table__.create(conn, checkfirst=True)
+    add_column(conn, "sales", "import_job_id", "VARCHAR")
+    create_index(conn, "ix_sales_import_job", "sales", "import_job_id")
@@ -0,0 +1,167 @@
+from sqlalchemy import text, inspect
+import importlib
+import logging
+import os
+import pkgutil
+import zlib
+from datetime import datetime
+from sales import partitions
+
+# Versioned schema migrations. Each migrations/mNNNN_*.py module defines
+#   VERSION (int), DESCRIPTION (str), upgrade(conn)
+# and optionally TRANSACTIONAL = False when it runs statements that can't be in a transaction
+# (CREATE INDEX CONCURRENTLY); those get an autocommit connection and must be idempotent.
+
+logger = logging.getLogger("migrations")
+
+VERSION_TABLE = "schema_migrations"
+
+# Apply pending migrations at startup instead of refusing to start
+AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "true").lower() in ("1", "true", "yes")
+
+# Serializes concurrent runners (several workers starting at once) on Postgres
+ADVISORY_LOCK_KEY = zlib.crc32(VERSION_TABLE.encode())
+
+def import_models():
+    """Registers every model on Base.metadata (the baseline migration creates them)."""
+    from auth import models # noqa: F401
+    from products import router as products_router # noqa: F401
+    from sales import router as sales_router, rollup, imports # noqa: F401
+    from categories import models as category_models # noqa: F401
+    from customers import models as customer_models # noqa: F401
+
+def load_migrations():
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    migrations = [
+        importlib.import_module(f"{__package__}.{info.name}")
+        for info in pkgutil.iter_modules([package_dir])
+        if info.name.startswith("m") and info.name[1:5].isdigit()
+    ]
+    migrations.sort(key=lambda m: m.VERSION)
+    versions = [m.VERSION for m in migrations]
+    if len(set(versions)) != len(versions):
+        raise RuntimeError(f"Duplicate migration versions: {versions}")
+    return migrations
+
+def head_version() -> int:
+    migrations = load_migrations()
+    return migrations[-1].VERSION if migrations else 0
+
+def current_version(engine) -> int:
+    """Highest applied version, 0 for a database that has never been migrated. One query."""
+    with engine.connect() as conn:
+        try:
+            return conn.execute(text(f"SELECT max(version) FROM {VERSION_TABLE}")).scalar() or 0
+        except Exception:
+            return 0
+
+def ensure_version_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} ("
+            "version INTEGER PRIMARY KEY, description VARCHAR, applied_at TIMESTAMP)"
+        ))
+
+def _record(conn, migration):
+    conn.execute(
+        text(f"INSERT INTO {VERSION_TABLE} (version, description, applied_at) VALUES (:v, :d, :at)"),
+        {"v": migration.VERSION, "d": migration.DESCRIPTION, "at": datetime.utcnow()}
+    )
+
+def _apply(engine, migration):
+    if getattr(migration, "TRANSACTIONAL", True):
+        with engine.begin() as conn:
+            migration.upgrade(conn)
+            _record(conn, migration)
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        migration.upgrade(conn)
+        _record(conn, migration)
+
+def upgrade(engine, target: int = None):
+    """Applies every pending migration up to target (default: head). Returns the versions applied."""
+    import_models()
+    ensure_version_table(engine)
+
+    lock_conn = None
+    if engine.dialect.name == "postgresql":
+        lock_conn = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+    try:
+        with engine.connect() as conn:
+            applied = set(conn.execute(text(f"SELECT version FROM {VERSION_TABLE}")).scalars())
+        done = []
+        for migration in load_migrations():
+            if migration.VERSION in applied or (target is not None and migration.VERSION > target):
+                continue
+            logger.info("Applying migration %04d: %s", migration.VERSION, migration.DESCRIPTION)
+            _apply(engine, migration)
+            done.append(migration.VERSION)
+        return done
+    finally:
+        if lock_conn is not None:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+            lock_conn.close()
+
+def ensure_schema(engine):
+    """
+    Startup check: a single query when the schema is already at head. Otherwise applies the
+    pending migrations (DB_AUTO_MIGRATE, the default) or refuses to start.
+    """
+    current, head = current_version(engine), head_version()
+    if current >= head:
+        return
+    if not AUTO_MIGRATE:
+        raise RuntimeError(
+            f"Database schema is at version {current}, head is {head}. Run: python scripts/migrate.py"
+        )
+    upgrade(engine)
+
+# --- Helpers for migrations ---
+
+def column_names(conn, table: str):
+    return {c["name"] for c in inspect(conn).get_columns(table)}
+
+def add_column(conn, table: str, column: str, ddl: str) -> bool:
+    """Adds a column if it is missing. Returns True when it was added."""
+    if column in column_names(conn, table):
+        return False
+    conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl}'))
+    return True
+
+def _index_valid(conn, name: str):
+    """True/False for an existing index (False = left behind by a failed concurrent build), None if missing."""
+    return conn.execute(
+        text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {"name": name}
+    ).scalar()
+
+def create_index(conn, name: str, table: str, columns: str):
+    """
+    Creates an index without blocking writes on Postgres (the connection must be in autocommit).
+    Idempotent, so an interrupted run can simply be repeated.
+    """
+    if conn.dialect.name != "postgresql":
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({columns})'))
+        return
+
+    if not partitions.is_partitioned(conn, table):
+        if _index_valid(conn, name) is False:
+            conn.execute(text(f'DROP INDEX CONCURRENTLY "{name}"'))
+        conn.execute(text(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "{table}" ({columns})'))
+        return
+
+    # Partitioned tables can't be indexed concurrently: create the parent index ONLY on the parent
+    # (invalid until complete), build each partition's index concurrently and attach it.
+    conn.execute(text(f'CREATE INDEX IF NOT EXISTS "{name}" ON ONLY "{table}" ({columns})'))
+    for partition, _ in partitions.list_partitions(conn, table):
+        already_attached = conn.execute(text(
+            "SELECT 1 FROM pg_inherits i JOIN pg_index x ON x.indexrelid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:name) AND x.indrelid = to_regclass(:partition)"
+        ), {"name": name, "partition": partition}).scalar()
+        if already_attached:
+            continue
+        child = f"{partition}_{name[3:] if name.startswith('ix_') else name}"[:63]
+        if _index_valid(conn, child) is False:
+            conn.execute(text(f'DROP INDEX CONCURRENTLY "{child}"'))
+        conn.execute(text(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{child}" ON "{partition}" ({columns})'))
+        conn.execute(text(f'ALTER INDEX "{name}" ATTACH PARTITION "{child}"'))
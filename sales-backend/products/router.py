@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -24,6 +24,11 @@ class Product(Base):
     company_id = Column(Integer, ForeignKey("companies.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Low-stock lookups filter on quantity within a company
+        Index("ix_products_company_quantity", "company_id", "quantity"),
+    )
+
 # --- Schemas ---
 class ProductBase(BaseModel):
     name: str
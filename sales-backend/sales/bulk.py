@@ -0,0 +1,254 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from datetime import datetime
+import pandas as pd
+import csv
+import io
+import json
+import os
+from database import get_db
+from auth import utils, models as auth_models
+from products.router import Product
+from .router import Sale
+from . import rollup, columnar_cache, rank_index
+
+router = APIRouter(
+    prefix="/api/sales",
+    tags=["Sales"]
+)
+
+BULK_CHUNK_SIZE = int(os.getenv("SALES_BULK_CHUNK_SIZE", "1000"))
+MAX_CHUNK_SIZE = 10000
+
+INPUT_FIELDS = ["product_id", "quantity", "amount", "user_id", "date", "customer_name", "region", "notes"]
+INSERT_COLUMNS = ["product_id", "user_id", "quantity", "amount", "date", "customer_name", "region", "notes", "company_id", "created_at", "import_job_id"]
+
+def parse_bulk_body(raw: bytes, content_type: str):
+    """Accepts a JSON array, or NDJSON (one object per line) when the content type says so."""
+    try:
+        if "ndjson" in content_type or "jsonl" in content_type:
+            return [json.loads(line) for line in raw.splitlines() if line.strip()]
+        rows = json.loads(raw)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array of sales")
+    return rows
+
+def validate_rows(db: Session, rows, current_user):
+    """
+    Validates a list of JSON rows. Returns (DataFrame of normalized rows, Series of error messages).
+    """
+    is_object = pd.Series([isinstance(r, dict) for r in rows], dtype=bool)
+    df = pd.DataFrame([r if isinstance(r, dict) else {} for r in rows])
+    normalized, errors = validate_frame(db, df, current_user)
+    errors[~is_object] = "Row must be a JSON object"
+    return normalized, errors
+
+def validate_frame(db: Session, df: pd.DataFrame, current_user):
+    """
+    Validates every row of a DataFrame in one vectorized pass and checks product/user
+    ownership with one query each. Returns (DataFrame of normalized rows, Series of error messages).
+    """
+    df = df.reset_index(drop=True).reindex(columns=INPUT_FIELDS)
+    errors = pd.Series([None] * len(df), dtype=object)
+
+    def flag(mask, message):
+        # Keep the first error found for each row
+        errors[mask & errors.isna()] = message
+
+    def as_number(column):
+        return pd.to_numeric(df[column], errors="coerce")
+
+    product_id = as_number("product_id")
+    flag(product_id.isna() | (product_id % 1 != 0), "product_id is required and must be an integer")
+
+    quantity = as_number("quantity")
+    flag(quantity.isna() | (quantity % 1 != 0), "quantity is required and must be an integer")
+
+    amount = as_number("amount")
+    flag(amount.isna(), "amount is required and must be a number")
+
+    # Managers may assign sales to anyone in the company, salesmen always to themselves
+    if current_user.role == "manager":
+        user_given = df["user_id"].notna()
+        user_id = as_number("user_id")
+        flag(user_given & (user_id.isna() | (user_id % 1 != 0)), "user_id must be an integer")
+        user_id = user_id.where(user_given, current_user.id)
+    else:
+        user_id = pd.Series([current_user.id] * len(df), dtype="float64")
+
+    date_given = df["date"].notna()
+    date = pd.to_datetime(df["date"], errors="coerce", utc=True, format="ISO8601").dt.tz_convert(None)
+    flag(date_given & date.isna(), "date must be an ISO datetime")
+    date = date.where(date_given, pd.Timestamp(datetime.utcnow()))
+
+    # Ownership checks: one IN query per referenced table
+    product_ids = [int(v) for v in product_id[errors.isna()].dropna().unique()]
+    valid_products = set()
+    if product_ids:
+        valid_products = {p for (p,) in db.query(Product.id).filter(
+            Product.company_id == current_user.company_id,
+            Product.id.in_(product_ids)
+        ).all()}
+    flag(~product_id.isin(valid_products), "Product not found")
+
+    user_ids = [int(v) for v in user_id[errors.isna()].dropna().unique()]
+    valid_users = set()
+    if user_ids:
+        valid_users = {u for (u,) in db.query(auth_models.User.id).filter(
+            auth_models.User.company_id == current_user.company_id,
+            auth_models.User.id.in_(user_ids)
+        ).all()}
+    flag(~user_id.isin(valid_users), "User not found in company")
+
+    def as_text(column):
+        values = df[column]
+        return values.astype(str).astype(object).where(values.notna(), None)
+
+    normalized = pd.DataFrame({
+        "product_id": product_id,
+        "user_id": user_id,
+        "quantity": quantity,
+        "amount": amount,
+        "date": date,
+        "customer_name": as_text("customer_name"),
+        "region": as_text("region"),
+        "notes": as_text("notes"),
+    })
+    return normalized, errors
+
+def _records(accepted: pd.DataFrame, company_id: int, import_job_id: str = None):
+    now = datetime.utcnow()
+    columns = {
+        "product_id": accepted["product_id"].astype(int).tolist(),
+        "user_id": accepted["user_id"].astype(int).tolist(),
+        "quantity": accepted["quantity"].astype(int).tolist(),
+        "amount": accepted["amount"].astype(float).tolist(),
+        "date": list(accepted["date"].dt.to_pydatetime()),
+        "customer_name": accepted["customer_name"].tolist(),
+        "region": accepted["region"].tolist(),
+        "notes": accepted["notes"].tolist(),
+    }
+    for i in range(len(accepted)):
+        record = {name: values[i] for name, values in columns.items()}
+        record["company_id"] = company_id
+        record["created_at"] = now
+        record["import_job_id"] = import_job_id
+        yield record
+
+def _copy_chunk(db: Session, chunk):
+    """Loads a chunk with COPY FROM STDIN on the session's own connection (psycopg2)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for record in chunk:
+        writer.writerow([
+            "\\N" if record[c] is None else (record[c].isoformat() if isinstance(record[c], datetime) else record[c])
+            for c in INSERT_COLUMNS
+        ])
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY sales ({', '.join(INSERT_COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer
+        )
+    finally:
+        cursor.close()
+
+def _insert_chunk(db: Session, chunk, use_copy: bool):
+    if use_copy:
+        _copy_chunk(db, chunk)
+    else:
+        db.execute(insert(Sale.__table__), chunk)
+
+def insert_sales(db: Session, accepted: pd.DataFrame, company_id: int, chunk_size: int, import_job_id: str = None):
+    """
+    Inserts validated rows chunk_size at a time and folds them into the daily rollup.
+    Runs inside the caller's transaction, so the caller commits.
+    File imports pass their job id so the rows can be found (and discarded) later.
+    """
+    bind = db.get_bind()
+    use_copy = bind.dialect.name == "postgresql" and bind.dialect.driver == "psycopg2"
+
+    chunk = []
+    for record in _records(accepted, company_id, import_job_id):
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            _insert_chunk(db, chunk, use_copy)
+            chunk = []
+    if chunk:
+        _insert_chunk(db, chunk, use_copy)
+
+    # Fold the accepted rows into the daily rollup, one upsert per bucket
+    if not accepted.empty:
+        buckets = accepted.assign(
+            company_id=company_id,
+            day=accepted["date"].dt.date,
+            region=accepted["region"].fillna(""),
+            orders=1
+        ).groupby(rollup.KEY_COLUMNS, as_index=False).agg(
+            amount=("amount", "sum"), quantity=("quantity", "sum"), orders=("orders", "sum")
+        )
+        rollup.apply_buckets(db, [
+            {
+                "company_id": int(b.company_id),
+                "day": b.day,
+                "user_id": int(b.user_id),
+                "product_id": int(b.product_id),
+                "region": b.region,
+                "amount": float(b.amount),
+                "quantity": int(b.quantity),
+                "orders": int(b.orders),
+            }
+            for b in buckets.itertuples(index=False)
+        ])
+
+def ingest_sales(db: Session, rows, current_user, chunk_size: int):
+    normalized, errors = validate_rows(db, rows, current_user)
+    accepted = normalized[errors.isna()]
+
+    try:
+        insert_sales(db, accepted, current_user.company_id, chunk_size)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    if len(accepted):
+        columnar_cache.company_sales.invalidate(current_user.company_id)
+        rank_index.salesmen.invalidate(current_user.company_id)
+
+    results = [
+        {"row": i, "status": "accepted"} if error is None else {"row": i, "status": "rejected", "error": error}
+        for i, error in enumerate(errors.tolist())
+    ]
+    return {
+        "accepted": len(accepted),
+        "rejected": len(rows) - len(accepted),
+        "results": results
+    }
+
+@router.post("/bulk")
+async def bulk_create_sales(
+    request: Request,
+    chunk_size: int = BULK_CHUNK_SIZE,
+    db: Session = Depends(get_db),
+    current_user: auth_models.User = Depends(utils.get_current_active_user)
+):
+    """
+    Inserts many sales at once from a JSON array or NDJSON body (Content-Type: application/x-ndjson).
+    Invalid rows are reported and skipped; valid rows are inserted in one transaction,
+    chunk_size rows per executemany (or COPY on Postgres).
+    """
+    raw = await request.body()
+    rows = parse_bulk_body(raw, request.headers.get("content-type", ""))
+    if not rows:
+        return {"accepted": 0, "rejected": 0, "results": []}
+
+    chunk_size = min(max(chunk_size, 1), MAX_CHUNK_SIZE)
+    try:
+        return await run_in_threadpool(ingest_sales, db, rows, current_user, chunk_size)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Bulk insert failed: {str(e)}")
@@ -0,0 +1,297 @@
+from sqlalchemy.orm import Session
+from collections import OrderedDict
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import os
+import threading
+import time
+import database
+
+# Process-local columnar copy of each company's sales for the analytics endpoints. A company is
+# loaded from the primary on first use and then kept current by create_sale / delete_sale in this process; bulk
+# inserts and imports drop it so the next read reloads. Writes made by other worker processes
+# only show up after TTL_SECONDS, when the entry is reloaded.
+TTL_SECONDS = float(os.getenv("SALES_CACHE_TTL_SECONDS", "300"))
+MAX_COMPANIES = int(os.getenv("SALES_CACHE_MAX_COMPANIES", "64"))
+MAX_BYTES = int(os.getenv("SALES_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Columns kept per company; requests for anything else go straight to the database
+CACHE_COLUMNS = ["id", "date", "amount", "quantity", "user_id", "product_id", "customer_name", "region"]
+# Results computed from an entry (see SalesColumnCache.derived) kept per company
+MAX_DERIVED = 32
+
+class CompanySales:
+    """
+    Growable arrays for one company's sales. Appends write past the current size (doubling
+    capacity when full), deletes clear the row's alive flag, and frame() hands out read-only
+    views, so frames already returned never change underneath their callers. version counts
+    the changes since loading; derived results are dropped whenever it moves.
+    """
+    def __init__(self, df: pd.DataFrame):
+        n = len(df)
+        capacity = max(n + n // 8, 64)
+        self.size = n
+        self.deleted = 0
+        self.alive = np.ones(capacity, dtype=bool)
+        self.data = {}
+        self.nulls = {} # int columns -> null mask
+        self.categories = {} # text columns -> (value -> code, code -> value)
+        self.version = 0
+        self.derived = OrderedDict()
+
+        for name in CACHE_COLUMNS:
+            values = df[name]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                names = list(values.cat.categories)
+                self.categories[name] = ({value: code for code, value in enumerate(names)}, names)
+                column = values.cat.codes.to_numpy().astype(np.int32)
+            elif pd.api.types.is_integer_dtype(values.dtype):
+                self.nulls[name] = self._grown(values.isna().to_numpy(), capacity)
+                column = values.to_numpy(dtype=np.int32, na_value=0)
+            else:
+                column = values.to_numpy()
+            self.data[name] = self._grown(column, capacity)
+        self.max_id = int(self.data["id"][:n].max()) if n else 0
+
+    @staticmethod
+    def _grown(array, capacity: int):
+        grown = np.zeros(capacity, dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def nbytes(self) -> int:
+        arrays = [self.alive, *self.data.values(), *self.nulls.values()]
+        return sum(a.nbytes for a in arrays) + sum(
+            len(value) + 56 for _, names in self.categories.values() for value in names
+        )
+
+    def _row(self, sale_id: int):
+        matches = np.flatnonzero(self.data["id"][:self.size] == sale_id)
+        return int(matches[0]) if len(matches) else None
+
+    def append(self, sale):
+        # A sale committed just before this entry was loaded is already in it
+        if sale.id <= self.max_id and self._row(sale.id) is not None:
+            return
+        if self.size == len(self.alive):
+            capacity = len(self.alive) * 2
+            self.alive = self._grown(self.alive, capacity)
+            self.alive[self.size:] = True
+            self.data = {name: self._grown(a, capacity) for name, a in self.data.items()}
+            self.nulls = {name: self._grown(a, capacity) for name, a in self.nulls.items()}
+
+        i = self.size
+        for name in CACHE_COLUMNS:
+            value = getattr(sale, name)
+            if name in self.categories:
+                codes, names = self.categories[name]
+                if value is None:
+                    value = -1
+                elif value in codes:
+                    value = codes[value]
+                else:
+                    codes[value] = len(names)
+                    names.append(value)
+                    value = codes[value]
+            elif name in self.nulls:
+                self.nulls[name][i] = value is None
+                value = value or 0
+            elif name == "date":
+                value = np.datetime64(value, "ns") if value is not None else np.datetime64("NaT")
+            elif value is None:
+                value = np.nan
+            self.data[name][i] = value
+        self.size += 1
+        self.max_id = max(self.max_id, sale.id)
+        self._changed()
+
+    def _changed(self):
+        self.version += 1
+        self.derived.clear()
+
+    def discard(self, sale_id: int):
+        i = self._row(sale_id)
+        if i is not None and self.alive[i]:
+            self.alive[i] = False
+            self.deleted += 1
+            self._changed()
+
+    def frame(self, columns, start: datetime = None, end: datetime = None) -> pd.DataFrame:
+        n = self.size
+        keep = self.alive[:n].copy() if self.deleted else None
+        dates = self.data["date"][:n]
+        if start is not None or end is not None:
+            in_range = np.ones(n, dtype=bool)
+            if start is not None:
+                in_range &= dates >= np.datetime64(start, "ns")
+            if end is not None:
+                in_range &= dates < np.datetime64(end, "ns")
+            keep = in_range if keep is None else keep & in_range
+
+        result = {}
+        for name in columns:
+            column = self.data[name][:n]
+            nulls = self.nulls.get(name)
+            if keep is not None:
+                column = column[keep]
+            if name in self.categories:
+                result[name] = pd.Categorical.from_codes(column, categories=list(self.categories[name][1]))
+                continue
+            if nulls is not None:
+                nulls = nulls[:n] if keep is None else nulls[:n][keep]
+                if nulls.any():
+                    result[name] = pd.arrays.IntegerArray(column.copy(), nulls.copy())
+                    continue
+            if keep is None:
+                column = column.view()
+                column.flags.writeable = False
+            result[name] = column
+        return pd.DataFrame(result, copy=False)
+
+class SalesColumnCache:
+    """TTL + LRU cache of CompanySales keyed by company_id, bounded by count and total bytes."""
+    def __init__(self, ttl_seconds: float = TTL_SECONDS, max_companies: int = MAX_COMPANIES, max_bytes: int = MAX_BYTES):
+        self.ttl_seconds = ttl_seconds
+        self.max_companies = max_companies
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict() # company_id -> (expires_at, CompanySales)
+        # Bumped by every write hook; a load that overlapped a write is used once but not kept
+        self.versions = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _get(self, company_id: int):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(company_id)
+            if entry is None or entry[0] <= now:
+                self.entries.pop(company_id, None)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(company_id)
+            self.hits += 1
+            return entry[1]
+
+    def _put(self, company_id: int, sales: CompanySales, version: int):
+        if self.ttl_seconds <= 0 or sales.nbytes() > self.max_bytes:
+            return
+        with self.lock:
+            if self.versions.get(company_id, 0) != version:
+                return
+            self.entries[company_id] = (time.monotonic() + self.ttl_seconds, sales)
+            self.entries.move_to_end(company_id)
+            self._trim()
+
+    def _trim(self):
+        # Appends grow entries too, so this runs after them as well as after loads
+        while self.entries and (len(self.entries) > self.max_companies or self._bytes() > self.max_bytes):
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def _bytes(self) -> int:
+        return sum(sales.nbytes() for _, sales in self.entries.values())
+
+    def _entry(self, company_id: int) -> CompanySales:
+        from analytics import advanced
+
+        sales = self._get(company_id)
+        if sales is None:
+            with self.lock:
+                version = self.versions.get(company_id, 0)
+            # On the primary, whatever db is: writes this process made before the load must be
+            # in the entry, since append/discard only patch entries that already exist
+            with database.SessionLocal() as primary:
+                sales = CompanySales(advanced.load_sales(primary, company_id, CACHE_COLUMNS))
+            self._put(company_id, sales, version)
+        return sales
+
+    def frame(self, db: Session, company_id: int, columns, start: datetime = None, end: datetime = None) -> pd.DataFrame:
+        """The company's sales (start <= date < end) as a DataFrame, from the cache when possible."""
+        if any(name not in CACHE_COLUMNS for name in columns):
+            from analytics import advanced
+            return advanced.load_sales(db, company_id, columns, start=start, end=end)
+
+        sales = self._entry(company_id)
+        with self.lock:
+            return sales.frame(columns, start, end)
+
+    def derived(self, db: Session, company_id: int, key, columns, compute, start: datetime = None, end: datetime = None):
+        """
+        compute(frame) for the company's sales, remembered until that company's data changes.
+        key must identify everything else compute depends on. Treat the result as read-only.
+        """
+        sales = self._entry(company_id)
+        key = (key, tuple(columns), start, end)
+        with self.lock:
+            if key in sales.derived:
+                sales.derived.move_to_end(key)
+                return sales.derived[key]
+            version = sales.version
+            frame = sales.frame(columns, start, end)
+
+        result = compute(frame)
+        with self.lock:
+            if sales.version == version:
+                sales.derived[key] = result
+                while len(sales.derived) > MAX_DERIVED:
+                    sales.derived.popitem(last=False)
+        return result
+
+    def write_version(self, company_id: int) -> int:
+        """Counts sales writes to the company seen by this process; other caches key on it."""
+        with self.lock:
+            return self.versions.get(company_id, 0)
+
+    def _written(self, company_id: int):
+        self.versions[company_id] = self.versions.get(company_id, 0) + 1
+        entry = self.entries.get(company_id)
+        return entry[1] if entry is not None else None
+
+    def append(self, sale):
+        """Call after create_sale commits."""
+        with self.lock:
+            sales = self._written(sale.company_id)
+            if sales is not None:
+                sales.append(sale)
+                self._trim()
+
+    def discard(self, company_id: int, sale_id: int):
+        """Call after delete_sale commits."""
+        with self.lock:
+            sales = self._written(company_id)
+            if sales is not None:
+                sales.discard(sale_id)
+
+    def invalidate(self, company_id: int):
+        """Call after writes that don't go through append/discard (bulk inserts, imports)."""
+        with self.lock:
+            self._written(company_id)
+            if self.entries.pop(company_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "companies": len(self.entries),
+                "max_companies": self.max_companies,
+                "bytes": self._bytes(),
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "rows": sum(sales.size - sales.deleted for _, sales in self.entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+company_sales = SalesColumnCache()
@@ -0,0 +1,137 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from datetime import datetime
+import csv
+import io
+import json
+import os
+import tempfile
+from database import SessionLocal
+from auth import utils
+from .router import Sale, sales_projection, parse_date_param, parse_fields_param
+
+router = APIRouter(
+    prefix="/api/sales",
+    tags=["Sales"]
+)
+
+EXPORT_BATCH_SIZE = 1000 # rows fetched per round trip from the server-side cursor
+XLSX_CHUNK_SIZE = 64 * 1024
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+}
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def _stream_rows(company_id: int, fields, start, end):
+    """
+    Yields row tuples from a server-side cursor (yield_per) on a session owned by the stream,
+    since the request's session is closed before the body finishes sending.
+    """
+    db = SessionLocal()
+    try:
+        query = sales_projection(db, company_id, fields, start, end).order_by(Sale.date, Sale.id)
+        for row in query.yield_per(EXPORT_BATCH_SIZE):
+            yield row
+    finally:
+        db.close()
+
+def _csv_stream(rows, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    pending = 0
+    for row in rows:
+        writer.writerow(["" if v is None else (v.isoformat() if isinstance(v, datetime) else v) for v in row])
+        pending += 1
+        if pending >= EXPORT_BATCH_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+    yield buffer.getvalue()
+
+def _ndjson_stream(rows, fields):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(fields, row)), default=_json_default))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+def _xlsx_stream(rows, fields):
+    """
+    Write-only workbooks spool rows to disk as they are appended, but the zip container
+    is only complete after save(), so the finished file is streamed back from a temp file.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Sales")
+    sheet.append(fields)
+    for row in rows:
+        sheet.append(list(row))
+
+    handle, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(handle)
+    try:
+        workbook.save(path)
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(XLSX_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
+
+@router.get("/export")
+def export_sales(
+    format: str = "csv",
+    start_date: str = None,
+    end_date: str = None,
+    fields: Optional[str] = None,
+    current_user: utils.Principal = Depends(utils.get_current_principal)
+):
+    """
+    Streams the company's sales as CSV, NDJSON or XLSX, oldest first.
+    Memory stays flat regardless of row count.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format. Use one of: {', '.join(EXPORT_FORMATS)}")
+
+    if format == "xlsx":
+        try:
+            import openpyxl
+        except ImportError:
+            raise HTTPException(status_code=501, detail="XLSX export requires openpyxl to be installed")
+
+    start = parse_date_param(start_date, "start_date")
+    end = parse_date_param(end_date, "end_date")
+
+    selected = parse_fields_param(fields)
+
+    rows = _stream_rows(current_user.company_id, selected, start, end)
+    if format == "csv":
+        body = _csv_stream(rows, selected)
+    elif format == "ndjson":
+        body = _ndjson_stream(rows, selected)
+    else:
+        body = _xlsx_stream(rows, selected)
+
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"sales_export_{datetime.utcnow().strftime('%Y%m%d')}.{extension}"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
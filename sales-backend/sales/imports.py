@@ -0,0 +1,493 @@
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile
+from fastapi.responses import FileResponse
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, func, select
+from sqlalchemy.orm import Session
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import pandas as pd
+import csv
+import json
+import os
+import shutil
+import tempfile
+import logging
+import uuid
+from database import Base, SessionLocal, get_db
+from auth import utils, models as auth_models
+from products.router import Product
+from customers.models import Customer
+from .router import Sale
+from . import bulk, columnar_cache, rank_index, rollup
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/api/sales/import",
+    tags=["Sales"]
+)
+
+IMPORT_CHUNK_SIZE = int(os.getenv("SALES_IMPORT_CHUNK_SIZE", "5000"))
+IMPORT_WORKERS = int(os.getenv("SALES_IMPORT_WORKERS", "2"))
+IMPORT_DIR = os.getenv("SALES_IMPORT_DIR", os.path.join(tempfile.gettempdir(), "sales_imports"))
+# A queued or running job that hasn't advanced for this long lost its worker and may be resumed
+IMPORT_STALE_SECONDS = int(os.getenv("SALES_IMPORT_STALE_SECONDS", "600"))
+MAX_TRACKED_JOBS = 100
+SPOOL_BUFFER_SIZE = 1024 * 1024
+
+# Header aliases found in POS exports, mapped onto bulk.INPUT_FIELDS
+COLUMN_ALIASES = {
+    "product": "product",
+    "product_name": "product",
+    "item": "product",
+    "sku": "product",
+    "product_id": "product_id",
+    "qty": "quantity",
+    "quantity": "quantity",
+    "amount": "amount",
+    "total": "amount",
+    "date": "date",
+    "sale_date": "date",
+    "customer": "customer_name",
+    "customer_name": "customer_name",
+    "trader_name": "customer_name",
+    "region": "region",
+    "notes": "notes",
+    "user_id": "user_id",
+    "salesman_email": "salesman_email",
+}
+
+executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix="sales-import")
+
+# Jobs are rows, so any worker can report on, resume or discard them. Each chunk's sales commit
+# together with the job's progress: after a failure, or a worker dying mid-file, rows_processed is
+# exactly how much of the file is in. POST .../resume continues from there, and DELETE removes
+# every sale the job inserted (they carry its id in sales.import_job_id). The spooled file is kept
+# until the job completes or is discarded; IMPORT_DIR must be shared by the workers.
+class ImportJob(Base):
+    __tablename__ = "sales_import_jobs"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    company_id = Column(Integer, ForeignKey("companies.id"), index=True)
+    user_id = Column(Integer, ForeignKey("users.id")) # Uploader; rows are validated as them
+    filename = Column(String)
+    path = Column(String)
+    status = Column(String, default="queued") # queued, running, completed, failed, discarded
+    error = Column(String, nullable=True)
+    rows_processed = Column(Integer, default=0) # Committed offset into the file
+    rows_accepted = Column(Integer, default=0)
+    rows_rejected = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    @property
+    def reject_path(self):
+        return os.path.join(IMPORT_DIR, f"{self.id}_rejects.csv")
+
+    @property
+    def stale(self) -> bool:
+        return (
+            self.status in ("queued", "running")
+            and (datetime.utcnow() - self.updated_at).total_seconds() > IMPORT_STALE_SECONDS
+        )
+
+    def to_dict(self):
+        elapsed = None
+        if self.started_at:
+            elapsed = ((self.finished_at or datetime.utcnow()) - self.started_at).total_seconds()
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "error": self.error,
+            "rows_processed": self.rows_processed,
+            "rows_accepted": self.rows_accepted,
+            "rows_rejected": self.rows_rejected,
+            "rows_per_sec": round(self.rows_processed / elapsed, 1) if elapsed else 0,
+            "elapsed_seconds": round(elapsed, 2) if elapsed else 0,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "resumable": self.status == "failed" or self.stale,
+            "reject_file": f"/api/sales/import/{self.id}/rejects" if self.rows_rejected else None,
+        }
+
+class _Superseded(Exception):
+    """The job was resumed or discarded elsewhere while this worker was running it."""
+
+def _normalize_header(name) -> str:
+    key = str(name).strip().lower().replace(" ", "_")
+    return COLUMN_ALIASES.get(key, key)
+
+# A line with more fields than the header stays in place as a one-column row holding this marker
+# and the line's fields, so row numbers and the committed offset still line up; it is rejected
+MALFORMED_MARKER = "\x00malformed:"
+
+def _keep_malformed(fields):
+    return [MALFORMED_MARKER + json.dumps(fields)]
+
+def _malformed_fields(value):
+    """The fields of a line _csv_chunks kept in place, None for a regular row."""
+    if isinstance(value, str) and value.startswith(MALFORMED_MARKER):
+        return json.loads(value[len(MALFORMED_MARKER):])
+    return None
+
+def _csv_chunks(path: str):
+    # The python engine is the one that accepts a callable for bad lines
+    for chunk in pd.read_csv(
+        path, dtype=str, chunksize=IMPORT_CHUNK_SIZE, skipinitialspace=True,
+        engine="python", on_bad_lines=_keep_malformed
+    ):
+        yield chunk
+
+def _excel_chunks(path: str):
+    """Reads the first sheet row by row (openpyxl read-only mode) and yields DataFrame chunks."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(h) if h is not None else f"column_{i}" for i, h in enumerate(header)]
+        buffer = []
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) >= IMPORT_CHUNK_SIZE:
+                yield pd.DataFrame(buffer, columns=columns)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=columns)
+    finally:
+        workbook.close()
+
+def _load_lookups(db: Session, company_id: int):
+    """Loads the company's product (name and SKU), customer and salesman maps once per job."""
+    products = db.query(Product.id, Product.name, Product.sku).filter(Product.company_id == company_id).all()
+    product_by_key = {}
+    for p_id, name, sku in products:
+        if sku:
+            product_by_key.setdefault(str(sku).strip().lower(), p_id)
+    for p_id, name, sku in products:
+        if name:
+            # Names win over SKUs when both match
+            product_by_key[str(name).strip().lower()] = p_id
+
+    customers = db.query(Customer.name).filter(Customer.company_id == company_id).all()
+    customer_by_key = {str(name).strip().lower(): name for (name,) in customers if name}
+
+    users = db.query(auth_models.User.id, auth_models.User.email).filter(
+        auth_models.User.company_id == company_id
+    ).all()
+    user_by_email = {str(email).strip().lower(): u_id for u_id, email in users if email}
+
+    return product_by_key, customer_by_key, user_by_email
+
+def _map_chunk(chunk: pd.DataFrame, lookups):
+    """Maps product names/SKUs to ids, customer names to Customer records and salesman emails to user ids."""
+    product_by_key, customer_by_key, user_by_email = lookups
+    chunk = chunk.rename(columns=_normalize_header)
+    chunk = chunk.loc[:, ~chunk.columns.duplicated()]
+
+    if "product" in chunk.columns:
+        mapped = chunk["product"].astype(str).str.strip().str.lower().map(product_by_key)
+        # Unknown names/SKUs become an id no company owns, so they are rejected as "Product not found"
+        mapped = mapped.where(chunk["product"].isna() | mapped.notna(), -1)
+        if "product_id" in chunk.columns:
+            chunk["product_id"] = chunk["product_id"].where(chunk["product_id"].notna(), mapped)
+        else:
+            chunk["product_id"] = mapped
+
+    if "customer_name" in chunk.columns:
+        canonical = chunk["customer_name"].astype(str).str.strip().str.lower().map(customer_by_key)
+        chunk["customer_name"] = canonical.where(canonical.notna(), chunk["customer_name"])
+
+    if "salesman_email" in chunk.columns:
+        mapped = chunk["salesman_email"].astype(str).str.strip().str.lower().map(user_by_email)
+        # An unknown email must not silently fall back to the uploader
+        mapped = mapped.where(chunk["salesman_email"].isna() | mapped.notna(), -1)
+        if "user_id" in chunk.columns:
+            chunk["user_id"] = chunk["user_id"].where(chunk["user_id"].notna(), mapped)
+        else:
+            chunk["user_id"] = mapped
+
+    return chunk
+
+def _claim(db: Session, job_id: str) -> bool:
+    """Moves a queued job to running; False if another worker got there first."""
+    now = datetime.utcnow()
+    claimed = db.query(ImportJob).filter(
+        ImportJob.id == job_id, ImportJob.status == "queued"
+    ).update({
+        "status": "running",
+        "error": None,
+        "finished_at": None,
+        "started_at": func.coalesce(ImportJob.started_at, now),
+        "updated_at": now,
+    }, synchronize_session=False)
+    db.commit()
+    return claimed == 1
+
+def _advance(db: Session, job: ImportJob, start: int, processed: int, accepted: int, rejected: int):
+    """Records a chunk's progress in the chunk's own transaction, if this worker still owns the job."""
+    advanced = db.query(ImportJob).filter(
+        ImportJob.id == job.id,
+        ImportJob.status == "running",
+        ImportJob.rows_processed == start
+    ).update({
+        "rows_processed": ImportJob.rows_processed + processed,
+        "rows_accepted": ImportJob.rows_accepted + accepted,
+        "rows_rejected": ImportJob.rows_rejected + rejected,
+        "updated_at": datetime.utcnow(),
+    }, synchronize_session=False)
+    if advanced != 1:
+        raise _Superseded(job.id)
+
+def _run_import(job_id: str):
+    db = SessionLocal()
+    try:
+        if not _claim(db, job_id):
+            return
+        job = db.get(ImportJob, job_id)
+        uploader = db.get(auth_models.User, job.user_id)
+        if uploader is None:
+            raise RuntimeError("The user who uploaded this file no longer exists")
+        principal = utils.Principal.from_user(uploader)
+        lookups = _load_lookups(db, job.company_id)
+        chunks = _excel_chunks(job.path) if job.path.endswith(".xlsx") else _csv_chunks(job.path)
+
+        # Appends when resuming; the header is only written once
+        with open(job.reject_path, "a", newline="") as reject_file:
+            reject_writer = csv.writer(reject_file)
+            has_header = reject_file.tell() > 0
+            offset = 0
+            for chunk in chunks:
+                # Skip what an earlier run already committed
+                start = max(job.rows_processed, offset)
+                original = chunk.iloc[start - offset:].reset_index(drop=True)
+                offset += len(chunk)
+                if original.empty:
+                    continue
+
+                normalized, errors = bulk.validate_frame(db, _map_chunk(original, lookups), principal)
+                malformed = original.iloc[:, 0].map(_malformed_fields)
+                if malformed.notna().any():
+                    errors = errors.copy()
+                    for i in malformed[malformed.notna()].index:
+                        errors[i] = f"Malformed line: {len(malformed[i])} fields, expected {len(original.columns)}"
+                accepted = normalized[errors.isna()]
+                rejected = errors.notna()
+
+                try:
+                    bulk.insert_sales(db, accepted, job.company_id, bulk.BULK_CHUNK_SIZE, import_job_id=job.id)
+                    _advance(db, job, start, len(original), len(accepted), int(rejected.sum()))
+                    db.commit()
+                except Exception:
+                    db.rollback()
+                    raise
+                if len(accepted):
+                    columnar_cache.company_sales.invalidate(job.company_id)
+                    rank_index.salesmen.invalidate(job.company_id)
+
+                if rejected.any():
+                    if not has_header:
+                        reject_writer.writerow(["row", "error"] + list(original.columns))
+                        has_header = True
+                    for i in rejected[rejected].index:
+                        values = malformed[i]
+                        if values is None:
+                            values = ["" if pd.isna(v) else v for v in original.loc[i]]
+                        # +2: header line plus 1-based numbering, as seen in a spreadsheet
+                        reject_writer.writerow([start + i + 2, errors[i]] + values)
+                    reject_file.flush()
+
+        job.status = "completed"
+        job.finished_at = job.updated_at = datetime.utcnow()
+        db.commit()
+        if os.path.exists(job.path):
+            os.remove(job.path)
+    except _Superseded:
+        logger.warning("Import job %s was taken over or discarded, stopping", job_id)
+    except Exception as e:
+        logger.exception("Import job %s failed", job_id)
+        db.rollback()
+        # Only if this worker still owns it; the file stays for a resume
+        db.query(ImportJob).filter(ImportJob.id == job_id, ImportJob.status == "running").update({
+            "status": "failed",
+            "error": str(e),
+            "finished_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+def _remove_files(job: ImportJob):
+    for path in (job.path, job.reject_path):
+        if path and os.path.exists(path):
+            os.remove(path)
+
+def _prune(db: Session, company_id: int):
+    """
+    Forgets the company's oldest finished jobs beyond MAX_TRACKED_JOBS. A job is kept while any
+    of its sales remain, so they can still be discarded.
+    """
+    old = db.query(ImportJob).filter(
+        ImportJob.company_id == company_id,
+        ImportJob.status.in_(("completed", "discarded"))
+    ).order_by(ImportJob.finished_at.desc()).offset(MAX_TRACKED_JOBS).all()
+    if old:
+        with_sales = set(db.scalars(
+            select(Sale.import_job_id).where(
+                Sale.company_id == company_id,
+                Sale.import_job_id.in_([job.id for job in old])
+            ).distinct()
+        ))
+        old = [job for job in old if job.id not in with_sales]
+    for job in old:
+        _remove_files(job)
+        db.delete(job)
+    if old:
+        db.commit()
+
+def _get_job(db: Session, job_id: str, current_user) -> ImportJob:
+    job = db.get(ImportJob, job_id)
+    if not job or job.company_id != current_user.company_id:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+def _get_owned_job(db: Session, job_id: str, current_user) -> ImportJob:
+    job = _get_job(db, job_id, current_user)
+    if current_user.role != "manager" and job.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Only the uploader or a manager can change this import")
+    return job
+
+def _take_over(db: Session, job: ImportJob, status: str):
+    """Moves a failed or stale job to status; 409 if it is still being worked on or already finished."""
+    if not (job.status == "failed" or job.stale):
+        raise HTTPException(status_code=409, detail=f"Import job is {job.status}")
+    taken = db.query(ImportJob).filter(
+        ImportJob.id == job.id,
+        ImportJob.status == job.status,
+        ImportJob.updated_at == job.updated_at
+    ).update({"status": status, "updated_at": datetime.utcnow()}, synchronize_session=False)
+    if taken != 1:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Import job changed, try again")
+
+@router.post("/")
+def import_sales(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: auth_models.User = Depends(utils.get_current_active_user)
+):
+    """
+    Uploads a CSV or XLSX sales file. The file is spooled to disk and processed in chunks
+    on a background worker; poll GET /api/sales/import/{job_id} for progress.
+    """
+    filename = file.filename or "upload.csv"
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else "csv"
+    if extension not in ("csv", "xlsx"):
+        raise HTTPException(status_code=400, detail="Only .csv and .xlsx files are supported")
+    if extension == "xlsx":
+        try:
+            import openpyxl
+        except ImportError:
+            raise HTTPException(status_code=501, detail="XLSX import requires openpyxl to be installed")
+
+    os.makedirs(IMPORT_DIR, exist_ok=True)
+    path = os.path.join(IMPORT_DIR, f"{uuid.uuid4()}.{extension}")
+    with open(path, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer, SPOOL_BUFFER_SIZE)
+
+    job = ImportJob(
+        company_id=current_user.company_id,
+        user_id=current_user.id,
+        filename=filename,
+        path=path,
+        status="queued",
+        rows_processed=0,
+        rows_accepted=0,
+        rows_rejected=0
+    )
+    db.add(job)
+    db.commit()
+    _prune(db, current_user.company_id)
+
+    executor.submit(_run_import, job.id)
+    return job.to_dict()
+
+@router.get("/")
+def list_imports(
+    db: Session = Depends(get_db),
+    current_user: utils.Principal = Depends(utils.get_current_principal)
+):
+    """The company's import jobs, newest first."""
+    jobs = db.query(ImportJob).filter(
+        ImportJob.company_id == current_user.company_id
+    ).order_by(ImportJob.created_at.desc()).all()
+    return [job.to_dict() for job in jobs]
+
+@router.get("/{job_id}")
+def get_import_status(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: utils.Principal = Depends(utils.get_current_principal)
+):
+    return _get_job(db, job_id, current_user).to_dict()
+
+@router.post("/{job_id}/resume")
+def resume_import(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: utils.Principal = Depends(utils.get_current_principal)
+):
+    """Continues a failed (or abandoned) import from the last committed row."""
+    job = _get_owned_job(db, job_id, current_user)
+    _take_over(db, job, "queued")
+    if not job.path or not os.path.exists(job.path):
+        db.rollback()
+        raise HTTPException(status_code=410, detail="The uploaded file is gone; discard this import and upload it again")
+    db.commit()
+    db.refresh(job)
+
+    executor.submit(_run_import, job.id)
+    return job.to_dict()
+
+@router.delete("/{job_id}")
+def discard_import(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: utils.Principal = Depends(utils.get_current_principal)
+):
+    """
+    Deletes every sale a failed, abandoned or completed import inserted and takes them out
+    of the rollup, in one transaction.
+    """
+    job = _get_owned_job(db, job_id, current_user)
+    if job.status != "completed":
+        _take_over(db, job, "discarded")
+
+    criteria = (Sale.company_id == job.company_id, Sale.import_job_id == job.id)
+    rollup.remove_sales(db, *criteria)
+    deleted = db.query(Sale).filter(*criteria).delete(synchronize_session=False)
+    job.status = "discarded"
+    job.finished_at = job.updated_at = datetime.utcnow()
+    db.commit()
+    columnar_cache.company_sales.invalidate(job.company_id)
+    rank_index.salesmen.invalidate(job.company_id)
+    _remove_files(job)
+
+    return {**job.to_dict(), "sales_deleted": deleted}
+
+@router.get("/{job_id}/rejects")
+def download_import_rejects(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: utils.Principal = Depends(utils.get_current_principal)
+):
+    job = _get_job(db, job_id, current_user)
+    if not job.rows_rejected or not os.path.exists(job.reject_path):
+        raise HTTPException(status_code=404, detail="No rejected rows for this job")
+    return FileResponse(job.reject_path, media_type="text/csv", filename=f"rejects_{job.filename}.csv")
@@ -0,0 +1,218 @@
+from sqlalchemy import text
+from datetime import date
+
+# Postgres-only monthly range partitioning of the sales table on "date".
+# Partitions are named sales_yYYYYmMM and cover [first of month, first of next month).
+# A DEFAULT partition catches months nobody created ahead of time. date is part of the primary
+# key, so it is NOT NULL once partitioned; legacy NULL dates are backfilled from created_at first.
+
+PARENT = "sales"
+DEFAULT_PARTITION = "sales_default"
+
+def month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+def add_months(d: date, months: int) -> date:
+    index = d.year * 12 + (d.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month: date, parent: str = PARENT) -> str:
+    return f"{parent}_y{month.year:04d}m{month.month:02d}"
+
+def is_partitioned(conn, table: str = PARENT) -> bool:
+    return bool(conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = :table AND c.relnamespace = 'public'::regnamespace"
+    ), {"table": table}).scalar())
+
+def list_partitions(conn, parent: str = PARENT):
+    """Attached partitions of the parent as [(name, bound expression)], oldest first."""
+    rows = conn.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+        "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :parent AND p.relnamespace = 'public'::regnamespace "
+        "ORDER BY c.relname"
+    ), {"parent": parent}).all()
+    return [(name, bound) for name, bound in rows]
+
+def default_partition_name(parent: str = PARENT) -> str:
+    return DEFAULT_PARTITION if parent == PARENT else f"{parent}_default"
+
+def _exists(conn, name: str) -> bool:
+    return bool(conn.execute(text("SELECT to_regclass(:name)"), {"name": f"public.{name}"}).scalar())
+
+def create_month_partition(conn, month: date, parent: str = PARENT) -> bool:
+    """
+    Creates the partition for one month if missing. Returns True when it was created.
+    Rows for that month already in the DEFAULT partition are moved into the new one; Postgres
+    refuses to create the partition while DEFAULT holds them, so DEFAULT is detached meanwhile.
+    """
+    name = partition_name(month, parent)
+    if _exists(conn, name):
+        return False
+    bounds = {"start": month, "end": add_months(month, 1)}
+    create = text(
+        f'CREATE TABLE "{name}" PARTITION OF "{parent}" '
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{bounds['end'].isoformat()}')"
+    )
+
+    default = default_partition_name(parent)
+    stranded = _exists(conn, default) and conn.execute(text(
+        f'SELECT EXISTS (SELECT 1 FROM "{default}" WHERE date >= :start AND date < :end)'
+    ), bounds).scalar()
+    if not stranded:
+        conn.execute(create)
+        return True
+
+    conn.execute(text(f'ALTER TABLE "{parent}" DETACH PARTITION "{default}"'))
+    conn.execute(create)
+    conn.execute(text(
+        f'WITH moved AS (DELETE FROM "{default}" WHERE date >= :start AND date < :end RETURNING *) '
+        f'INSERT INTO "{name}" SELECT * FROM moved'
+    ), bounds)
+    conn.execute(text(f'ALTER TABLE "{parent}" ATTACH PARTITION "{default}" DEFAULT'))
+    return True
+
+def create_partitions(conn, start: date, end: date, parent: str = PARENT):
+    """Creates every monthly partition from start's month through end's month. Returns the names created."""
+    created = []
+    month = month_start(start)
+    while month <= month_start(end):
+        if create_month_partition(conn, month, parent):
+            created.append(partition_name(month, parent))
+        month = add_months(month, 1)
+    return created
+
+def create_default_partition(conn, parent: str = PARENT):
+    name = default_partition_name(parent)
+    conn.execute(text(f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{parent}" DEFAULT'))
+
+def partitions_older_than(conn, cutoff: date, parent: str = PARENT):
+    """Names of monthly partitions whose whole range ends on or before the cutoff month."""
+    cutoff = month_start(cutoff)
+    old = []
+    prefix = f"{parent}_y"
+    for name, _ in list_partitions(conn, parent):
+        if not name.startswith(prefix):
+            continue
+        year, month = int(name[len(prefix):len(prefix) + 4]), int(name[-2:])
+        if add_months(date(year, month, 1), 1) <= cutoff:
+            old.append(name)
+    return old
+
+def detach_partition(conn, name: str, archive_schema: str = None, drop: bool = False, parent: str = PARENT):
+    """Detaches a partition, then optionally moves it to an archive schema or drops it."""
+    conn.execute(text(f'ALTER TABLE "{parent}" DETACH PARTITION "{name}"'))
+    if drop:
+        conn.execute(text(f'DROP TABLE "{name}"'))
+    elif archive_schema:
+        conn.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{archive_schema}"'))
+        conn.execute(text(f'ALTER TABLE "{name}" SET SCHEMA "{archive_schema}"'))
+
+# --- One-off conversion of an existing (unpartitioned) sales table ---
+# Rows are copied into sales_partitioned in id batches while the app keeps running, then a short
+# locked swap copies the stragglers, renames the tables and hands the id sequence over.
+# The old table is kept as sales_unpartitioned until someone drops it by hand.
+
+STAGING = "sales_partitioned"
+RETIRED = "sales_unpartitioned"
+
+# Index name -> columns, created on the partitioned parent (and so on every partition)
+INDEXES = {
+    "ix_sales_id": "id",
+    "ix_sales_company_date": "company_id, date",
+    "ix_sales_company_user_date": "company_id, user_id, date",
+    "ix_sales_company_product": "company_id, product_id",
+    "ix_sales_import_job": "import_job_id",
+}
+
+FOREIGN_KEYS = {
+    "product_id": "products(id)",
+    "user_id": "users(id)",
+    "company_id": "companies(id)",
+}
+
+def backfill_null_dates(conn) -> int:
+    """
+    Sets date = created_at on sales rows with no date, since the partitioned table can't hold
+    them. Returns the rows updated; raises if some rows have neither.
+    """
+    updated = conn.execute(text(
+        f'UPDATE "{PARENT}" SET date = created_at WHERE date IS NULL AND created_at IS NOT NULL'
+    )).rowcount
+    missing = conn.execute(text(f'SELECT count(*) FROM "{PARENT}" WHERE date IS NULL')).scalar()
+    if missing:
+        raise RuntimeError(
+            f"{missing} sales rows have neither date nor created_at; set their date before partitioning"
+        )
+    return updated
+
+def create_staging_table(conn, months_ahead: int):
+    """Creates sales_partitioned with a partition for every month that has sales, plus months_ahead."""
+    conn.execute(text(
+        f'CREATE TABLE "{STAGING}" (LIKE "{PARENT}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+        "PARTITION BY RANGE (date)"
+    ))
+    # The partition key has to be part of the primary key
+    conn.execute(text(f'ALTER TABLE "{STAGING}" ADD CONSTRAINT "{STAGING}_pkey" PRIMARY KEY (id, date)'))
+    for column, target in FOREIGN_KEYS.items():
+        conn.execute(text(
+            f'ALTER TABLE "{STAGING}" ADD CONSTRAINT "{STAGING}_{column}_fkey" '
+            f"FOREIGN KEY ({column}) REFERENCES {target}"
+        ))
+    for name, columns in INDEXES.items():
+        conn.execute(text(f'CREATE INDEX "{name}_p" ON "{STAGING}" ({columns})'))
+
+    oldest = conn.execute(text(f'SELECT min(date) FROM "{PARENT}"')).scalar()
+    today = date.today()
+    start = oldest.date() if oldest else today
+    create_partitions(conn, start, add_months(today, months_ahead), parent=STAGING)
+    create_default_partition(conn, parent=STAGING)
+
+def copy_batch(conn, after_id: int, batch_size: int):
+    """
+    Copies the next batch of rows by id. Returns the highest id copied, or None when done.
+    Run backfill_null_dates first; a row with no date would fail the batch.
+    """
+    return conn.execute(text(
+        f'WITH batch AS (SELECT * FROM "{PARENT}" WHERE id > :after ORDER BY id LIMIT :size), '
+        f'copied AS (INSERT INTO "{STAGING}" SELECT * FROM batch RETURNING id) '
+        "SELECT max(id) FROM copied"
+    ), {"after": after_id, "size": batch_size}).scalar()
+
+def drop_deleted(conn) -> int:
+    """Removes copied rows that were deleted from sales since they were copied."""
+    return conn.execute(text(
+        f'DELETE FROM "{STAGING}" p WHERE NOT EXISTS (SELECT 1 FROM "{PARENT}" s WHERE s.id = p.id)'
+    )).rowcount
+
+def swap_tables(conn, last_id: int):
+    """
+    Final step, in one transaction: locks sales, copies rows written since the last batch
+    (backfilling any new NULL dates), and swaps the partitioned table in under the "sales" name.
+    """
+    conn.execute(text(f'LOCK TABLE "{PARENT}" IN ACCESS EXCLUSIVE MODE'))
+    backfill_null_dates(conn)
+    conn.execute(text(f'INSERT INTO "{STAGING}" SELECT * FROM "{PARENT}" WHERE id > :after'), {"after": last_id})
+    drop_deleted(conn)
+
+    sequence = conn.execute(text(f"SELECT pg_get_serial_sequence('{PARENT}', 'id')")).scalar()
+
+    conn.execute(text(f'ALTER TABLE "{PARENT}" RENAME TO "{RETIRED}"'))
+    conn.execute(text(f'ALTER TABLE "{RETIRED}" RENAME CONSTRAINT "{PARENT}_pkey" TO "{RETIRED}_pkey"'))
+    for name in INDEXES:
+        conn.execute(text(f'ALTER INDEX IF EXISTS "{name}" RENAME TO "{name}_old"'))
+
+    conn.execute(text(f'ALTER TABLE "{STAGING}" RENAME TO "{PARENT}"'))
+    conn.execute(text(f'ALTER TABLE "{PARENT}" RENAME CONSTRAINT "{STAGING}_pkey" TO "{PARENT}_pkey"'))
+    for name in INDEXES:
+        conn.execute(text(f'ALTER INDEX "{name}_p" RENAME TO "{name}"'))
+    conn.execute(text(f'ALTER TABLE "{STAGING}_default" RENAME TO "{DEFAULT_PARTITION}"'))
+    for name, _ in list_partitions(conn, PARENT):
+        if name.startswith(f"{STAGING}_y"):
+            conn.execute(text(f'ALTER TABLE "{name}" RENAME TO "{PARENT}{name[len(STAGING):]}"'))
+
+    # Keep the id sequence alive when the retired table is eventually dropped
+    if sequence:
+        conn.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY "{PARENT}".id'))
@@ -0,0 +1,274 @@
+from sqlalchemy import select, func
+from collections import OrderedDict
+import asyncio
+import os
+import random
+import threading
+import time
+import database
+from .rollup import SalesDailyRollup
+
+# Process-local rank of every salesman in a company by total revenue, so dashboards don't
+# aggregate the company's sales to find one user's position. A company is built from the daily
+# rollup on first use, kept current by create_sale / delete_sale in this process, and dropped by
+# bulk inserts and imports. Like the columnar cache, writes from other worker processes show up
+# after TTL_SECONDS. Unassigned sales (no user) aren't ranked.
+TTL_SECONDS = float(os.getenv("RANK_INDEX_TTL_SECONDS", "300"))
+MAX_COMPANIES = int(os.getenv("RANK_INDEX_MAX_COMPANIES", "256"))
+
+class _Node:
+    __slots__ = ("key", "priority", "size", "left", "right")
+
+    def __init__(self, key):
+        self.key = key
+        self.priority = random.random()
+        self.size = 1
+        self.left = None
+        self.right = None
+
+def _size(node):
+    return node.size if node is not None else 0
+
+def _update(node):
+    node.size = 1 + _size(node.left) + _size(node.right)
+    return node
+
+def _split(node, key):
+    """(keys < key, keys >= key)"""
+    if node is None:
+        return None, None
+    if node.key < key:
+        node.right, right = _split(node.right, key)
+        return _update(node), right
+    left, node.left = _split(node.left, key)
+    return left, _update(node)
+
+def _merge(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        return _update(left)
+    right.left = _merge(left, right.left)
+    return _update(right)
+
+def _remove(node, key):
+    if node is None:
+        return None
+    if key < node.key:
+        node.left = _remove(node.left, key)
+    elif node.key < key:
+        node.right = _remove(node.right, key)
+    else:
+        return _merge(node.left, node.right)
+    return _update(node)
+
+class RankTree:
+    """
+    Order-statistics treap over distinct, comparable keys: insert, remove, count_less and
+    kth are O(log n) expected.
+    """
+    def __init__(self):
+        self.root = None
+
+    def __len__(self):
+        return _size(self.root)
+
+    def insert(self, key):
+        left, right = _split(self.root, key)
+        self.root = _merge(_merge(left, _Node(key)), right)
+
+    def remove(self, key):
+        self.root = _remove(self.root, key)
+
+    def count_less(self, key) -> int:
+        count, node = 0, self.root
+        while node is not None:
+            if node.key < key:
+                count += _size(node.left) + 1
+                node = node.right
+            else:
+                node = node.left
+        return count
+
+    def kth(self, index: int):
+        """The key at 0-based position index in sorted order."""
+        node = self.root
+        while node is not None:
+            left = _size(node.left)
+            if index < left:
+                node = node.left
+            elif index == left:
+                return node.key
+            else:
+                index -= left + 1
+                node = node.right
+        raise IndexError(index)
+
+class CompanyRanks:
+    """One company's salesmen ordered by (revenue desc, user_id)."""
+    def __init__(self, totals):
+        self.totals = {} # user_id -> [revenue, orders]
+        self.tree = RankTree()
+        for user_id, revenue, orders in totals:
+            if user_id and orders > 0:
+                self.totals[user_id] = [revenue or 0.0, orders]
+                self.tree.insert((-(revenue or 0.0), user_id))
+
+    def apply(self, user_id: int, amount: float, sign: int = 1):
+        if not user_id:
+            return
+        total = self.totals.get(user_id)
+        if total is not None:
+            self.tree.remove((-total[0], user_id))
+        else:
+            total = self.totals[user_id] = [0.0, 0]
+        total[0] += sign * (amount or 0)
+        total[1] += sign
+        if total[1] > 0:
+            self.tree.insert((-total[0], user_id))
+        else:
+            del self.totals[user_id]
+
+    def rank(self, user_id: int) -> int:
+        """1-based position; a salesman with no sales ranks after everyone who has some."""
+        total = self.totals.get(user_id)
+        if total is None:
+            return len(self.tree) + 1
+        return self.tree.count_less((-total[0], user_id)) + 1
+
+    def _entry(self, index: int):
+        revenue, user_id = self.tree.kth(index)
+        return {"rank": index + 1, "user_id": user_id, "revenue": -revenue}
+
+    def top(self, n: int):
+        return [self._entry(i) for i in range(min(n, len(self.tree)))]
+
+    def around(self, user_id: int, k: int):
+        """The k salesmen either side of user_id, and user_id itself if they have sales."""
+        position = self.rank(user_id) - 1
+        return [self._entry(i) for i in range(max(position - k, 0), min(position + k + 1, len(self.tree)))]
+
+class SalesmanRanks:
+    """TTL + LRU cache of CompanyRanks keyed by company_id."""
+    def __init__(self, ttl_seconds: float = TTL_SECONDS, max_companies: int = MAX_COMPANIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_companies = max_companies
+        self.entries = OrderedDict() # company_id -> (expires_at, CompanyRanks)
+        # Bumped by every write hook; a build that overlapped a write is used once but not kept
+        self.versions = {}
+        # company_id -> future of the build in progress, shared by concurrent cold lookups
+        self.building = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.builds = 0
+        self.evictions = 0
+
+    def _get(self, company_id: int):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(company_id)
+            if entry is None or entry[0] <= now:
+                self.entries.pop(company_id, None)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(company_id)
+            self.hits += 1
+            return entry[1]
+
+    async def _build(self, company_id: int) -> CompanyRanks:
+        # Its own session on the primary: the build is shared and may outlive the request that
+        # started it, and writes applied meanwhile assume it saw everything committed before
+        with self.lock:
+            version = self.versions.get(company_id, 0)
+        async with database.AsyncSessionLocal() as db:
+            totals = (await db.execute(
+                select(
+                    SalesDailyRollup.user_id,
+                    func.sum(SalesDailyRollup.amount),
+                    func.sum(SalesDailyRollup.orders)
+                ).where(
+                    SalesDailyRollup.company_id == company_id,
+                    SalesDailyRollup.user_id != 0
+                ).group_by(SalesDailyRollup.user_id)
+            )).all()
+        ranks = CompanyRanks(totals)
+        with self.lock:
+            self.builds += 1
+            if self.ttl_seconds > 0 and self.versions.get(company_id, 0) == version:
+                self.entries[company_id] = (time.monotonic() + self.ttl_seconds, ranks)
+                self.entries.move_to_end(company_id)
+                while len(self.entries) > self.max_companies:
+                    self.entries.popitem(last=False)
+                    self.evictions += 1
+        return ranks
+
+    async def company(self, company_id: int) -> CompanyRanks:
+        """The company's index, built from the rollup if it isn't cached."""
+        ranks = self._get(company_id)
+        if ranks is not None:
+            return ranks
+        building = self.building.get(company_id)
+        if building is not None:
+            return await asyncio.shield(building)
+
+        building = self.building[company_id] = asyncio.ensure_future(self._build(company_id))
+        try:
+            return await asyncio.shield(building)
+        finally:
+            if self.building.get(company_id) is building:
+                del self.building[company_id]
+
+    async def rank(self, company_id: int, user_id: int) -> int:
+        ranks = await self.company(company_id)
+        with self.lock:
+            return ranks.rank(user_id)
+
+    async def standings(self, company_id: int, user_id: int, top: int, around: int):
+        """user_id's rank, the number of ranked salesmen, the top salesmen and user_id's neighbours."""
+        ranks = await self.company(company_id)
+        with self.lock:
+            return {
+                "rank": ranks.rank(user_id),
+                "ranked": len(ranks.tree),
+                "top": ranks.top(top),
+                "around": ranks.around(user_id, around),
+            }
+
+    def apply(self, company_id: int, user_id: int, amount: float, sign: int = 1):
+        """Call after create_sale (sign=1) or delete_sale (sign=-1) commits."""
+        with self.lock:
+            self.versions[company_id] = self.versions.get(company_id, 0) + 1
+            entry = self.entries.get(company_id)
+            if entry is not None:
+                entry[1].apply(user_id, amount, sign)
+
+    def invalidate(self, company_id: int):
+        """Call after writes that don't go through apply (bulk inserts, imports)."""
+        with self.lock:
+            self.versions[company_id] = self.versions.get(company_id, 0) + 1
+            self.entries.pop(company_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "companies": len(self.entries),
+                "max_companies": self.max_companies,
+                "ttl_seconds": self.ttl_seconds,
+                "salesmen": sum(len(ranks.totals) for _, ranks in self.entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+                "builds": self.builds,
+                "evictions": self.evictions,
+            }
+
+salesmen = SalesmanRanks()
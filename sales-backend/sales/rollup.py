@@ -0,0 +1,244 @@
+from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, Index, func, insert, delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from database import Base
+from datetime import date
+
+# --- Models ---
+class SalesDailyRollup(Base):
+    """
+    One row per (company, day, salesman, product, region) holding the summed
+    amount / quantity and the number of orders. Maintained incrementally by
+    create_sale / delete_sale, filled by migration 0005 and regenerated by
+    scripts/rebuild_sales_rollup.py.
+    """
+    __tablename__ = "sales_daily_rollup"
+
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, primary_key=True)
+    region = Column(String, primary_key=True, default="") # '' when the sale has no region
+
+    amount = Column(Float, default=0)
+    quantity = Column(Integer, default=0)
+    orders = Column(Integer, default=0)
+
+    __table_args__ = (
+        # Salesman dashboards filter by (company, user) before the day range
+        Index("ix_sales_daily_rollup_company_user_day", "company_id", "user_id", "day"),
+    )
+
+class SalesRollupMark(Base):
+    """
+    Per-company counter bumped in the same transaction as every rollup write. Tables derived
+    from the rollup out of band (the leaderboard snapshot) record the version they were built
+    from, so a reader can tell they are behind whichever worker made the write.
+    """
+    __tablename__ = "sales_rollup_marks"
+
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+KEY_COLUMNS = ["company_id", "day", "user_id", "product_id", "region"]
+
+def _key(sale):
+    return {
+        "company_id": sale.company_id,
+        "day": sale.date.date(),
+        "user_id": sale.user_id or 0,
+        "product_id": sale.product_id or 0,
+        "region": sale.region or "",
+    }
+
+def _upsert(db: Session, buckets):
+    """Adds each bucket's amount / quantity / orders onto the matching rollup row."""
+    table = SalesDailyRollup.__table__
+    dialect = db.get_bind().dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        # Atomic upsert, safe under concurrent writes to the same bucket
+        dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=KEY_COLUMNS,
+            set_={
+                "amount": table.c.amount + stmt.excluded.amount,
+                "quantity": table.c.quantity + stmt.excluded.quantity,
+                "orders": table.c.orders + stmt.excluded.orders,
+            }
+        )
+        db.execute(stmt, buckets)
+    else:
+        for values in buckets:
+            key = {k: values[k] for k in KEY_COLUMNS}
+            row = db.get(SalesDailyRollup, key, with_for_update=True)
+            if row:
+                row.amount += values["amount"]
+                row.quantity += values["quantity"]
+                row.orders += values["orders"]
+            else:
+                db.add(SalesDailyRollup(**values))
+        db.flush()
+
+def apply_sale(db: Session, sale, sign: int = 1):
+    """
+    Adds (sign=1) or removes (sign=-1) a single sale from the rollup.
+    Runs inside the caller's transaction, so the caller commits.
+    """
+    if sale.date is None or sale.company_id is None:
+        # Legacy rows rebuild() leaves out as well
+        return
+    key = _key(sale)
+    _upsert(db, [dict(
+        key,
+        amount=sign * (sale.amount or 0),
+        quantity=sign * (sale.quantity or 0),
+        orders=sign
+    )])
+    _bump(db, [sale.company_id])
+
+    if sign < 0:
+        # Drop buckets that no longer hold any sale
+        db.execute(
+            delete(SalesDailyRollup)
+            .where(*[getattr(SalesDailyRollup, k) == v for k, v in key.items()])
+            .where(SalesDailyRollup.orders <= 0)
+        )
+
+def _bump(db: Session, company_ids):
+    """Increments the companies' marks. Holds their rows until the caller's transaction ends."""
+    table = SalesRollupMark.__table__
+    # Sorted so concurrent multi-company writes lock in the same order
+    company_ids = sorted({c for c in company_ids if c is not None})
+    if not company_ids:
+        return
+    dialect = db.get_bind().dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["company_id"],
+            set_={"version": table.c.version + 1}
+        )
+        db.execute(stmt, [{"company_id": c, "version": 1} for c in company_ids])
+    else:
+        for company_id in company_ids:
+            mark = db.get(SalesRollupMark, company_id, with_for_update=True)
+            if mark:
+                mark.version += 1
+            else:
+                db.add(SalesRollupMark(company_id=company_id, version=1))
+        db.flush()
+
+def apply_buckets(db: Session, buckets):
+    """
+    Adds pre-aggregated buckets (dicts with the key columns plus amount, quantity, orders),
+    e.g. from a bulk insert. Runs inside the caller's transaction.
+    """
+    if buckets:
+        _upsert(db, buckets)
+        _bump(db, [b["company_id"] for b in buckets])
+
+def remove_sales(db: Session, *criteria):
+    """
+    Subtracts the sales matching criteria (Sale column filters) from the rollup, before the
+    caller deletes them, and drops the buckets left without orders. Buckets of other sales,
+    including detached partitions' months, are left alone. Runs inside the caller's transaction.
+    """
+    from sales.router import Sale
+
+    day = func.date(Sale.date)
+    user_id = func.coalesce(Sale.user_id, 0)
+    product_id = func.coalesce(Sale.product_id, 0)
+    region = func.coalesce(Sale.region, "")
+    rows = db.execute(
+        select(
+            Sale.company_id,
+            day,
+            user_id,
+            product_id,
+            region,
+            func.coalesce(func.sum(Sale.amount), 0),
+            func.coalesce(func.sum(Sale.quantity), 0),
+            func.count(Sale.id)
+        ).where(
+            Sale.company_id.isnot(None),
+            Sale.date.isnot(None),
+            *criteria
+        ).group_by(Sale.company_id, day, user_id, product_id, region)
+    ).all()
+
+    apply_buckets(db, [
+        {
+            "company_id": company_id,
+            # SQLite's date() returns text
+            "day": bucket_day if isinstance(bucket_day, date) else date.fromisoformat(bucket_day),
+            "user_id": bucket_user,
+            "product_id": bucket_product,
+            "region": bucket_region,
+            "amount": -amount,
+            "quantity": -quantity,
+            "orders": -orders,
+        }
+        for company_id, bucket_day, bucket_user, bucket_product, bucket_region, amount, quantity, orders in rows
+    ])
+    companies = {row[0] for row in rows}
+    if companies:
+        db.execute(
+            delete(SalesDailyRollup)
+            .where(SalesDailyRollup.company_id.in_(companies))
+            .where(SalesDailyRollup.orders <= 0)
+        )
+
+def rebuild(db: Session, company_id: int = None):
+    """
+    Regenerates the rollup from the sales table (all companies, or just one)
+    with a single INSERT ... SELECT. Returns the number of buckets written.
+    """
+    from sales.router import Sale
+
+    clear = delete(SalesDailyRollup)
+    if company_id is not None:
+        clear = clear.where(SalesDailyRollup.company_id == company_id)
+    db.execute(clear)
+
+    day = func.date(Sale.date)
+    user_id = func.coalesce(Sale.user_id, 0)
+    product_id = func.coalesce(Sale.product_id, 0)
+    region = func.coalesce(Sale.region, "")
+
+    source = select(
+        Sale.company_id,
+        day,
+        user_id,
+        product_id,
+        region,
+        func.coalesce(func.sum(Sale.amount), 0),
+        func.coalesce(func.sum(Sale.quantity), 0),
+        func.count(Sale.id)
+    ).where(
+        Sale.company_id.isnot(None),
+        Sale.date.isnot(None)
+    ).group_by(Sale.company_id, day, user_id, product_id, region)
+
+    if company_id is not None:
+        source = source.where(Sale.company_id == company_id)
+
+    db.execute(
+        insert(SalesDailyRollup).from_select(
+            KEY_COLUMNS + ["amount", "quantity", "orders"], source
+        )
+    )
+    if company_id is not None:
+        _bump(db, [company_id])
+    else:
+        companies = set(db.scalars(select(SalesDailyRollup.company_id).distinct()))
+        _bump(db, companies | set(db.scalars(select(SalesRollupMark.company_id))))
+    db.commit()
+
+    count_query = db.query(func.count()).select_from(SalesDailyRollup)
+    if company_id is not None:
+        count_query = count_query.filter(SalesDailyRollup.company_id == company_id)
+    return count_query.scalar()
@@ -1,14 +1,20 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
+import base64
+import json
 from pydantic import BaseModel
-from typing import List, Optional
-from fastapi import APIRouter, Depends
+from typing import Any, Dict, List, Optional, Union
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import func, or_, and_
 from sqlalchemy.orm import Session
 from database import get_db
 from auth import utils, models as auth_models
 from products.router import Product
+from . import rollup, columnar_cache, rank_index
 
 # --- Models ---
 class Sale(Base):
@@ -31,6 +37,16 @@ class Sale(Base):
     product = relationship(Product) 
     user = relationship(auth_models.User)
     region = Column(String, nullable=True) # Added for Salesman Dashboard
+    import_job_id = Column(String, nullable=True) # The file import that created the row (sales/imports.py)
+
+    __table_args__ = (
+        # Keyset pagination and date-range filters walk this index
+        Index("ix_sales_company_date", "company_id", "date"),
+        Index("ix_sales_company_user_date", "company_id", "user_id", "date"),
+        Index("ix_sales_company_product", "company_id", "product_id"),
+        # Discarding an import deletes its rows
+        Index("ix_sales_import_job", "import_job_id"),
+    )
 
 # --- Schemas ---
 class SaleCreate(BaseModel):
@@ -60,60 +76,144 @@ class SaleResponse(BaseModel):
     class Config:
         orm_mode = True
 
+class SalePage(BaseModel):
+    """One keyset page of GET /api/sales; items hold only the requested fields (plus id and date)."""
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+
 # --- Router ---
 router = APIRouter(
     prefix="/api/sales",
     tags=["Sales"]
 )
 
-@router.get("/", response_model=List[SaleResponse])
-def get_sales(
-    start_date: str = None,
-    end_date: str = None,
-    db: Session = Depends(get_db), 
-    current_user: auth_models.User = Depends(utils.get_current_active_user)
-):
-    from sqlalchemy.orm import joinedload
-    query = db.query(Sale).filter(Sale.company_id == current_user.company_id)
-    
-    # Eager load relationships to prevent lazy loading issues
-    query = query.options(joinedload(Sale.user), joinedload(Sale.product))
-    
+# Columns selectable through ?fields=; names come from outer joins, only when requested
+SALE_FIELDS = {
+    "id": Sale.id,
+    "product_id": Sale.product_id,
+    "amount": Sale.amount,
+    "quantity": Sale.quantity,
+    "date": Sale.date,
+    "user_id": Sale.user_id,
+    "customer_name": Sale.customer_name,
+    "notes": Sale.notes,
+    "region": Sale.region,
+    "salesman_name": func.coalesce(auth_models.User.full_name, "Unknown"),
+    "product_name": func.coalesce(Product.name, "Unknown Product"),
+}
+DEFAULT_FIELDS = list(SaleResponse.__fields__)
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def parse_date_param(value: Optional[str], name: str) -> Optional[datetime]:
+    """Parses an ISO date/datetime query param so the comparison is typed and index-friendly."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: expected an ISO date")
+
+def parse_fields_param(fields: Optional[str]) -> List[str]:
+    """Parses a comma-separated ?fields= list, rejecting unknown names."""
+    if not fields:
+        return DEFAULT_FIELDS
+    selected = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in selected if f not in SALE_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return selected
+
+def encode_cursor(sale_date: datetime, sale_id: int) -> str:
+    raw = json.dumps([sale_date.isoformat(), sale_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sale_date, sale_id = json.loads(raw)
+        return datetime.fromisoformat(sale_date), int(sale_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def sales_projection(db: Session, company_id: int, fields: List[str], start_date=None, end_date=None):
+    """
+    Column-only query over the company's sales (no ORM hydration).
+    Joins users/products only when a name field is requested.
+    """
+    query = db.query(*[SALE_FIELDS[f].label(f) for f in fields]).filter(Sale.company_id == company_id)
+
+    if "salesman_name" in fields:
+        query = query.outerjoin(auth_models.User, auth_models.User.id == Sale.user_id)
+    if "product_name" in fields:
+        query = query.outerjoin(Product, Product.id == Sale.product_id)
+
     # Date Filtering
     if start_date:
         query = query.filter(Sale.date >= start_date)
     if end_date:
         query = query.filter(Sale.date <= end_date)
 
-    # If Salesman, only show their sales? Or all?
-    # Usually Salesmen only see their own. Manager sees all.
+    return query
+
+@router.get("/", response_model=Union[List[SaleResponse], SalePage])
+def get_sales(
+    start_date: str = None,
+    end_date: str = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db), 
+    current_user: utils.Principal = Depends(utils.get_current_principal)
+):
+    """
+    Without limit/cursor/fields this returns the full list as before.
+    Otherwise it returns one keyset page, newest first:
+    {"items": [...], "next_cursor": "<opaque token or null>"}
+    Pages skip sales with no date (legacy rows); they can't be placed in the date order.
+    """
+    start = parse_date_param(start_date, "start_date")
+    end = parse_date_param(end_date, "end_date")
+
     # If Salesman, only show their sales? Or all?
     # Usually Salesmen only see their own. Manager sees all.
     # if current_user.role == "salesman":
     #     query = query.filter(Sale.user_id == current_user.id)
-        
-    sales = query.all()
-    # Debug Print
-    print(f"DEBUG: Fetched {len(sales)} sales. Sample User: {sales[0].user.full_name if sales and sales[0].user else 'None'}")
-    
-    # Manually populate the enhanced fields since Pydantic v1 ORM mode might not auto-fetch relationships easily without properties
-    response_data = []
-    for sale in sales:
-        s_dict = {
-            "id": sale.id,
-            "product_id": sale.product_id,
-            "amount": sale.amount,
-            "quantity": sale.quantity,
-            "date": sale.date,
-            "user_id": sale.user_id,
-            "customer_name": sale.customer_name,
-            "notes": sale.notes,
-            "salesman_name": sale.user.full_name if sale.user else "Unknown",
-            "product_name": sale.product.name if sale.product else "Unknown Product"
-        }
-        response_data.append(s_dict)
-        
-    return response_data
+
+    if limit is None and cursor is None and fields is None:
+        query = sales_projection(db, current_user.company_id, DEFAULT_FIELDS, start, end)
+        return [row._asdict() for row in query.all()]
+
+    # --- Cursor Mode ---
+    selected = parse_fields_param(fields)
+    # id and date are always returned, they make up the cursor
+    selected = ["id", "date"] + [f for f in selected if f not in ("id", "date")]
+
+    page_size = min(max(limit or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+
+    query = sales_projection(db, current_user.company_id, selected, start, end).filter(Sale.date.isnot(None))
+    if cursor:
+        after_date, after_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Sale.date < after_date,
+            and_(Sale.date == after_date, Sale.id < after_id)
+        ))
+
+    # Fetch one extra row to know whether another page exists
+    rows = query.order_by(Sale.date.desc(), Sale.id.desc()).limit(page_size + 1).all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor(last.date, last.id)
+
+    # Returned as a Response so the page skips response_model re-validation
+    return JSONResponse({
+        "items": jsonable_encoder([row._asdict() for row in rows]),
+        "next_cursor": next_cursor
+    })
 
 @router.post("/", response_model=SaleResponse)
 def create_sale(
@@ -156,8 +256,12 @@ def create_sale(
         notes=sale.notes
     )
     db.add(new_sale)
+    db.flush()
+    rollup.apply_sale(db, new_sale)
     db.commit()
     db.refresh(new_sale)
+    columnar_cache.company_sales.append(new_sale)
+    rank_index.salesmen.apply(new_sale.company_id, new_sale.user_id, new_sale.amount)
     return new_sale
 
 @router.delete("/{sale_id}")
@@ -177,6 +281,10 @@ def delete_sale(
     if not sale:
         raise HTTPException(status_code=404, detail="Sale not found")
         
+    user_id, amount = sale.user_id, sale.amount
+    rollup.apply_sale(db, sale, sign=-1)
     db.delete(sale)
     db.commit()
+    columnar_cache.company_sales.discard(current_user.company_id, sale_id)
+    rank_index.salesmen.apply(current_user.company_id, user_id, amount, sign=-1)
     return {"message": "Sale deleted successfully"}
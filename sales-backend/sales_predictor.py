@@ -5,6 +5,9 @@ from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from database import SessionLocal
 from sales.router import Sale
+import logging
+
+logger = logging.getLogger(__name__)
 
 class SalesPredictor:
     def __init__(self):
@@ -40,7 +43,7 @@ class SalesPredictor:
         self.df = self.load_data_from_db()
         
         if self.df.empty or len(self.df) < 2:
-            print("Not enough data to train model. Need at least 2 months of data.")
+            logger.info("Not enough data to train model. Need at least 2 months of data.")
             self.model_trained = False
             return
 
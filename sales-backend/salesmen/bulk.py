@@ -0,0 +1,184 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from datetime import datetime
+import csv
+import io
+import json
+from database import get_db
+from auth import utils, hashing, models as auth_models
+from .router import DEFAULT_PASSWORD
+
+router = APIRouter(
+    prefix="/api/salesmen",
+    tags=["Salesmen"]
+)
+
+MAX_ROWS = 10000
+INSERT_CHUNK_SIZE = 1000
+
+def parse_bulk_body(raw: bytes, content_type: str):
+    """Accepts a JSON array of salesmen, or CSV with a header row when the content type says so."""
+    if "csv" in content_type:
+        try:
+            text = raw.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="CSV must be UTF-8")
+        return [
+            {key.strip().lower(): value for key, value in row.items() if key}
+            for row in csv.DictReader(io.StringIO(text))
+        ]
+    try:
+        rows = json.loads(raw)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array of salesmen")
+    return rows
+
+def _text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+def validate_row(row):
+    """Returns (normalized row, None) or (None, error)."""
+    if not isinstance(row, dict):
+        return None, "Row must be an object"
+    name = _text(row.get("name"))
+    email = _text(row.get("email"))
+    if not name:
+        return None, "name is required"
+    if not email or "@" not in email:
+        return None, "A valid email is required"
+
+    target = _text(row.get("target"))
+    if target is not None:
+        try:
+            target = int(float(target))
+        except (ValueError, OverflowError):
+            return None, "target must be a number"
+
+    return {
+        "full_name": name,
+        "email": email,
+        "phone": _text(row.get("phone")),
+        "region": _text(row.get("region")),
+        "employee_id": _text(row.get("employee_id")),
+        "sales_target": target,
+        "password": _text(row.get("password")) or DEFAULT_PASSWORD,
+    }, None
+
+def onboard_salesmen(db: Session, rows, company_id: int, dry_run: bool):
+    results = [None] * len(rows)
+    valid = [] # (row index, normalized)
+    seen = set()
+    for i, row in enumerate(rows):
+        normalized, error = validate_row(row)
+        if error is None and normalized["email"] in seen:
+            error = "Duplicate email in upload"
+        if error is not None:
+            results[i] = {"row": i, "status": "rejected", "error": error}
+            continue
+        seen.add(normalized["email"])
+        valid.append((i, normalized))
+
+    # One IN query for every email in the upload
+    existing = set()
+    emails = [n["email"] for _, n in valid]
+    for start in range(0, len(emails), INSERT_CHUNK_SIZE):
+        existing.update(
+            email for (email,) in db.query(auth_models.User.email).filter(
+                auth_models.User.email.in_(emails[start:start + INSERT_CHUNK_SIZE])
+            )
+        )
+
+    accepted = []
+    for i, normalized in valid:
+        if normalized["email"] in existing:
+            results[i] = {"row": i, "status": "rejected", "email": normalized["email"], "error": "Email already registered"}
+        else:
+            accepted.append((i, normalized))
+
+    if dry_run:
+        for i, normalized in accepted:
+            results[i] = {"row": i, "status": "accepted", "email": normalized["email"]}
+    elif accepted:
+        with utils.hashing_guard():
+            hashes = hashing.hash_many([n["password"] for _, n in accepted])
+
+        now = datetime.utcnow()
+        values = [
+            {
+                "email": n["email"],
+                "full_name": n["full_name"],
+                "hashed_password": hashed,
+                "role": "salesman",
+                "employee_id": n["employee_id"],
+                "phone": n["phone"],
+                "region": n["region"],
+                "sales_target": n["sales_target"],
+                "company_id": company_id,
+                "created_at": now,
+            }
+            for (_, n), hashed in zip(accepted, hashes)
+        ]
+
+        ids = {}
+        try:
+            for start in range(0, len(values), INSERT_CHUNK_SIZE):
+                inserted = db.execute(
+                    insert(auth_models.User).returning(auth_models.User.id, auth_models.User.email),
+                    values[start:start + INSERT_CHUNK_SIZE]
+                )
+                ids.update({email: user_id for user_id, email in inserted})
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            raise HTTPException(status_code=409, detail="Some emails were registered while this upload ran; please retry")
+        except Exception:
+            db.rollback()
+            raise
+
+        for i, normalized in accepted:
+            results[i] = {"row": i, "status": "accepted", "email": normalized["email"], "id": ids.get(normalized["email"])}
+
+    return {
+        "dry_run": dry_run,
+        "accepted": len(accepted),
+        "rejected": len(rows) - len(accepted),
+        "results": results
+    }
+
+@router.post("/bulk")
+async def bulk_create_salesmen(
+    request: Request,
+    dry_run: bool = False,
+    db: Session = Depends(get_db),
+    current_user: auth_models.User = Depends(utils.get_current_active_user)
+):
+    """
+    Onboards many salesmen from a JSON array or CSV (Content-Type: text/csv) with the columns
+    name, email, phone, region, target, employee_id and an optional password (default: the same
+    one create_salesman uses). All valid rows are inserted in one transaction; dry_run=true only
+    validates and reports.
+    """
+    if current_user.role != "manager":
+        raise HTTPException(status_code=403, detail="Only managers can add salesmen")
+
+    raw = await request.body()
+    rows = parse_bulk_body(raw, request.headers.get("content-type", ""))
+    if len(rows) > MAX_ROWS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_ROWS} salesmen per upload")
+    if not rows:
+        return {"dry_run": dry_run, "accepted": 0, "rejected": 0, "results": []}
+
+    try:
+        return await run_in_threadpool(onboard_salesmen, db, rows, current_user.company_id, dry_run)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Bulk onboarding failed: {str(e)}")
@@ -8,6 +8,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from database import get_db
 from auth import utils, models as auth_models
+from auth.principal_cache import principals
 
 # --- Schemas ---
 class SalesmanBase(BaseModel):
@@ -28,6 +29,9 @@ class SalesmanResponse(SalesmanBase):
     class Config:
         orm_mode = True
 
+# New salesmen get this password until they change it
+DEFAULT_PASSWORD = "password123"
+
 # --- Router ---
 router = APIRouter(
     prefix="/api/salesmen",
@@ -79,7 +83,7 @@ def create_salesman(
     # Create User with role 'salesman'
     # We need a default password or generate one?
     # For now, let's set a default password 'password123' which they should change
-    hashed_password = utils.get_password_hash("password123")
+    hashed_password = utils.get_password_hash(DEFAULT_PASSWORD)
     
     new_user = auth_models.User(
         email=salesman.email,
@@ -127,6 +131,11 @@ def update_salesman(
     if not user:
         raise HTTPException(status_code=404, detail="Salesman not found")
         
+    previous_email = user.email
+    if salesman_data.email != previous_email:
+        # Tokens identify the user by email, so the old ones stop working
+        utils.revoke_tokens(user)
+
     user.full_name = salesman_data.name
     user.email = salesman_data.email
     user.phone = salesman_data.phone
@@ -135,6 +144,9 @@ def update_salesman(
     
     db.commit()
     db.refresh(user)
+    # Cached principals are keyed by email, which may have just changed
+    principals.invalidate(previous_email)
+    utils.forget_user(user.id, user.email, user.token_version)
     
     return {
         "id": user.id,
@@ -165,7 +177,9 @@ def delete_salesman(
     if not user:
         raise HTTPException(status_code=404, detail="Salesman not found")
         
+    user_id, email = user.id, user.email
     db.delete(user)
     db.commit()
+    utils.forget_user(user_id, email)
     
     return {"message": "Salesman deleted"}
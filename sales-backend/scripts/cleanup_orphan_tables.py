@@ -10,6 +10,7 @@ from database import engine, SessionLocal
 from auth.models import Company
 
 import argparse
+import re
 
 def cleanup_orphan_tables():
     """
@@ -39,13 +40,18 @@ def cleanup_orphan_tables():
         # Correct list of system tables based on codebase inspection
         system_tables = {
             "users", "companies", "products", "sales", 
-            "categories", "customers", "alembic_version"
+            "categories", "customers", "alembic_version",
+            "schema_migrations", "sales_daily_rollup", "sales_rollup_marks",
+            "sales_leaderboard", "sales_leaderboard_state", "sales_import_jobs"
         }
         
         orphan_tables = []
         for table in all_tables:
             if table in system_tables:
                 continue
+            # Monthly partitions of sales (see scripts/partition_sales.py)
+            if re.fullmatch(r"sales_(y\d{4}m\d{2}|default|partitioned|unpartitioned)", table):
+                continue
             
             # If table is NOT in valid_table_names, it might be an orphan
             if table not in valid_table_names:
@@ -0,0 +1,44 @@
+import sys
+import os
+import argparse
+import logging
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import engine
+from migrations import runner
+
+def migrate():
+    """
+    Applies pending schema migrations (migrations/mNNNN_*.py) and records them in schema_migrations.
+    Replaces the old one-off scripts/add_*.py scripts; safe to run repeatedly.
+    """
+    parser = argparse.ArgumentParser(description="Apply database schema migrations.")
+    parser.add_argument("--target", type=int, default=None, help="Stop at this version (default: head)")
+    parser.add_argument("--status", action="store_true", help="Show applied and pending migrations only")
+    args = parser.parse_args()
+
+    # Migration progress is logged; show it as plain lines
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    current, head = runner.current_version(engine), runner.head_version()
+    if args.status:
+        print(f"Schema version {current}, head {head}")
+        for migration in runner.load_migrations():
+            state = "applied" if migration.VERSION <= current else "pending"
+            print(f"  {migration.VERSION:04d} {state:8} {migration.DESCRIPTION}")
+        return
+
+    try:
+        applied = runner.upgrade(engine, target=args.target)
+        if applied:
+            print(f"Schema is now at version {max(applied)}")
+        else:
+            print(f"Schema already at version {current}, nothing to do")
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    migrate()
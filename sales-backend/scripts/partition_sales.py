@@ -0,0 +1,145 @@
+import sys
+import os
+import argparse
+from datetime import date
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from database import engine
+from sales import partitions
+
+def migrate(args):
+    with engine.begin() as conn:
+        if partitions.is_partitioned(conn):
+            print("sales is already partitioned")
+            return
+        if conn.execute(text("SELECT to_regclass(:name)"), {"name": f"public.{partitions.STAGING}"}).scalar():
+            if not args.resume:
+                print(f"{partitions.STAGING} already exists; pass --resume to continue copying into it")
+                return
+        else:
+            partitions.create_staging_table(conn, args.months_ahead)
+            print(f"Created {partitions.STAGING}")
+
+    # Also covers --resume: rows written since the first run may have no date
+    try:
+        with engine.begin() as conn:
+            backfilled = partitions.backfill_null_dates(conn)
+    except RuntimeError as e:
+        print(e)
+        return
+    if backfilled:
+        print(f"Set date = created_at on {backfilled} rows with no date")
+
+    with engine.connect() as conn:
+        last_id = conn.execute(text(f'SELECT coalesce(max(id), 0) FROM "{partitions.STAGING}"')).scalar()
+
+    # Each batch commits on its own so the copy never holds long locks
+    copied = 0
+    while True:
+        with engine.begin() as conn:
+            batch_last = partitions.copy_batch(conn, last_id, args.batch_size)
+        if batch_last is None:
+            break
+        last_id = batch_last
+        copied += 1
+        if copied % 50 == 0:
+            print(f"Copied {copied} batches (up to id {last_id})")
+
+    with engine.begin() as conn:
+        removed = partitions.drop_deleted(conn)
+    if removed:
+        print(f"Dropped {removed} rows deleted during the copy")
+
+    with engine.begin() as conn:
+        partitions.swap_tables(conn, last_id)
+    print(f"sales is now partitioned by month; the old table was kept as {partitions.RETIRED}")
+
+def create(args):
+    today = date.today()
+    with engine.begin() as conn:
+        if not partitions.is_partitioned(conn):
+            print("sales is not partitioned; run the 'migrate' command first")
+            return
+        created = partitions.create_partitions(conn, today, partitions.add_months(today, args.months_ahead))
+        partitions.create_default_partition(conn)
+    print(f"Created {len(created)} partitions: {', '.join(created) or 'none needed'}")
+
+def detach(args):
+    cutoff = partitions.add_months(partitions.month_start(date.today()), -(args.keep_months - 1))
+    with engine.begin() as conn:
+        if not partitions.is_partitioned(conn):
+            print("sales is not partitioned")
+            return
+        old = partitions.partitions_older_than(conn, cutoff)
+
+    for name in old:
+        if args.dry_run:
+            print(f"Would detach {name}")
+            continue
+        # One transaction per partition; DETACH takes a brief lock on the parent
+        with engine.begin() as conn:
+            partitions.detach_partition(conn, name, archive_schema=args.archive_schema, drop=args.drop)
+        action = "dropped" if args.drop else (f"moved to {args.archive_schema}" if args.archive_schema else "detached")
+        print(f"{name}: {action}")
+    if not old:
+        print(f"No partitions older than {cutoff.isoformat()}")
+
+def status(args):
+    with engine.connect() as conn:
+        if not partitions.is_partitioned(conn):
+            print("sales is not partitioned")
+            return
+        for name, bound in partitions.list_partitions(conn):
+            print(f"{name}: {bound}")
+
+def partition_sales():
+    """
+    Monthly range partitioning of the sales table (PostgreSQL only).
+
+    migrate  converts the existing table, copying rows in batches while the app keeps running
+    create   creates upcoming monthly partitions ahead of time (run it from cron, e.g. weekly)
+    detach   detaches partitions older than --keep-months, optionally archiving or dropping them
+    status   lists the partitions and their bounds
+
+    Detached months no longer show up in the sales list or in a rollup rebuild, but the
+    sales_daily_rollup rows for them are kept, so dashboard and analytics totals don't change.
+    """
+    parser = argparse.ArgumentParser(description="Manage monthly partitions of the sales table.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = commands.add_parser("migrate", help="Convert sales into a partitioned table")
+    migrate_parser.add_argument("--batch-size", type=int, default=10000, help="Rows copied per transaction")
+    migrate_parser.add_argument("--months-ahead", type=int, default=3, help="Future months to create partitions for")
+    migrate_parser.add_argument("--resume", action="store_true", help="Continue an interrupted copy")
+    migrate_parser.set_defaults(func=migrate)
+
+    create_parser = commands.add_parser("create", help="Create upcoming monthly partitions")
+    create_parser.add_argument("--months-ahead", type=int, default=3)
+    create_parser.set_defaults(func=create)
+
+    detach_parser = commands.add_parser("detach", help="Detach old monthly partitions")
+    detach_parser.add_argument("--keep-months", type=int, required=True, help="Months to keep attached, counting the current one")
+    detach_parser.add_argument("--archive-schema", default=None, help="Move detached partitions into this schema")
+    detach_parser.add_argument("--drop", action="store_true", help="Drop detached partitions instead of keeping them")
+    detach_parser.add_argument("--dry-run", action="store_true")
+    detach_parser.set_defaults(func=detach)
+
+    status_parser = commands.add_parser("status", help="List partitions")
+    status_parser.set_defaults(func=status)
+
+    args = parser.parse_args()
+
+    if engine.dialect.name != "postgresql":
+        print(f"Partitioning needs PostgreSQL; this database is {engine.dialect.name}. Nothing to do.")
+        return
+
+    try:
+        args.func(args)
+    except Exception as e:
+        print(f"Partition command failed: {e}")
+
+if __name__ == "__main__":
+    partition_sales()
@@ -0,0 +1,37 @@
+import sys
+import os
+import argparse
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SessionLocal, engine
+from sales.router import Sale # Registers Sale, Product and User models
+from sales import rollup
+
+def rebuild_sales_rollup():
+    """
+    Regenerates the sales_daily_rollup table from the sales table.
+    Migration 0005 fills it on upgrade; run this any time it is suspected to have drifted.
+    """
+    parser = argparse.ArgumentParser(description="Rebuild the sales_daily_rollup table.")
+    parser.add_argument("--company-id", type=int, default=None, help="Only rebuild this company")
+    args = parser.parse_args()
+
+    # Make sure the rollup table exists
+    rollup.SalesDailyRollup.__table__.create(bind=engine, checkfirst=True)
+
+    db = SessionLocal()
+    try:
+        scope = f"company {args.company_id}" if args.company_id is not None else "all companies"
+        print(f"Rebuilding sales rollup for {scope}...")
+        buckets = rollup.rebuild(db, company_id=args.company_id)
+        print(f"Rollup rebuilt: {buckets} daily buckets")
+    except Exception as e:
+        print(f"Rebuild failed: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    rebuild_sales_rollup()
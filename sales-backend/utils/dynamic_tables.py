@@ -1,5 +1,8 @@
 from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, inspect
 from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
 
 def get_table_name(company_name: str) -> str:
     """
@@ -32,9 +35,9 @@ def ensure_company_salesmen_table(engine, table_name: str):
             Column('created_at', DateTime, default=datetime.utcnow)
         )
         metadata.create_all(engine)
-        print(f"DEBUG: Created dynamic table '{table_name}'")
+        logger.debug("Created dynamic table '%s'", table_name)
     else:
-        print(f"DEBUG: Table '{table_name}' already exists")
+        logger.debug("Table '%s' already exists", table_name)
 
 def insert_salesman_data(engine, table_name: str, data: dict):
     """
@@ -48,4 +51,4 @@ def insert_salesman_data(engine, table_name: str, data: dict):
         stmt = table.insert().values(**data)
         conn.execute(stmt)
         conn.commit()
-    print(f"DEBUG: Inserted data into '{table_name}': {data['email']}")
+    logger.debug("Inserted data into '%s': %s", table_name, data['email'])
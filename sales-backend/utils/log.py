@@ -0,0 +1,138 @@
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+
+# Structured logging for the app. Records go onto an in-memory queue from the request path and
+# a background listener thread does the formatting and I/O, so logging never blocks a request.
+#
+#   LOG_LEVEL               root level (default INFO)
+#   LOG_LEVELS              per-module overrides, e.g. "auth=DEBUG,sqlalchemy.engine=WARNING"
+#   LOG_FORMAT              json (default) or text
+#   LOG_FILE                also write to this file
+#   LOG_DEBUG_SAMPLE_RATE   fraction of DEBUG records kept (default 1.0); high-volume lines
+#                           (one per request) can also pass extra={"sample": rate} at any level
+#   LOG_QUEUE_SIZE          records buffered before new ones are dropped (default 10000)
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_FILE = os.getenv("LOG_FILE")
+DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Correlates every record logged while handling a request (set by the middleware in main.py)
+request_id: ContextVar[str] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed through extra= and is emitted as a field
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id", "sample"}
+
+def new_request_id(incoming: str = None) -> str:
+    """Uses the caller's X-Request-ID when it looks sane, otherwise generates one."""
+    if incoming and len(incoming) <= 128 and incoming.isprintable():
+        return incoming
+    return uuid.uuid4().hex
+
+class ContextFilter(logging.Filter):
+    """Runs on the logging thread's caller: stamps the request id and applies sampling."""
+    def filter(self, record):
+        record.request_id = request_id.get()
+        rate = getattr(record, "sample", None)
+        if rate is None and record.levelno <= logging.DEBUG:
+            rate = DEBUG_SAMPLE_RATE
+        return rate is None or rate >= 1 or random.random() < rate
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = None
+        return super().format(record)
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Never waits for the listener: when the queue is full the record is dropped and counted."""
+    dropped = 0
+
+    def prepare(self, record):
+        # Like the default, but keeps the traceback in its own field instead of merging it into msg
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+_listener = None
+
+def _parse_levels(spec: str):
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+def setup_logging():
+    """Installs the queue handler on the root logger and starts the listener. Safe to call twice."""
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = JsonFormatter() if LOG_FORMAT == "json" else TextFormatter()
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if LOG_FILE:
+        handlers.append(logging.FileHandler(LOG_FILE))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+    for name, level in _parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
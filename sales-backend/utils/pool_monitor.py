@@ -0,0 +1,178 @@
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from contextvars import ContextVar
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Sessions held longer than this are reported as leaks, naming the route that checked them out
+LEAK_THRESHOLD_SECONDS = float(os.getenv("DB_SESSION_LEAK_SECONDS", "30"))
+
+# Upper bounds (ms) of the checkout wait-time histogram buckets
+WAIT_BUCKETS_MS = [1, 5, 10, 50, 100, 500, 1000, 5000]
+
+# Route of the request currently running, set by the middleware in main.py
+current_route: ContextVar[str] = ContextVar("db_route", default="(no request)")
+
+_ID_SEGMENT = re.compile(r"/(\d+|[0-9a-fA-F-]{32,36})(?=/|$)")
+
+def set_route(method: str, path: str):
+    """Records the route for connections checked out by this request (ids collapsed to {id})."""
+    return current_route.set(f"{method} {_ID_SEGMENT.sub('/{id}', path)}")
+
+class PoolStats:
+    def __init__(self, name: str, pool, settings: dict):
+        self.name = name
+        self.pool = pool
+        self.settings = settings
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.overflow_events = 0
+        self.timeouts = 0
+        self.wait_histogram = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.routes = {}
+        self.held = {} # id(connection_record) -> [route, checkout time, already warned]
+
+    def record_wait(self, seconds: float):
+        ms = seconds * 1000
+        bucket = next((i for i, bound in enumerate(WAIT_BUCKETS_MS) if ms <= bound), len(WAIT_BUCKETS_MS))
+        with self.lock:
+            self.wait_histogram[bucket] += 1
+            self.wait_total_ms += ms
+            self.wait_max_ms = max(self.wait_max_ms, ms)
+
+    def record_timeout(self, seconds: float):
+        with self.lock:
+            self.timeouts += 1
+        logger.warning("[%s] pool timeout after %.1fs for %s (%s)", self.name, seconds, current_route.get(), self.pool.status())
+
+    def on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self.lock:
+            self.checkouts += 1
+            if self.pool.checkedout() > self.pool.size():
+                self.overflow_events += 1
+            self.held[id(connection_record)] = [current_route.get(), time.monotonic(), False]
+
+    def on_checkin(self, dbapi_connection, connection_record):
+        with self.lock:
+            held = self.held.pop(id(connection_record), None)
+            if held is None:
+                return
+            route, started, warned = held
+            duration_ms = (time.monotonic() - started) * 1000
+            stats = self.routes.setdefault(route, {"checkouts": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stats["checkouts"] += 1
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+        if duration_ms / 1000 > LEAK_THRESHOLD_SECONDS and not warned:
+            logger.warning("[%s] session held %.1fs by %s", self.name, duration_ms / 1000, route)
+
+    def check_leaks(self):
+        """Warns once about every connection held past the threshold and not yet returned."""
+        now = time.monotonic()
+        leaked = []
+        with self.lock:
+            for held in self.held.values():
+                route, started, warned = held
+                if not warned and now - started > LEAK_THRESHOLD_SECONDS:
+                    held[2] = True
+                    leaked.append((route, now - started))
+        for route, seconds in leaked:
+            logger.warning("[%s] possible session leak: held %.1fs by %s", self.name, seconds, route)
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self.lock:
+            waits = sum(self.wait_histogram)
+            labels = [f"<={b}ms" for b in WAIT_BUCKETS_MS] + [f">{WAIT_BUCKETS_MS[-1]}ms"]
+            return {
+                "pool_size": self.pool.size(),
+                "checked_out": self.pool.checkedout(),
+                "checked_in": self.pool.checkedin(),
+                "overflow": self.pool.overflow(),
+                "settings": self.settings,
+                "checkouts": self.checkouts,
+                "overflow_events": self.overflow_events,
+                "timeouts": self.timeouts,
+                "wait_ms_histogram": dict(zip(labels, self.wait_histogram)),
+                "wait_ms_avg": round(self.wait_total_ms / waits, 3) if waits else 0,
+                "wait_ms_max": round(self.wait_max_ms, 3),
+                "routes": {
+                    route: {
+                        "checkouts": s["checkouts"],
+                        "avg_ms": round(s["total_ms"] / s["checkouts"], 3),
+                        "max_ms": round(s["max_ms"], 3),
+                    }
+                    for route, s in self.routes.items()
+                },
+                "held_connections": sorted(
+                    [{"route": route, "held_seconds": round(now - started, 3)} for route, started, _ in self.held.values()],
+                    key=lambda h: -h["held_seconds"]
+                ),
+            }
+
+class _InstrumentedPoolMixin:
+    """Times how long each checkout waits for a free connection."""
+    stats = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            if self.stats:
+                self.stats.record_timeout(time.perf_counter() - started)
+            raise
+        if self.stats:
+            self.stats.record_wait(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() swaps in a new pool; keep reporting into the same stats
+        pool = super().recreate()
+        pool.stats = self.stats
+        if self.stats:
+            self.stats.pool = pool
+        return pool
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+registry = {}
+_watchdog = None
+
+def _watch():
+    while True:
+        time.sleep(max(LEAK_THRESHOLD_SECONDS / 2, 1))
+        for stats in list(registry.values()):
+            stats.check_leaks()
+
+def instrument(engine, name: str, settings: dict) -> PoolStats:
+    """Attaches pool statistics to a sync engine (pass async_engine.sync_engine for async ones)."""
+    pool = engine.pool
+    stats = PoolStats(name, pool, settings)
+    if isinstance(pool, _InstrumentedPoolMixin):
+        pool.stats = stats
+    event.listen(engine, "checkout", stats.on_checkout)
+    event.listen(engine, "checkin", stats.on_checkin)
+    registry[name] = stats
+    return stats
+
+def start_watchdog():
+    """Starts the leak-warning thread (app startup). Safe to call twice."""
+    global _watchdog
+    if _watchdog is None:
+        _watchdog = threading.Thread(target=_watch, name="db-pool-watchdog", daemon=True)
+        _watchdog.start()
+
+def snapshot():
+    return {name: stats.snapshot() for name, stats in registry.items()}
@@ -0,0 +1,95 @@
+from sqlalchemy import text
+from jose import jwt, JWTError
+import os
+import threading
+import time
+
+# Reads fall back to the primary when the replica lags more than this
+MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "10"))
+# After a user writes, their reads stay on the primary this long (read-your-writes)
+STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+# How often the replica's health and lag are re-checked
+HEALTH_INTERVAL_SECONDS = float(os.getenv("REPLICA_HEALTH_INTERVAL", "5"))
+
+LAG_QUERY = "SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+
+class ReplicaMonitor:
+    """
+    Tracks whether the read replica is usable (reachable and within the lag threshold)
+    and which users wrote recently. State is per process.
+    """
+    def __init__(self, engine):
+        self.engine = engine
+        self.available = False # until the first health check passes
+        self.lag_seconds = None
+        self.last_error = None
+        self.checked_at = None
+        self.recent_writes = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        """Starts the health-check thread (app startup); the replica isn't used before then."""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._watch, name="db-replica-health", daemon=True)
+            self.thread.start()
+
+    def check(self):
+        try:
+            with self.engine.connect() as conn:
+                if self.engine.dialect.name == "postgresql":
+                    lag = float(conn.execute(text(LAG_QUERY)).scalar() or 0)
+                else:
+                    # No replication lag to measure (e.g. a second SQLite file in local testing)
+                    conn.execute(text("SELECT 1"))
+                    lag = 0.0
+            self.lag_seconds = lag
+            self.available = lag <= MAX_LAG_SECONDS
+            self.last_error = None if self.available else f"lag {lag:.1f}s exceeds {MAX_LAG_SECONDS}s"
+        except Exception as e:
+            self.available = False
+            self.last_error = str(e)
+        self.checked_at = time.time()
+
+    def _watch(self):
+        while True:
+            self.check()
+            time.sleep(HEALTH_INTERVAL_SECONDS)
+
+    def mark_write(self, subject: str):
+        now = time.monotonic()
+        with self.lock:
+            self.recent_writes[subject] = now
+            if len(self.recent_writes) > 10000:
+                self.recent_writes = {s: t for s, t in self.recent_writes.items() if now - t < STICKY_SECONDS}
+
+    def wrote_recently(self, subject: str) -> bool:
+        written = self.recent_writes.get(subject)
+        return written is not None and time.monotonic() - written < STICKY_SECONDS
+
+    def use_replica(self, subject: str = None) -> bool:
+        if not self.available:
+            return False
+        return not (subject and self.wrote_recently(subject))
+
+    def status(self):
+        return {
+            "available": self.available,
+            "lag_seconds": self.lag_seconds,
+            "max_lag_seconds": MAX_LAG_SECONDS,
+            "sticky_seconds": STICKY_SECONDS,
+            "last_error": self.last_error,
+            "checked_at": self.checked_at,
+        }
+
+def token_subject(authorization: str):
+    """
+    Subject of a bearer token, used only to route reads, so the signature is not verified here
+    (the auth dependency still verifies it).
+    """
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        return jwt.get_unverified_claims(authorization[7:]).get("sub")
+    except JWTError:
+        return None